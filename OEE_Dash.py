@@ -6,15 +6,16 @@ Created on Wed Jun 24 13:00:15 2026
 """
 
 # -*- coding: utf-8 -*-
+# Punto de entrada: configuración, conexión y sidebar. Cada página de paginas/ importa
+# sus propias librerías (plotly, altair) y solo se ejecuta cuando se visita.
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
-import altair as alt
-from datetime import datetime, timedelta, date
-import numpy as np
-from modules.supabase_client import SupabaseManager
+from datetime import timedelta, date
+from modules.app_context import guardar_contexto
+from modules.federation import init_federation, TODAS
+from modules.figure_cache import FIGURAS
+from modules.instrumentation import INSTRUMENTATION, configure_log
+from modules.metrics import rates_vigentes
 
 # --- CONFIGURACIÓN DE PÁGINA ---
 st.set_page_config(
@@ -24,12 +25,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# --- CATÁLOGO DE MÁQUINAS Y RATES ---
-MAQUINAS_RATES = {
-    "CS0525": 115, "CS0524": 115, "CS0516": 180, "CS0523": 100,
-    "CS0522": 100, "CS0537": 200, "CS0514": 180, "CS0515": 180,
-    "CS0505": 200, "CS0544": 200, "CS0575": 120, "CS0595": 120
-}
+# --- INSTRUMENTACIÓN (tiempos por etapa de cada corrida; ver modules/instrumentation.py) ---
+corrida = INSTRUMENTATION.begin_rerun()
+if st.secrets.get("instrumentacion", {}).get("log_path"):
+    configure_log(st.secrets["instrumentacion"]["log_path"])
 
 # --- ESTILOS CSS PERSONALIZADOS ---
 st.markdown("""
@@ -50,800 +49,106 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# --- INICIALIZACIÓN SUPABASE ---
+# --- INICIALIZACIÓN DEL ALMACENAMIENTO (Supabase o SQLite local, según [storage]) ---
+# Una fuente por planta / línea ([[plantas]]); sin esa sección, una sola fuente como antes
 @st.cache_resource
 def init_connection():
     try:
-        if "supabase" in st.secrets:
-            url = st.secrets["supabase"]["url"]
-            key = st.secrets["supabase"]["key"]
-            return SupabaseManager(url, key)
+        if "supabase" in st.secrets or "storage" in st.secrets or "plantas" in st.secrets:
+            # [supabase]: caché de consultas, paginación paralela y réplica local ([mirror]) opcionales
+            return init_federation(st.secrets)
         else:
-            st.error("⚠️ No se encontró la sección [supabase] en secrets.toml")
+            st.error("⚠️ No se encontró la sección [supabase] ni [storage] en secrets.toml")
             return None
     except Exception as e:
-        st.error(f"⚠️ Error al inicializar Supabase: {e}")
+        st.error(f"⚠️ Error al inicializar el almacenamiento: {e}")
         return None
 
-db = init_connection()
-
-# --- FUNCIONES DE CÁLCULO (CORREGIDAS según Excel y con contribuidores de scrap) ---
-def calculate_metrics(tiempo_programado, rate_teorico, producido,
-                      scrap_setup, scrap_pruebas, scrap_msf, scrap_tubo,
-                      scrap_soldadura_quemada, scrap_ajuste, scrap_soldadura_porosa,
-                      scrap_falta_soldadura, scrap_primera_pieza,
-                      ajuste, f_mec, f_elec, f_personal, f_mat, c_modelo):
-    """
-    Calcula los KPIs de OEE.
-    El scrap total es la suma de los 9 contribuidores.
-    """
-    # Suma de todos los contribuidores de scrap
-    scrap_total = (scrap_setup + scrap_pruebas + scrap_msf + scrap_tubo +
-                   scrap_soldadura_quemada + scrap_ajuste + scrap_soldadura_porosa +
-                   scrap_falta_soldadura + scrap_primera_pieza)
-
-    tiempo_muerto = ajuste + f_mec + f_elec + f_personal + f_mat + c_modelo
-    tiempo_funcionamiento = max(0, tiempo_programado - tiempo_muerto)
-
-    disponibilidad = (tiempo_funcionamiento / tiempo_programado) if tiempo_programado > 0 else 0
-
-    # Capacidad teórica = tiempo_programado * (rate_teorico / 60)  --> como en Excel
-    capacidad_teorica = tiempo_programado * (rate_teorico / 60)
-    rendimiento = (producido / capacidad_teorica) if capacidad_teorica > 0 else 0
-
-    # Scrap % = scrap_total / producido
-    scrap_pct = (scrap_total / producido) if producido > 0 else 0
-    # FTT y Calidad = producido / (producido + scrap_total)
-    ftt = (producido / (producido + scrap_total)) if (producido + scrap_total) > 0 else 0
-    calidad = ftt
-
-    oee = disponibilidad * rendimiento * calidad
+federacion = init_connection()
 
-    return {
-        "tiempo_muerto": tiempo_muerto,
-        "tiempo_funcionamiento": tiempo_funcionamiento,
-        "disponibilidad": disponibilidad * 100,
-        "rendimiento": rendimiento * 100,
-        "calidad": calidad * 100,
-        "oee": oee * 100,
-        "scrap_pct": scrap_pct * 100,
-        "ftt": ftt * 100,
-        "scrap_total": scrap_total
-    }
+# --- NAVEGACIÓN ---
+# [app] pagina_inicial = "captura" deja la captura como página de inicio (tabletas de piso)
+pagina_inicial = st.secrets.get("app", {}).get("pagina_inicial", "dashboard")
+PAGINAS = {
+    "dashboard": dict(title="Dashboard OEE", icon="📊"),
+    "captura": dict(title="Captura de Datos", icon="✍️"),
+    "reportes": dict(title="Reportes y Descargas", icon="📄"),
+}
+pagina = st.navigation([st.Page(f"paginas/{nombre}.py", default=(nombre == pagina_inicial), **opciones)
+                        for nombre, opciones in PAGINAS.items()])
+# La página por defecto tiene url_path vacío; las demás, el nombre de su archivo
+pagina_actual = pagina.url_path or pagina_inicial
+analitica = pagina_actual != "captura"
 
 # --- SIDEBAR ---
 with st.sidebar:
     try: st.image("EA_2.png", width=200)
     except: st.title("EA System")
 
-    st.markdown("### ⚙️ Configuración Global")
-    meta_oee = st.number_input("🎯 Meta OEE (%)", min_value=0.0, max_value=100.0, value=85.0, step=1.0)
-    filter_date_range = st.date_input("📅 Rango de Fechas", [date.today() - timedelta(days=30), date.today()])
-
-    maquinas_opts = list(MAQUINAS_RATES.keys())
-    if db and len(filter_date_range) == 2:
-        df_lines = db.fetch_records(filter_date_range[0], filter_date_range[1])
-        if not df_lines.empty and 'maquina' in df_lines.columns:
-            maquinas_opts = sorted(list(set(maquinas_opts + df_lines['maquina'].unique().tolist())))
-
-    filter_maquina = st.multiselect("🏭 Máquinas", maquinas_opts, default=maquinas_opts)
-    filter_turn = st.multiselect("⏰ Turno", [1, 2, 3], default=[1, 2, 3])
+    # Vista de la federación con la planta / línea elegida (o todas)
+    planta_sel = TODAS
+    if federacion and len(federacion.fuentes) > 1:
+        planta_sel = st.selectbox("🏭 Planta / Línea", [TODAS] + federacion.nombres, key="planta_sel")
+    db = federacion.select(planta_sel) if federacion else None
+    contexto = dict(federacion=federacion, db=db, planta_sel=planta_sel)
+
+    # Los filtros globales solo se dibujan (y solo se consultan sus opciones) en las páginas
+    # de análisis; reasignar su estado lo conserva mientras se visita la captura
+    for clave in ("meta_oee", "filter_date_range", "filter_maquina", "filter_turn", "maquinas_opts"):
+        if clave in st.session_state:
+            st.session_state[clave] = st.session_state[clave]
+
+    if analitica:
+        st.markdown("### ⚙️ Configuración Global")
+        st.session_state.setdefault("meta_oee", 85.0)
+        st.session_state.setdefault("filter_date_range", [date.today() - timedelta(days=30), date.today()])
+        meta_oee = st.number_input("🎯 Meta OEE (%)", min_value=0.0, max_value=100.0, step=1.0, key="meta_oee")
+        filter_date_range = st.date_input("📅 Rango de Fechas", key="filter_date_range")
+
+        # Catálogo 'maquinas' en caché (una consulta pequeña); sin catálogo, MAQUINAS_RATES
+        maquinas_opts = list(rates_vigentes(db.fetch_machines() if db else None))
+        # Como antes: si cambian las máquinas disponibles, se seleccionan todas
+        if st.session_state.get("maquinas_opts") != maquinas_opts:
+            st.session_state["maquinas_opts"] = maquinas_opts
+            st.session_state["filter_maquina"] = maquinas_opts
+        st.session_state.setdefault("filter_turn", [1, 2, 3])
+
+        filter_maquina = st.multiselect("🏭 Máquinas", maquinas_opts, key="filter_maquina")
+        filter_turn = st.multiselect("⏰ Turno", [1, 2, 3], key="filter_turn")
+        contexto.update(meta_oee=meta_oee, filter_date_range=filter_date_range,
+                        filter_maquina=filter_maquina, filter_turn=filter_turn)
+
+    if db and any(f.db.mirror and f.db.mirror.offline for f in db.fuentes.values()):
+        st.warning("📴 Sin conexión: mostrando la réplica local (solo lectura).")
+
+    # Panel de rendimiento: se llena al final del script, con la corrida ya medida
+    panel_rendimiento = st.checkbox("🐞 Panel de rendimiento")
+    if panel_rendimiento:
+        INSTRUMENTATION.enable_memory(st.checkbox("Medir memoria (tracemalloc, más lento)",
+                                                  value=INSTRUMENTATION.memory_enabled))
+        contenedor_rendimiento = st.container()
 
     st.markdown("---")
     st.markdown("**Master Engineer Erik Armenta**")
 
-# --- MAIN APP ---
-tab1, tab2, tab3 = st.tabs(["📊 Dashboard OEE", "✍️ Captura de Datos", "📄 Reportes y Descargas"])
-
-# -----------------------------------------------------------------------------
-# TAB 1: DASHBOARD
-# -----------------------------------------------------------------------------
-def make_donut(input_response, input_text, input_color):
-    if input_color == 'blue':
-        chart_color = ['#29b5e8', '#155F7A']
-    if input_color == 'green':
-        chart_color = ['#27AE60', '#12783D']
-    if input_color == 'orange':
-        chart_color = ['#F39C12', '#875A12']
-    if input_color == 'red':
-        chart_color = ['#E74C3C', '#78281F']
-
-    source = pd.DataFrame({
-        "Topic": ['', input_text],
-        "% value": [100-input_response, input_response]
-    })
-    source_bg = pd.DataFrame({
-        "Topic": ['', input_text],
-        "% value": [100, 0]
-    })
-
-    plot = alt.Chart(source).mark_arc(innerRadius=60, cornerRadius=25).encode(
-        theta="% value",
-        color= alt.Color("Topic:N",
-                        scale=alt.Scale(
-                            domain=[input_text, ''],
-                            range=chart_color),
-                        legend=None),
-    ).properties(width=180, height=180)
-
-    text = plot.mark_text(align='center', color=chart_color[0], font="Lato", fontSize=28, fontWeight=700, fontStyle="italic").encode(text=alt.value(f'{input_response:.2f}%'))
-    plot_bg = alt.Chart(source_bg).mark_arc(innerRadius=60, cornerRadius=20).encode(
-        theta="% value",
-        color= alt.Color("Topic:N",
-                        scale=alt.Scale(
-                            domain=[input_text, ''],
-                            range=chart_color),
-                        legend=None),
-    ).properties(width=180, height=180)
-    return plot_bg + plot + text
-
-with tab1:
-    st.title("📊 Dashboard Rotarys en Tiempo Real")
-
-    if not db:
-        st.error("⚠️ Error de conexión: No se encontraron credenciales de Supabase en 'secrets.toml'.")
-        st.info("Por favor configura [supabase] url y key.")
-    else:
-        if len(filter_date_range) == 2:
-            start_d, end_d = filter_date_range
-            raw_df = db.fetch_records(start_d, end_d)
-
-            if not raw_df.empty:
-                df = raw_df[
-                    (raw_df['maquina'].isin(filter_maquina)) &
-                    (raw_df['turno'].isin(filter_turn))
-                ]
-
-                if not df.empty:
-                    # --- KPIs GLOBALES (PROMEDIO) ---
-                    kpi_oee = df['oee'].mean()
-                    kpi_disp = df['disponibilidad'].mean()
-                    kpi_perf = df['rendimiento'].mean()
-                    kpi_ftt = df['ftt'].mean()
-                    kpi_scrap = df['scrap_pct'].mean()
-
-                    st.markdown("### Indicadores Clave de Rendimiento (KPIs)")
-                    col1, col2, col3, col4 = st.columns(4)
-
-                    with col1:
-                        st.altair_chart(make_donut(kpi_oee, 'OEE', 'blue'), use_container_width=True)
-                        st.metric("OEE Global", f"{kpi_oee:.2f}%", delta=f"{kpi_oee-meta_oee:.2f}% vs Meta")
-                    with col2:
-                        st.altair_chart(make_donut(kpi_disp, 'Disponibilidad', 'green'), use_container_width=True)
-                        st.metric("Disponibilidad", f"{kpi_disp:.2f}%")
-                    with col3:
-                        st.altair_chart(make_donut(kpi_perf, 'Rendimiento', 'orange'), use_container_width=True)
-                        st.metric("Eficiencia / Rendimiento", f"{kpi_perf:.2f}%")
-                    with col4:
-                        st.altair_chart(make_donut(kpi_ftt, 'FTT', 'red'), use_container_width=True)
-                        st.metric("FTT (Calidad)", f"{kpi_ftt:.2f}%")
-                        st.markdown(f"<h4 style='text-align: center; color: #ef4444;'>🚨 Scrap Global: {kpi_scrap:.2f}%</h4>", unsafe_allow_html=True)
-
-                    st.markdown("---")
-
-                    # --- FUNCIÓN PARA AGRUPAR PROMEDIOS ---
-                    def avg_metrics(x):
-                        return pd.Series({
-                            'oee': x['oee'].mean(),
-                            'disp': x['disponibilidad'].mean(),
-                            'perf': x['rendimiento'].mean(),
-                            'ftt': x['ftt'].mean(),
-                            'scrap_pct': x['scrap_pct'].mean()
-                        })
-
-                    # Gráficos de Tendencia (existentes)
-                    c1, c2 = st.columns(2)
-
-                    with c1:
-                        df_daily = df.groupby('fecha').apply(avg_metrics, include_groups=False).reset_index()
-                        fig_trend = px.line(df_daily, x='fecha', y='oee', markers=True,
-                                          hover_data={'oee': ':.2f}%', 'ftt': ':.2f}%', 'scrap_pct': ':.2f}%'},
-                                          title="Tendencia OEE Diaria (Promedio)", template="plotly_dark")
-                        fig_trend.add_hline(y=meta_oee, line_dash="dash", line_color="green", annotation_text=f"Meta {meta_oee}%")
-                        fig_trend.update_traces(line=dict(color="#38bdf8", width=3), marker=dict(size=8))
-                        st.plotly_chart(fig_trend, use_container_width=True, key="tab1_trend_oee")
-
-                    with c2:
-                        df['mes'] = pd.to_datetime(df['fecha']).dt.strftime('%Y-%m')
-                        df_monthly = df.groupby('mes').apply(avg_metrics, include_groups=False).reset_index()
-                        fig_month = px.bar(df_monthly, x='mes', y='oee',
-                                         hover_data={'oee': ':.2f}%', 'ftt': ':.2f}%', 'scrap_pct': ':.2f}%'},
-                                         title="Tendencia OEE Mensual (Promedio)", template="plotly_dark",
-                                         color='oee', color_continuous_scale='Blues')
-                        fig_month.add_hline(y=meta_oee, line_dash="dash", line_color="green", annotation_text=f"Meta {meta_oee}%")
-                        st.plotly_chart(fig_month, use_container_width=True, key="tab1_trend_month")
-
-                    # --- NUEVAS GRÁFICAS: TENDENCIA DIARIA Y MENSUAL DE OEE, FTT Y SCRAP ---
-                    st.markdown("---")
-                    st.subheader("📈 Tendencia Diaria de OEE, FTT y Scrap")
-                    df_daily_all = df.groupby('fecha').apply(
-                        lambda x: pd.Series({
-                            'oee': x['oee'].mean(),
-                            'ftt': x['ftt'].mean(),
-                            'scrap_pct': x['scrap_pct'].mean()
-                        }), include_groups=False
-                    ).reset_index()
-                    fig_trend_all = px.line(df_daily_all, x='fecha', y=['oee', 'ftt', 'scrap_pct'],
-                                            labels={'value': 'Porcentaje (%)', 'variable': 'Métrica'},
-                                            title="Tendencia Diaria - OEE, FTT y Scrap",
-                                            template="plotly_dark",
-                                            color_discrete_map={'oee': '#38bdf8', 'ftt': '#10b981', 'scrap_pct': '#ef4444'})
-                    fig_trend_all.update_traces(mode='lines+markers', marker=dict(size=6))
-                    st.plotly_chart(fig_trend_all, use_container_width=True, key="tab1_trend_all")
-
-                    st.subheader("📈 Tendencia Mensual de OEE, FTT y Scrap")
-                    df_monthly_all = df.groupby('mes').apply(
-                        lambda x: pd.Series({
-                            'oee': x['oee'].mean(),
-                            'ftt': x['ftt'].mean(),
-                            'scrap_pct': x['scrap_pct'].mean()
-                        }), include_groups=False
-                    ).reset_index()
-                    fig_month_all = px.bar(df_monthly_all, x='mes', y=['oee', 'ftt', 'scrap_pct'],
-                                           barmode='group',
-                                           labels={'value': 'Porcentaje (%)', 'variable': 'Métrica'},
-                                           title="Tendencia Mensual - OEE, FTT y Scrap",
-                                           template="plotly_dark",
-                                           color_discrete_map={'oee': '#38bdf8', 'ftt': '#10b981', 'scrap_pct': '#ef4444'})
-                    st.plotly_chart(fig_month_all, use_container_width=True, key="tab1_month_all")
-
-                    # --- TOP 5 MÁQUINAS CON PEOR OEE ---
-                    st.markdown("---")
-                    st.subheader("🏆 Top 5 Máquinas con Peor OEE (Promedio)")
-                    df_mach_oee = df.groupby('maquina').apply(
-                        lambda x: pd.Series({'oee': x['oee'].mean()}), include_groups=False
-                    ).reset_index().sort_values('oee', ascending=True).head(5)
-                    if not df_mach_oee.empty:
-                        fig_top5 = px.bar(df_mach_oee, x='oee', y='maquina', orientation='h',
-                                          color='oee', color_continuous_scale='RdYlGn_r',
-                                          title="Top 5 Peor OEE por Máquina",
-                                          labels={'oee': 'OEE Promedio (%)', 'maquina': 'Máquina'},
-                                          template="plotly_dark")
-                        fig_top5.update_layout(coloraxis_colorbar=dict(title="OEE %"))
-                        st.plotly_chart(fig_top5, use_container_width=True, key="tab1_top5")
-                    else:
-                        st.info("No hay suficientes datos para mostrar el top 5.")
-
-                    # Pareto de Tiempos Muertos y Pareto de Scrap (existentes)
-                    st.markdown("---")
-                    c3, c4 = st.columns(2)
-
-                    with c3:
-                        failure_cols = ['ajuste', 'falla_mecanica', 'falla_electrica', 'falta_personal', 'falta_material', 'cambio_modelo']
-                        failures = df[failure_cols].sum().sort_values(ascending=False).reset_index()
-                        failures.columns = ['Falla', 'Minutos']
-                        failures['Acumulado'] = (failures['Minutos'].cumsum() / failures['Minutos'].sum() * 100).fillna(0)
-
-                        fig_pareto = make_subplots(specs=[[{"secondary_y": True}]])
-                        fig_pareto.add_trace(go.Bar(x=failures['Falla'], y=failures['Minutos'], name="Minutos", marker_color="#ef4444"), secondary_y=False)
-                        fig_pareto.add_trace(go.Scatter(x=failures['Falla'], y=failures['Acumulado'], name="% Acumulado", marker_color="#3b82f6"), secondary_y=True)
-                        fig_pareto.update_layout(title="Pareto de Tiempo Muerto (Minutos)", template="plotly_dark")
-                        st.plotly_chart(fig_pareto, use_container_width=True, key="tab1_pareto_time")
-
-                    with c4:
-                        # Pareto de contribuyentes de scrap
-                        scrap_cols = ['scrap_setup', 'scrap_pruebas', 'scrap_msf', 'scrap_tubo',
-                                      'scrap_soldadura_quemada', 'scrap_ajuste', 'scrap_soldadura_porosa',
-                                      'scrap_falta_soldadura', 'scrap_primera_pieza']
-                        # Asegurar que existan todas las columnas
-                        for col in scrap_cols:
-                            if col not in df.columns:
-                                df[col] = 0
-                        scrap_contrib = df[scrap_cols].sum().sort_values(ascending=False).reset_index()
-                        scrap_contrib.columns = ['Causa', 'Cantidad']
-                        scrap_contrib['Acumulado'] = (scrap_contrib['Cantidad'].cumsum() / scrap_contrib['Cantidad'].sum() * 100).fillna(0)
-
-                        fig_pareto_scrap = make_subplots(specs=[[{"secondary_y": True}]])
-                        fig_pareto_scrap.add_trace(go.Bar(x=scrap_contrib['Causa'], y=scrap_contrib['Cantidad'], name="Piezas", marker_color="#f59e0b"), secondary_y=False)
-                        fig_pareto_scrap.add_trace(go.Scatter(x=scrap_contrib['Causa'], y=scrap_contrib['Acumulado'], name="% Acumulado", marker_color="#3b82f6"), secondary_y=True)
-                        fig_pareto_scrap.update_layout(title="Pareto de Causas de Scrap (Piezas)", template="plotly_dark")
-                        st.plotly_chart(fig_pareto_scrap, use_container_width=True, key="tab1_pareto_scrap")
-
-                    # Desglose de KPIs por máquina (existente)
-                    st.markdown("---")
-                    df_mach = df.groupby('maquina').apply(avg_metrics, include_groups=False).reset_index()
-                    df_mach_melt = df_mach.rename(columns={'disp': 'Disponibilidad', 'perf': 'Rendimiento', 'ftt': 'FTT'})
-                    fig_bar = px.bar(df_mach_melt, x='maquina', y=['Disponibilidad', 'Rendimiento', 'FTT'],
-                                title="Desglose de KPIs por Máquina (Promedio)", barmode='group',
-                                template="plotly_dark", labels={'value': 'Porcentaje (%)', 'variable': 'KPI'})
-                    st.plotly_chart(fig_bar, use_container_width=True, key="tab1_kpi_desglose")
-
-                else:
-                    st.warning("No hay datos para los filtros seleccionados.")
-            else:
-                st.info("No se encontraron registros en el rango de fechas seleccionado.")
-        else:
-            st.info("Seleccione un rango de fechas válido.")
-
-# -----------------------------------------------------------------------------
-# TAB 2: CAPTURA DE DATOS (con contribuidores de scrap y hora en lista desplegable)
-# -----------------------------------------------------------------------------
-with tab2:
-    st.header("📝 Nuevo Registro Rotarys")
-
-    col_dyn1, col_dyn2 = st.columns(2)
-    with col_dyn1:
-        f_maquina = st.selectbox("🏭 Seleccionar Máquina", list(MAQUINAS_RATES.keys()))
-    with col_dyn2:
-        f_rate = MAQUINAS_RATES[f_maquina]
-        st.info(f"⚙️ **Rate Teórico Automático:** `{f_rate} u/h`")
-
-    with st.form("oee_form", clear_on_submit=True):
-        st.markdown(f"***Capturando datos para: {f_maquina}***")
-
-        col1, col2, col3, col4 = st.columns(4)
-
-        with col1:
-            f_fecha = st.date_input("Fecha", date.today())
-            # Hora en lista desplegable de 6:00 a 23:00
-            opciones_hora = [f"{i}:00" for i in range(6, 24)]
-            hora_actual = datetime.now().hour
-            if hora_actual < 6 or hora_actual > 23:
-                hora_actual = 6
-            default_index = opciones_hora.index(f"{hora_actual}:00")
-            f_hora_str = st.selectbox("Hora", opciones_hora, index=default_index)
-            f_hora = int(f_hora_str.split(":")[0])
-
-        with col2:
-            f_turno = st.selectbox("Turno", [1, 2, 3])
-            f_tiempo_prog = st.number_input("Tiempo Programado (min)", min_value=0, value=60)
-
-        with col3:
-            f_producido = st.number_input("Total Producido", min_value=0)
-
-        with col4:
-            st.markdown("#### 📊 Scrap Total (calculado)")
-            scrap_total_display = st.empty()
-
-        st.markdown("#### 🧩 Desglose de Scrap (Piezas)")
-        sc1, sc2, sc3 = st.columns(3)
-        with sc1:
-            f_scrap_setup = st.number_input("Ajuste Set Up", min_value=0, value=0, step=1)
-            f_scrap_pruebas = st.number_input("Pruebas Destructivas", min_value=0, value=0, step=1)
-            f_scrap_msf = st.number_input("MSF/PNUT Quemados", min_value=0, value=0, step=1)
-        with sc2:
-            f_scrap_tubo = st.number_input("Tubo Quemado", min_value=0, value=0, step=1)
-            f_scrap_soldadura_quemada = st.number_input("Soldadura Quemada", min_value=0, value=0, step=1)
-            f_scrap_ajuste = st.number_input("Ajuste (scrap)", min_value=0, value=0, step=1)
-        with sc3:
-            f_scrap_soldadura_porosa = st.number_input("Soldadura Porosa", min_value=0, value=0, step=1)
-            f_scrap_falta_soldadura = st.number_input("Falta de Soldadura", min_value=0, value=0, step=1)
-            f_scrap_primera_pieza = st.number_input("Primera Pieza", min_value=0, value=0, step=1)
-
-        st.markdown("#### 🛑 Tiempos Muertos (Minutos)")
-        c1, c2, c3, c4, c5, c6 = st.columns(6)
-        with c1: f_ajuste = st.number_input("Ajuste", min_value=0)
-        with c2: f_mec = st.number_input("Falla Mecánica", min_value=0)
-        with c3: f_elec = st.number_input("Falla Eléctrica", min_value=0)
-        with c4: f_per = st.number_input("Falta Personal", min_value=0)
-        with c5: f_mat = st.number_input("Falta Material", min_value=0)
-        with c6: f_mod = st.number_input("Cambio Modelo", min_value=0)
-
-        submitted = st.form_submit_button("💾 Guardar Registro", type="primary")
-
-        if submitted:
-            metrics = calculate_metrics(
-                f_tiempo_prog, f_rate, f_producido,
-                f_scrap_setup, f_scrap_pruebas, f_scrap_msf, f_scrap_tubo,
-                f_scrap_soldadura_quemada, f_scrap_ajuste, f_scrap_soldadura_porosa,
-                f_scrap_falta_soldadura, f_scrap_primera_pieza,
-                f_ajuste, f_mec, f_elec, f_per, f_mat, f_mod
-            )
-
-            payload = {
-                "fecha": f_fecha.isoformat(),
-                "hora": f_hora,
-                "turno": f_turno,
-                "maquina": f_maquina,
-                "tiempo_programado_min": f_tiempo_prog,
-                "rate_teorico": f_rate,
-                "producido": f_producido,
-                "scrap": metrics["scrap_total"],
-                "scrap_setup": f_scrap_setup,
-                "scrap_pruebas": f_scrap_pruebas,
-                "scrap_msf": f_scrap_msf,
-                "scrap_tubo": f_scrap_tubo,
-                "scrap_soldadura_quemada": f_scrap_soldadura_quemada,
-                "scrap_ajuste": f_scrap_ajuste,
-                "scrap_soldadura_porosa": f_scrap_soldadura_porosa,
-                "scrap_falta_soldadura": f_scrap_falta_soldadura,
-                "scrap_primera_pieza": f_scrap_primera_pieza,
-                "ajuste": f_ajuste,
-                "falla_mecanica": f_mec,
-                "falla_electrica": f_elec,
-                "falta_personal": f_per,
-                "falta_material": f_mat,
-                "cambio_modelo": f_mod,
-                "tiempo_muerto": metrics["tiempo_muerto"],
-                "tiempo_funcionamiento": metrics["tiempo_funcionamiento"],
-                "disponibilidad": metrics["disponibilidad"],
-                "rendimiento": metrics["rendimiento"],
-                "calidad": metrics["calidad"],
-                "oee": metrics["oee"],
-                "scrap_pct": metrics["scrap_pct"],
-                "ftt": metrics["ftt"]
-            }
-
-            if db:
-                if db.insert_record(payload):
-                    st.success(f"✅ Guardado {f_maquina} - FTT: {metrics['ftt']:.2f}% | Scrap: {metrics['scrap_pct']:.2f}%")
-                else:
-                    st.error("❌ Error en BD.")
+# --- PÁGINA SELECCIONADA ---
+guardar_contexto(**contexto)
+pagina.run()
 
 # -----------------------------------------------------------------------------
-# TAB 3: REPORTES (con desglose de scrap y nuevas gráficas)
+# PANEL DE RENDIMIENTO (sidebar): etapas de esta corrida y percentiles entre corridas
 # -----------------------------------------------------------------------------
-def aplicar_semaforo(val):
-    if val < 70:
-        color = '#ef4444'
-    elif val < 85:
-        color = '#f59e0b'
-    else:
-        color = '#10b981'
-    return f'background-color: {color}; color: white; font-weight: bold'
-
-import base64
-
-def get_image_base64(path):
-    try:
-        with open(path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode()
-        return encoded_string
-    except Exception as e:
-        return ""
-
-with tab3:
-    st.markdown("<h2 style='text-align: center;'>📄 Generador de Reportes Interactivos</h2>", unsafe_allow_html=True)
-
-    if not db:
-        st.error("⚠️ Sin conexión a la base de datos.")
-    elif len(filter_date_range) == 2:
-        start_d, end_d = filter_date_range
-        raw_df_rep = db.fetch_records(start_d, end_d)
-
-        if not raw_df_rep.empty:
-            st.markdown("### 🔍 Refinar Reporte")
-            c_f1 = st.columns(1)[0]
-            with c_f1:
-                turnos_disponibles = [1, 2, 3]
-                rep_filter_turn = st.multiselect("Filtrar por Turno", turnos_disponibles, default=[1, 2, 3])
-
-            df_rep = raw_df_rep[
-                (raw_df_rep['maquina'].isin(filter_maquina)) &
-                (raw_df_rep['turno'].isin(rep_filter_turn))
-            ].copy()
-
-            if not df_rep.empty:
-                # Asegurar que existan las columnas de scrap (por si faltan en registros antiguos)
-                scrap_cols = ['scrap_setup', 'scrap_pruebas', 'scrap_msf', 'scrap_tubo',
-                              'scrap_soldadura_quemada', 'scrap_ajuste', 'scrap_soldadura_porosa',
-                              'scrap_falta_soldadura', 'scrap_primera_pieza']
-                for col in scrap_cols:
-                    if col not in df_rep.columns:
-                        df_rep[col] = 0
-
-                # --- MÉTRICAS GLOBALES (PROMEDIOS) ---
-                ftt_global_rep = df_rep['ftt'].mean()
-                scrap_global_rep = df_rep['scrap_pct'].mean()
-                total_prod_rep = df_rep['producido'].sum()
-
-                # --- PREPARACIÓN DE LA TABLA (con desglose de scrap) ---
-                df_rep['tiempo_prog_hrs'] = (df_rep['tiempo_programado_min'] / 60).round(2)
-
-                columnas_tabla = ['fecha', 'hora', 'turno', 'maquina', 'tiempo_prog_hrs',
-                                  'producido', 'scrap'] + scrap_cols + ['scrap_pct', 'ftt',
-                                  'disponibilidad', 'rendimiento', 'oee']
-                vista_tabla = df_rep[columnas_tabla].copy()
-                cols_kpi = ['scrap_pct', 'ftt', 'disponibilidad', 'rendimiento', 'oee'] + scrap_cols
-                vista_tabla[cols_kpi] = vista_tabla[cols_kpi].round(2)
-
-                st.markdown("### 🌎 Resumen Global del Período")
-                c_g1, c_g2, c_g3 = st.columns(3)
-                c_g1.metric("Total Producido", f"{total_prod_rep:,} pzas")
-                c_g2.metric("FTT Global (Promedio)", f"{ftt_global_rep:.2f}%")
-                c_g3.metric("Scrap Global (Promedio)", f"{scrap_global_rep:.2f}%", delta_color="inverse")
-                st.markdown("---")
-
-                st.subheader("Detalle de Operaciones Individuales (con desglose de scrap)")
-                try:
-                    styled_pivot = vista_tabla.style.map(aplicar_semaforo, subset=['oee', 'rendimiento', 'ftt'])
-                except:
-                    styled_pivot = vista_tabla.style.applymap(aplicar_semaforo, subset=['oee', 'rendimiento', 'ftt'])
-                st.dataframe(styled_pivot, use_container_width=True)
-
-                # --- GRÁFICAS EN STREAMLIT ---
-
-                def avg_metrics_report(x):
-                    return pd.Series({
-                        'oee': x['oee'].mean(),
-                        'disponibilidad': x['disponibilidad'].mean(),
-                        'rendimiento': x['rendimiento'].mean(),
-                        'ftt': x['ftt'].mean(),
-                        'scrap_pct': x['scrap_pct'].mean()
-                    })
-
-                # Gráfica OEE por máquina (existente)
-                df_mach_rep = df_rep.groupby('maquina').apply(avg_metrics_report, include_groups=False).reset_index()
-                # Tendencia diaria de OEE (existente)
-                df_daily_rep = df_rep.groupby('fecha').apply(avg_metrics_report, include_groups=False).reset_index()
-
-                # --- 1. OEE por máquina ---
-                st.subheader("📊 OEE Promedio por Máquina")
-                fig_bar = px.bar(df_mach_rep, x='maquina', y='oee', color='oee',
-                                color_continuous_scale='RdYlGn', title="OEE por Máquina (Promedio)",
-                                hover_data={'oee': ':.2f}%', 'ftt': ':.2f}%', 'scrap_pct': ':.2f}%'})
-                st.plotly_chart(fig_bar, use_container_width=True, key="report_bar")
-
-                # --- 2. Tendencia diaria de OEE ---
-                st.subheader("📈 Tendencia Diaria de OEE")
-                fig_trend_oee = px.line(df_daily_rep, x='fecha', y='oee', markers=True,
-                                        title="Tendencia Diaria OEE (Promedio)",
-                                        hover_data={'oee': ':.2f}%', 'ftt': ':.2f}%', 'scrap_pct': ':.2f}%'})
-                st.plotly_chart(fig_trend_oee, use_container_width=True, key="report_trend_oee")
-
-                # --- 3. Tendencia diaria de OEE, FTT y Scrap ---
-                st.subheader("📈 Tendencia Diaria de OEE, FTT y Scrap")
-                df_daily_all = df_rep.groupby('fecha').apply(
-                    lambda x: pd.Series({
-                        'oee': x['oee'].mean(),
-                        'ftt': x['ftt'].mean(),
-                        'scrap_pct': x['scrap_pct'].mean()
-                    }), include_groups=False
-                ).reset_index()
-                fig_trend_all = px.line(df_daily_all, x='fecha', y=['oee', 'ftt', 'scrap_pct'],
-                                        labels={'value': 'Porcentaje (%)', 'variable': 'Métrica'},
-                                        title="Tendencia Diaria - OEE, FTT y Scrap",
-                                        template="plotly_dark",
-                                        color_discrete_map={'oee': '#38bdf8', 'ftt': '#10b981', 'scrap_pct': '#ef4444'})
-                fig_trend_all.update_traces(mode='lines+markers', marker=dict(size=6))
-                st.plotly_chart(fig_trend_all, use_container_width=True, key="report_trend_all")
-
-                # --- 4. Tendencia mensual de OEE, FTT y Scrap ---
-                st.subheader("📈 Tendencia Mensual de OEE, FTT y Scrap")
-                df_rep['mes'] = pd.to_datetime(df_rep['fecha']).dt.strftime('%Y-%m')
-                df_monthly_all = df_rep.groupby('mes').apply(
-                    lambda x: pd.Series({
-                        'oee': x['oee'].mean(),
-                        'ftt': x['ftt'].mean(),
-                        'scrap_pct': x['scrap_pct'].mean()
-                    }), include_groups=False
-                ).reset_index()
-                fig_month_all = px.bar(df_monthly_all, x='mes', y=['oee', 'ftt', 'scrap_pct'],
-                                       barmode='group',
-                                       labels={'value': 'Porcentaje (%)', 'variable': 'Métrica'},
-                                       title="Tendencia Mensual - OEE, FTT y Scrap",
-                                       template="plotly_dark",
-                                       color_discrete_map={'oee': '#38bdf8', 'ftt': '#10b981', 'scrap_pct': '#ef4444'})
-                st.plotly_chart(fig_month_all, use_container_width=True, key="report_month_all")
-
-                # --- 5. Top 5 máquinas con peor OEE ---
-                st.subheader("🏆 Top 5 Máquinas con Peor OEE (Promedio)")
-                df_mach_oee_rep = df_rep.groupby('maquina').apply(
-                    lambda x: pd.Series({'oee': x['oee'].mean()}), include_groups=False
-                ).reset_index().sort_values('oee', ascending=True).head(5)
-                if not df_mach_oee_rep.empty:
-                    fig_top5 = px.bar(df_mach_oee_rep, x='oee', y='maquina', orientation='h',
-                                      color='oee', color_continuous_scale='RdYlGn_r',
-                                      title="Top 5 Peor OEE por Máquina",
-                                      labels={'oee': 'OEE Promedio (%)', 'maquina': 'Máquina'},
-                                      template="plotly_dark")
-                    fig_top5.update_layout(coloraxis_colorbar=dict(title="OEE %"))
-                else:
-                    # Crear una figura vacía para evitar errores en el HTML
-                    fig_top5 = go.Figure()
-                    fig_top5.update_layout(title="No hay datos suficientes para mostrar el top 5")
-                st.plotly_chart(fig_top5, use_container_width=True, key="report_top5")
-
-                # --- Pareto de Tiempos Muertos y Pareto de Scrap ---
-                st.subheader("Análisis de Tiempos Muertos y Scrap")
-
-                # Pareto de tiempos muertos
-                failure_cols = ['ajuste', 'falla_mecanica', 'falla_electrica', 'falta_personal', 'falta_material', 'cambio_modelo']
-                failures_rep = df_rep[failure_cols].sum().sort_values(ascending=False).reset_index()
-                failures_rep.columns = ['Falla', 'Minutos']
-                failures_rep['Acumulado'] = (failures_rep['Minutos'].cumsum() / failures_rep['Minutos'].sum() * 100).fillna(0)
-
-                fig_pareto = make_subplots(specs=[[{"secondary_y": True}]])
-                fig_pareto.add_trace(go.Bar(x=failures_rep['Falla'], y=failures_rep['Minutos'], name="Minutos", marker_color="#ef4444"), secondary_y=False)
-                fig_pareto.add_trace(go.Scatter(x=failures_rep['Falla'], y=failures_rep['Acumulado'], name="% Acumulado", marker_color="#3b82f6"), secondary_y=True)
-                fig_pareto.update_layout(title="Pareto Global de Tiempos Muertos", template="plotly_dark")
-                st.plotly_chart(fig_pareto, use_container_width=True, key="report_pareto")
-
-                # Pareto de Scrap
-                scrap_contrib_rep = df_rep[scrap_cols].sum().sort_values(ascending=False).reset_index()
-                scrap_contrib_rep.columns = ['Causa', 'Piezas']
-                scrap_contrib_rep['Acumulado'] = (scrap_contrib_rep['Piezas'].cumsum() / scrap_contrib_rep['Piezas'].sum() * 100).fillna(0)
-
-                fig_pareto_scrap = make_subplots(specs=[[{"secondary_y": True}]])
-                fig_pareto_scrap.add_trace(go.Bar(x=scrap_contrib_rep['Causa'], y=scrap_contrib_rep['Piezas'], name="Piezas", marker_color="#f59e0b"), secondary_y=False)
-                fig_pareto_scrap.add_trace(go.Scatter(x=scrap_contrib_rep['Causa'], y=scrap_contrib_rep['Acumulado'], name="% Acumulado", marker_color="#3b82f6"), secondary_y=True)
-                fig_pareto_scrap.update_layout(title="Pareto Global de Causas de Scrap", template="plotly_dark")
-                st.plotly_chart(fig_pareto_scrap, use_container_width=True, key="report_pareto_scrap")
-
-                # --- REPORTE HTML (con todas las gráficas incluidas) ---
-                logo_b64 = get_image_base64("EA_2.png")
-                logo_html = f'<img src="data:image/png;base64,{logo_b64}" style="width:120px; position:absolute; top:30px; left:30px;">' if logo_b64 else ""
-
-                html_table = styled_pivot.to_html()
-
-                html_kpis_globales = f"""
-                <div style="display: flex; justify-content: space-around; background-color: #1e293b; padding: 20px; border-radius: 10px; border: 1px solid #334155; margin-bottom: 30px;">
-                    <div>
-                        <h2 style="color: #38bdf8; margin: 0; font-size: 2em;">{total_prod_rep:,}</h2>
-                        <p style="margin: 0; color: #94a3b8; font-weight: bold; text-transform: uppercase;">Total Producido</p>
-                    </div>
-                    <div>
-                        <h2 style="color: #10b981; margin: 0; font-size: 2em;">{ftt_global_rep:.2f}%</h2>
-                        <p style="margin: 0; color: #94a3b8; font-weight: bold; text-transform: uppercase;">FTT Global (Promedio)</p>
-                    </div>
-                    <div>
-                        <h2 style="color: #ef4444; margin: 0; font-size: 2em;">{scrap_global_rep:.2f}%</h2>
-                        <p style="margin: 0; color: #94a3b8; font-weight: bold; text-transform: uppercase;">Scrap Global (Promedio)</p>
-                    </div>
-                </div>
-                """
-
-                dark_layout = dict(
-                    template="plotly_dark",
-                    paper_bgcolor="#0f172a",
-                    plot_bgcolor="#0f172a",
-                    font=dict(color="#f8fafc"),
-                )
-
-                # Aplicar el dark layout a todas las gráficas
-                fig_bar.update_layout(**dark_layout)
-                fig_trend_oee.update_layout(**dark_layout)
-                fig_trend_all.update_layout(**dark_layout)
-                fig_month_all.update_layout(**dark_layout)
-                fig_top5.update_layout(**dark_layout)
-                fig_pareto.update_layout(**dark_layout)
-                fig_pareto_scrap.update_layout(**dark_layout)
-
-                # Ajustes visuales adicionales
-                fig_trend_oee.update_traces(line=dict(color="#38bdf8", width=3), marker=dict(size=6))
-                fig_trend_all.update_traces(marker=dict(size=6))
-
-                reporte_completo = f"""
-                <html>
-                <head>
-                    <meta charset="utf-8">
-                    <title>Reporte Ejecutivo OEE Rotarys | EA Innovation</title>
-                    <style>
-                        body {{
-                            background-color: #0f172a;
-                            color: #f8fafc;
-                            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                            margin: 0;
-                            padding: 40px;
-                            text-align: center;
-                        }}
-                        .page {{
-                            max-width: 1200px;
-                            margin: 0 auto 50px auto;
-                            background: linear-gradient(135deg, #1e293b 0%, #0f172a 100%);
-                            padding: 60px 50px 50px 50px;
-                            border-radius: 15px;
-                            box-shadow: 0 10px 25px rgba(0,0,0,0.5);
-                            border: 1px solid #334155;
-                            min-height: 1000px;
-                            position: relative;
-                        }}
-                        h1 {{ color: #38bdf8; font-size: 2.5em; margin-bottom: 10px; }}
-                        h3 {{ color: #94a3b8; border-bottom: 1px solid #334155; padding-bottom: 10px; margin-top: 40px; }}
-                        p {{ color: #94a3b8; font-size: 1.2em; margin: 5px 0; }}
-                        table {{
-                            width: 100%;
-                            border-collapse: collapse;
-                            margin: 30px auto;
-                            background-color: rgba(15, 23, 42, 0.6);
-                            border-radius: 10px;
-                            overflow: hidden;
-                            font-size: 0.8em;
-                        }}
-                        th {{
-                            background-color: #334155;
-                            color: #38bdf8;
-                            padding: 10px;
-                            text-align: center;
-                            text-transform: uppercase;
-                        }}
-                        td {{
-                            padding: 8px;
-                            border-bottom: 1px solid #334155;
-                            text-align: center;
-                        }}
-                        .chart-container {{
-                            background-color: #0f172a;
-                            border: 1px solid #334155;
-                            border-radius: 12px;
-                            padding: 10px;
-                            margin: 20px auto;
-                            max-width: 100%;
-                        }}
-                        .page-break {{ page-break-before: always; }}
-                        .footer {{
-                            margin-top: 60px;
-                            font-size: 0.9em;
-                            color: #64748b;
-                            border-top: 1px solid #334155;
-                            padding-top: 20px;
-                        }}
-                    </style>
-                </head>
-                <body>
-                    <div class="page">
-                        {logo_html}
-                        <h1>EA Innovation Suite</h1>
-                        <p>Reporte de Desempeño OEE - Área de Rotarys</p>
-                        <p style="font-size: 1em; opacity: 0.8; margin-bottom: 30px;">Período: {start_d} al {end_d}</p>
-
-                        {html_kpis_globales}
-
-                        <h3>Listado Detallado de Operaciones (con desglose de scrap)</h3>
-                        <div style="overflow-x: auto;">
-                            {html_table}
-                        </div>
-
-                        <h3>OEE Promedio por Máquina</h3>
-                        <div class="chart-container">
-                            {fig_bar.to_html(full_html=False, include_plotlyjs='cdn')}
-                        </div>
-
-                        <h3>Tendencia Diaria de OEE</h3>
-                        <div class="chart-container">
-                            {fig_trend_oee.to_html(full_html=False, include_plotlyjs=False)}
-                        </div>
-
-                        <div class="footer">
-                            Generado por Master Engineer Erik Armenta | EA Innovation Suite 2026
-                        </div>
-                    </div>
-
-                    <div class="page-break"></div>
-
-                    <div class="page">
-                        {logo_html}
-                        <h1>Análisis Detallado de Tendencias y Rendimiento</h1>
-                        <p>Comparativa de OEE, FTT y Scrap</p>
-
-                        <h3>Tendencia Diaria - OEE, FTT y Scrap</h3>
-                        <div class="chart-container">
-                            {fig_trend_all.to_html(full_html=False, include_plotlyjs=False)}
-                        </div>
-
-                        <h3>Tendencia Mensual - OEE, FTT y Scrap</h3>
-                        <div class="chart-container">
-                            {fig_month_all.to_html(full_html=False, include_plotlyjs=False)}
-                        </div>
-
-                        <h3>Top 5 Máquinas con Peor OEE</h3>
-                        <div class="chart-container">
-                            {fig_top5.to_html(full_html=False, include_plotlyjs=False)}
-                        </div>
-
-                        <h3>Pareto Global de Tiempos Muertos (Minutos)</h3>
-                        <div class="chart-container">
-                            {fig_pareto.to_html(full_html=False, include_plotlyjs=False)}
-                        </div>
-
-                        <h3>Pareto Global de Causas de Scrap (Piezas)</h3>
-                        <div class="chart-container">
-                            {fig_pareto_scrap.to_html(full_html=False, include_plotlyjs=False)}
-                        </div>
-
-                        <div class="footer">
-                            Este reporte constituye una auditoría técnica de EA Innovation. <br>
-                            Cálculos basados en promedios de los valores registrados.
-                        </div>
-                    </div>
-                </body>
-                </html>
-                """
-
-                col1, col2 = st.columns(2)
-                with col1: st.download_button("📊 Descargar Reporte Completo", reporte_completo, f"Reporte_OEE_Rotarys_{start_d}.html", "text/html", use_container_width=True)
-                with col2: st.download_button("📊 Descargar Datos CSV", df_rep.to_csv(index=False).encode('utf-8'), "datos_oee_rotarys.csv", "text/csv", use_container_width=True)
-            else:
-                st.warning("No hay datos para los filtros seleccionados.")
-        else:
-            st.info("No se encontraron registros en el rango de fechas seleccionado.")
+total_corrida = INSTRUMENTATION.end_rerun(corrida)
+if panel_rendimiento:
+    with contenedor_rendimiento:
+        st.caption(f"Esta corrida: {total_corrida['ms']:,.0f} ms en {len(corrida)} etapas medidas")
+        if corrida:
+            etapas = pd.DataFrame(corrida)
+            columnas = ['etapa', 'ms', 'mem_kb'] + [c for c in ('planta', 'filas', 'bytes', 'cache') if c in etapas.columns]
+            st.dataframe(etapas[columnas], hide_index=True, use_container_width=True)
+        cache_figuras = FIGURAS.stats()
+        st.caption(f"Caché de figuras: {cache_figuras['hits']:,} aciertos / {cache_figuras['misses']:,} fallos · "
+                   f"{cache_figuras['entries']} figuras ({cache_figuras['kb']:,.0f} KB)")
+        st.markdown("**p50 / p95 por etapa (todas las corridas)**")
+        st.dataframe(INSTRUMENTATION.summary().round(1), hide_index=True, use_container_width=True)
+        st.button("🧹 Reiniciar mediciones", on_click=INSTRUMENTATION.reset, key="rendimiento_reset")
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: rollups con groupby().apply(lambda -> pd.Series) (implementación anterior de
+las pestañas Dashboard y Reportes) vs compute_rollups (una pasada + re-agregación).
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_aggregations --rows 100000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_metrics import synthetic_inputs
+from modules.aggregations import compute_rollups
+from modules.metrics import calculate_metrics_batch, MAQUINAS_RATES, KPI_COLS
+
+
+def synthetic_records(rows: int, days: int = 90, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = synthetic_inputs(rows, seed)
+    maquinas = np.array(list(MAQUINAS_RATES))
+    df['maquina'] = rng.choice(maquinas, size=rows)
+    df['rate_teorico'] = df['maquina'].map(MAQUINAS_RATES)
+    df['turno'] = rng.integers(1, 4, size=rows)
+    df['fecha'] = (pd.Timestamp('2026-01-01') + pd.to_timedelta(rng.integers(0, days, size=rows), unit='D')).strftime('%Y-%m-%d')
+    metrics = calculate_metrics_batch(df)
+    df['scrap'] = metrics['scrap_total']
+    for col in KPI_COLS + ['tiempo_muerto']:
+        df[col] = metrics[col]
+    return df
+
+
+def legacy_rollups(df: pd.DataFrame) -> dict:
+    """Réplica de los groupby().apply de ambas pestañas antes del motor compartido."""
+    def avg_metrics(x):
+        return pd.Series({
+            'oee': x['oee'].mean(),
+            'disponibilidad': x['disponibilidad'].mean(),
+            'rendimiento': x['rendimiento'].mean(),
+            'ftt': x['ftt'].mean(),
+            'scrap_pct': x['scrap_pct'].mean()
+        })
+
+    def three(x):
+        return pd.Series({'oee': x['oee'].mean(), 'ftt': x['ftt'].mean(), 'scrap_pct': x['scrap_pct'].mean()})
+
+    out = {}
+    for tab in ('dashboard', 'reportes'):
+        df = df.copy()
+        df['mes'] = pd.to_datetime(df['fecha']).dt.strftime('%Y-%m')
+        out[tab] = {
+            'fecha': df.groupby('fecha').apply(avg_metrics, include_groups=False).reset_index(),
+            'mes': df.groupby('mes').apply(avg_metrics, include_groups=False).reset_index(),
+            'fecha_all': df.groupby('fecha').apply(three, include_groups=False).reset_index(),
+            'mes_all': df.groupby('mes').apply(three, include_groups=False).reset_index(),
+            'maquina_oee': df.groupby('maquina').apply(lambda x: pd.Series({'oee': x['oee'].mean()}),
+                                                       include_groups=False).reset_index(),
+            'maquina': df.groupby('maquina').apply(avg_metrics, include_groups=False).reset_index(),
+        }
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_records(args.rows)
+
+    def best_of(fn):
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            result = fn(df)
+            times.append(time.perf_counter() - t0)
+        return min(times), result
+
+    t_legacy, legacy = best_of(legacy_rollups)
+    # Ambas pestañas consumen el mismo resultado
+    t_new, rollups = best_of(compute_rollups)
+
+    for grain in ('fecha', 'mes', 'maquina'):
+        expected = legacy['dashboard'][grain].set_index(grain)[KPI_COLS]
+        got = rollups[grain].set_index(grain)[KPI_COLS].astype(float)
+        if not np.allclose(expected.to_numpy(), got.to_numpy(), rtol=1e-9, atol=1e-9):
+            raise SystemExit(f"Mismatch in rollup '{grain}'")
+
+    print(f"rows={args.rows}")
+    print(f"groupby().apply (ambas pestañas): {t_legacy:8.3f} s")
+    print(f"compute_rollups (compartido)    : {t_new:8.3f} s")
+    print(f"speedup                         : {t_legacy / t_new:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
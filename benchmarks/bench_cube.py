@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: cambio de filtros de máquina / turno en el Dashboard.
+
+  - mascara: implementación anterior de IncrementalRollup.rollups (máscaras booleanas
+    sobre el rollup fecha × máquina × turno y re-agregación a cada grano)
+  - cubo: OEECube (rebanar y sumar el cubo fecha × (hora, turno) × máquina)
+
+Ambos se verifican contra rollup() sobre las filas crudas filtradas.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_cube --rows 200000 --days 365
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.supabase_standin import synthetic_table
+from modules.aggregations import BASE_GRAIN, CUBE_GRAIN, GRAINS, KPI_COLS, OEECube, rollup, rollups_from_base
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    df = synthetic_table(args.rows, args.days)
+    # Como en piso: cada hora pertenece a un turno
+    df['turno'] = np.where(df['hora'] < 14, 1, np.where(df['hora'] < 22, 2, 3))
+    maquinas = sorted(df['maquina'].unique())
+    filtros = [(maquinas, [1, 2, 3]), (maquinas[:2], [1]), (maquinas[3:9], [2, 3]), ([maquinas[-1]], [3])]
+
+    base = rollup(df, BASE_GRAIN)
+    t0 = time.perf_counter()
+    cube = OEECube(rollup(df, CUBE_GRAIN))
+    t_build = time.perf_counter() - t0
+
+    def mascara(m, t):
+        return rollups_from_base(base[base['maquina'].isin(m) & base['turno'].isin(t)])
+
+    def cubo(m, t):
+        return cube.rollups(maquinas=m, turnos=t)
+
+    for m, t in filtros:
+        crudo = df[df['maquina'].isin(m) & df['turno'].isin(t)]
+        esperado = {name: rollup(crudo, grain) for name, grain in GRAINS.items()}
+        for fn in (mascara, cubo):
+            obtenido = fn(m, t)
+            for name in GRAINS:
+                if not np.allclose(esperado[name][KPI_COLS].to_numpy(dtype=float),
+                                   obtenido[name][KPI_COLS].to_numpy(dtype=float), rtol=1e-9):
+                    raise SystemExit(f"Mismatch in {fn.__name__} '{name}' ({m}, {t})")
+
+    def median_ms(fn):
+        times = []
+        for _ in range(args.repeat):
+            for m, t in filtros:
+                t0 = time.perf_counter()
+                fn(m, t)
+                times.append(time.perf_counter() - t0)
+        return np.median(times) * 1000
+
+    t_mask, t_cube = median_ms(mascara), median_ms(cubo)
+    print(f"rows={args.rows} days={args.days} cubo={cube.valores.shape} ({cube.nbytes / 1e6:.1f} MB, "
+          f"construcción {t_build * 1000:.1f} ms)")
+    print(f"máscaras + re-agregación : {t_mask:8.1f} ms por cambio de filtro")
+    print(f"cubo (rebanar y sumar)   : {t_cube:8.1f} ms por cambio de filtro")
+    print(f"speedup                  : {t_mask / t_cube:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
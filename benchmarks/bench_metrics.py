@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: calculate_metrics fila por fila vs calculate_metrics_batch.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_metrics --rows 100000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from modules.metrics import (calculate_metrics, calculate_metrics_batch,
+                             SCRAP_COLS, FAILURE_COLS, DERIVED_COLS)
+
+
+def synthetic_inputs(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = {
+        'tiempo_programado_min': rng.choice([0, 30, 60], size=rows, p=[0.02, 0.08, 0.90]),
+        'rate_teorico': rng.choice([100, 115, 120, 180, 200], size=rows),
+        'producido': rng.integers(0, 220, size=rows),
+    }
+    for col in SCRAP_COLS:
+        data[col] = rng.integers(0, 4, size=rows)
+    for col in FAILURE_COLS:
+        data[col] = rng.integers(0, 15, size=rows)
+    return pd.DataFrame(data)
+
+
+def run_loop(df: pd.DataFrame) -> pd.DataFrame:
+    records = []
+    for row in df.itertuples(index=False):
+        records.append(calculate_metrics(
+            int(row.tiempo_programado_min), int(row.rate_teorico), int(row.producido),
+            *(int(getattr(row, c)) for c in SCRAP_COLS),
+            *(int(getattr(row, c)) for c in FAILURE_COLS)
+        ))
+    return pd.DataFrame(records, columns=DERIVED_COLS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    df = synthetic_inputs(args.rows)
+
+    t0 = time.perf_counter()
+    expected = run_loop(df)
+    t_loop = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    result = calculate_metrics_batch(df)
+    t_batch = time.perf_counter() - t0
+
+    for col in DERIVED_COLS:
+        a = expected[col].to_numpy(dtype=np.float64)
+        b = result[col].to_numpy(dtype=np.float64)
+        if not np.array_equal(a.view(np.int64), b.view(np.int64)):
+            raise SystemExit(f"Mismatch in column '{col}'")
+
+    print(f"rows={args.rows}")
+    print(f"loop   calculate_metrics       : {t_loop:8.3f} s")
+    print(f"vector calculate_metrics_batch : {t_batch:8.3f} s")
+    print(f"speedup                        : {t_loop / t_batch:8.1f}x (bit-for-bit identical)")
+
+
+if __name__ == '__main__':
+    main()
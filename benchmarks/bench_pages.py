@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de arranque en frío y de interacción por página de la app (Dashboard,
+Captura, Reportes), sin red y sin navegador.
+
+Cada página se mide en un proceso nuevo: la app corre con streamlit.testing (AppTest)
+sobre una base SQLite con registros sintéticos y [app] pagina_inicial = <página>.
+  - arranque_s: primera corrida (importaciones, conexión y cálculo de la página)
+  - interaccion_s: segunda corrida completa (lo que paga cada interacción fuera de
+    fragmentos)
+  - graficas_cargadas: si plotly / altair quedaron importados en el proceso
+
+En revisiones anteriores a la división en páginas, pagina_inicial no existe y todas
+las mediciones corresponden a la app completa (la línea base de la comparación).
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_pages --rows 100000 --out bench_pages.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "OEE_Dash.py")
+PAGINAS = ["dashboard", "captura", "reportes"]
+DAYS = 30
+
+
+def seed(path: str, rows: int):
+    """
+    Base SQLite con 'rows' registros en los últimos DAYS días (el rango por defecto del sidebar).
+    """
+    # Importaciones locales: el proceso hijo de cada página no debe cargar plotly de antemano
+    from benchmarks.supabase_standin import synthetic_table
+    from modules.sqlite_backend import SQLiteManager
+
+    table = synthetic_table(rows, DAYS)
+    # Fechas sintéticas desplazadas para que terminen hoy
+    fechas = sorted(table['fecha'].unique())
+    desplazamiento = date.today() - date.fromisoformat(fechas[-1])
+    table['fecha'] = (table['fecha'].astype('datetime64[ns]') + desplazamiento).dt.strftime('%Y-%m-%d')
+    db = SQLiteManager(path)
+    db.insert_records(table.drop(columns=['id']).to_dict('records'), chunk_size=10_000, raise_errors=True)
+
+
+def measure_page(pagina: str, db_path: str, spool_path: str) -> dict:
+    """
+    Corre en el proceso hijo: arranque en frío y una segunda corrida de 'pagina'.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=600)
+    at.secrets["storage"] = {"backend": "sqlite", "path": db_path}
+    at.secrets["spool"] = {"path": spool_path}
+    at.secrets["app"] = {"pagina_inicial": pagina}
+
+    t0 = time.perf_counter()
+    at.run()
+    arranque = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    at.run()
+    interaccion = time.perf_counter() - t0
+    return {
+        'pagina': pagina,
+        'arranque_s': arranque,
+        'interaccion_s': interaccion,
+        'graficas_cargadas': any(m in sys.modules for m in ('plotly.express', 'altair')),
+        'excepciones': [str(e.value) for e in at.exception],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--label', default="", help="Etiqueta libre de la corrida (p. ej. rama o cambio)")
+    parser.add_argument('--out', default="bench_pages.json")
+    parser.add_argument('--child', nargs=3, metavar=('PAGINA', 'DB', 'SPOOL'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_page(*args.child)))
+        return
+
+    from benchmarks.bench_pipeline import _git_revision
+
+    results = {
+        'label': args.label,
+        'revision': _git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'rows': args.rows,
+        'pages': [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "registros_oee.db")
+        seed(db_path, args.rows)
+        for pagina in PAGINAS:
+            # Proceso nuevo por página: las importaciones de una no cuentan en otra
+            salida = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_pages', '--child', pagina, db_path,
+                 os.path.join(tmp, f"capturas_{pagina}.db")],
+                capture_output=True, text=True, check=True)
+            medicion = json.loads(salida.stdout.strip().splitlines()[-1])
+            results['pages'].append(medicion)
+            print(f"{pagina:<10} arranque {medicion['arranque_s']:8.3f} s   "
+                  f"interacción {medicion['interaccion_s']:8.3f} s   "
+                  f"gráficas cargadas: {'sí' if medicion['graficas_cargadas'] else 'no'}")
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Resultados en {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark del flujo completo de la app: descarga → filtros → rollups → Paretos →
+gráficas → reporte HTML, con cada etapa medida por separado.
+
+Corre sin red contra el sustituto local de Supabase (benchmarks/supabase_standin.py),
+con oee_rollup desplegado y las respuestas cortadas a --max-rows filas como en PostgREST
+(la etapa rollup_rpc verifica que el rollup paginado cubra todos los registros), y
+escribe los resultados en JSON para comparar versiones:
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_pipeline --rows 10000 100000 1000000 --out resultados.json
+    python -m benchmarks.bench_pipeline --rows 100000 --label antes-del-cambio
+    python -m benchmarks.bench_pipeline --rows 100000 --backend sqlite
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import date, datetime
+
+from benchmarks.supabase_standin import StandInClient, synthetic_table
+from modules.aggregations import BASE_GRAIN, GRAINS, rollup, reaggregate, pareto
+from modules.metrics import MAQUINAS_RATES, FAILURE_COLS, SCRAP_COLS
+from modules.figure_cache import FIGURAS
+from modules.report import REPORT_COLS, COLUMNAS_DETALLE, report_figures, preparar_detalle, write_report
+from modules.sqlite_backend import SQLiteManager
+from modules.supabase_client import SupabaseManager
+
+DAYS = 90
+START = date(2026, 1, 1)
+END = date(2026, 3, 31)
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def make_backend(backend: str, rows: int, page_size: int, max_workers: int, max_rows: int = 1000):
+    """
+    'standin': SupabaseManager sobre el sustituto local de PostgREST (max-rows = 'max_rows').
+    'sqlite': SQLiteManager en memoria con los mismos registros.
+    """
+    table = synthetic_table(rows, DAYS)
+    if backend == 'sqlite':
+        db = SQLiteManager(":memory:")
+        db.insert_records(table.drop(columns=['id']).to_dict('records'), chunk_size=10_000, raise_errors=True)
+        return db
+    return SupabaseManager("http://standin", "standin", page_size=page_size, max_workers=max_workers,
+                           client=StandInClient(table, max_rows=max_rows, rollup_rpc=True))
+
+
+def run_pipeline(rows: int, repeat: int = 3, page_size: int = 1000, max_workers: int = 4,
+                 backend: str = 'standin', max_rows: int = 1000) -> dict:
+    """
+    Mide cada etapa con 'rows' registros sintéticos.
+    Returns:
+        dict {etapa: segundos} con el mejor tiempo de 'repeat' corridas.
+    """
+    db = make_backend(backend, rows, page_size, max_workers, max_rows)
+    # Filtros típicos del sidebar: 3 de cada 4 máquinas, dos turnos
+    maquinas = list(MAQUINAS_RATES)[: max(1, len(MAQUINAS_RATES) * 3 // 4)]
+    turnos = [1, 2]
+
+    best = {}
+
+    def timed(stage, fn):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        best[stage] = min(best.get(stage, elapsed), elapsed)
+        return result
+
+    for _ in range(repeat):
+        if hasattr(db, 'cache'):
+            db.cache.invalidate()
+        # Figuras en frío en cada repetición (sin la caché de modules/figure_cache.py)
+        FIGURAS.clear()
+        df = timed('fetch', lambda: db.fetch_records(START, END, columns=REPORT_COLS))
+        df = timed('filter', lambda: df[df['maquina'].isin(maquinas) & df['turno'].isin(turnos)])
+        # Rollup del lado del servidor al grano del Dashboard (varias páginas de max-rows)
+        servidor = timed('rollup_rpc', lambda: db.aggregate(START, END, grain=BASE_GRAIN,
+                                                           maquinas=maquinas, turnos=turnos))
+        if servidor['registros'].sum() != len(df):
+            raise SystemExit("Mismatch in 'rollup_rpc'")
+
+        base = timed(f"rollup_{'_'.join(BASE_GRAIN)}", lambda: rollup(df, BASE_GRAIN))
+        rollups = {}
+        for name, grain in GRAINS.items():
+            rollups[name] = timed(f'rollup_{name}', lambda: reaggregate(base, grain))
+
+        totales = rollups['total'].iloc[0]
+        timed('pareto_fallas', lambda: pareto(totales, FAILURE_COLS, 'Falla', 'Minutos'))
+        timed('pareto_scrap', lambda: pareto(totales, SCRAP_COLS, 'Causa', 'Piezas'))
+
+        figuras = timed('figures', lambda: report_figures(rollups))
+        detalle = timed('detail_table', lambda: preparar_detalle(df))
+
+        def render():
+            with open(os.devnull, 'w', encoding='utf-8') as out:
+                write_report(out, START, END, totales, COLUMNAS_DETALLE, detalle, figuras, offline=True)
+        timed('html_report', render)
+
+    best['total'] = sum(best.values())
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--max-rows', type=int, default=1000, help="db-max-rows del sustituto de PostgREST")
+    parser.add_argument('--backend', choices=['standin', 'sqlite'], default='standin')
+    parser.add_argument('--label', default="", help="Etiqueta libre de la corrida (p. ej. rama o cambio)")
+    parser.add_argument('--out', default="bench_pipeline.json")
+    args = parser.parse_args()
+
+    results = {
+        'label': args.label,
+        'revision': _git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'backend': args.backend,
+        'runs': [],
+    }
+    for rows in args.rows:
+        stages = run_pipeline(rows, args.repeat, args.page_size, args.workers, args.backend, args.max_rows)
+        results['runs'].append({'rows': rows, 'seconds': stages})
+        print(f"rows={rows}")
+        for stage, seconds in stages.items():
+            print(f"  {stage:<28}{seconds:10.4f} s")
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Resultados en {args.out}")
+
+
+if __name__ == '__main__':
+    main()
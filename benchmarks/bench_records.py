@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: descarga de un año de registros_oee (fetch_records sin filtros).
+
+  - json sin tipos: implementación anterior (todas las páginas como dicts JSON en una
+    lista y un solo pd.DataFrame; columnas int64 / float64 / object genéricas)
+  - json tipado: páginas JSON convertidas a DataFrame por página y al esquema compacto
+    de modules/record_schema.py (wire_format = "json", por defecto)
+  - csv tipado: páginas text/csv leídas con pd.read_csv (wire_format = "csv")
+  - réplica arrow: lectura de la réplica Parquet local (LocalMirror)
+
+Se mide el tiempo (mediana), el pico de memoria de Python durante la descarga
+(tracemalloc: incluye los arreglos de numpy, no la memoria interna de Arrow) y la
+memoria del DataFrame resultante. Todas las variantes se verifican contra la tabla.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_records --rows 200000 --days 365
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.supabase_standin import StandInClient, synthetic_table
+from modules.local_mirror import LocalMirror
+from modules.metrics import KPI_COLS
+from modules.supabase_client import SupabaseManager
+
+INICIO, FIN = date(2000, 1, 1), date(2100, 1, 1)
+
+
+def json_sin_tipos(db: SupabaseManager) -> pd.DataFrame:
+    # _fetch_paginated antes de record_schema (páginas en serie: solo cambia el tiempo de red)
+    query = lambda count=None: db._range_query(INICIO, FIN, None, "*", count=count)
+    first = query(count="exact").range(0, db.page_size - 1).execute()
+    rows = list(first.data)
+    for offset in range(db.page_size, first.count, db.page_size):
+        rows.extend(query().range(offset, offset + db.page_size - 1).execute().data)
+    return pd.DataFrame(rows)
+
+
+def medir(fn, repeat: int) -> tuple:
+    """
+    (mediana en ms, pico de tracemalloc en MB, DataFrame de la última corrida)
+    """
+    # Primera corrida: genera los cuerpos de respuesta del sustituto (no se mide)
+    fn()
+    tiempos = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        df = fn()
+        tiempos.append(time.perf_counter() - t0)
+        del df
+    tracemalloc.start()
+    df = fn()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return np.median(tiempos) * 1000, pico / 1e6, df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    table = synthetic_table(args.rows, args.days)
+    # Registros capturados sin hora (columna con nulos)
+    table.loc[table.index % 50 == 0, 'hora'] = np.nan
+    # Cuerpos de respuesta pre-generados: se mide solo el lado de la app
+    client = StandInClient(table, cache_bodies=True)
+
+    def manager(wire_format: str = "json", mirror=None) -> SupabaseManager:
+        # Sin caché de consultas: cada corrida descarga de nuevo
+        return SupabaseManager('', '', cache_ttl=0, page_size=args.page_size, client=client,
+                               wire_format=wire_format, mirror=mirror)
+
+    with tempfile.TemporaryDirectory() as path:
+        mirror = LocalMirror(path=path, sync_interval=float('inf'))
+        mirror.sync(manager(), force=True)
+        variantes = {
+            'json sin tipos': lambda: json_sin_tipos(manager()),
+            'json tipado': lambda: manager().fetch_records(INICIO, FIN),
+            'csv tipado': lambda: manager("csv").fetch_records(INICIO, FIN),
+            'réplica arrow': lambda: manager(mirror=mirror).fetch_records(INICIO, FIN),
+        }
+
+        print(f"rows={args.rows} days={args.days} page_size={args.page_size}")
+        print(f"{'variante':<16}{'tiempo ms':>12}{'pico MB':>10}{'df MB':>9}")
+        base = None
+        for nombre, fn in variantes.items():
+            ms, pico, df = medir(fn, args.repeat)
+            if len(df) != len(table) or not np.allclose(df[KPI_COLS].to_numpy(dtype=float),
+                                                        table[KPI_COLS].to_numpy(dtype=float), rtol=1e-6):
+                raise SystemExit(f"Mismatch in '{nombre}'")
+            df_mb = df.memory_usage(deep=True).sum() / 1e6
+            base = base or (ms, pico, df_mb)
+            print(f"{nombre:<16}{ms:>12.1f}{pico:>10.1f}{df_mb:>9.1f}   "
+                  f"(x{base[0] / ms:.1f} tiempo, x{base[1] / pico:.1f} pico, x{base[2] / df_mb:.1f} df)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Sustituto local de Supabase para los benchmarks (sin red).
+
+Implementa el subconjunto del query builder de postgrest que usa SupabaseManager
+(select / filtros / order / range / limit / csv / execute) sobre un DataFrame en memoria.
+Cada respuesta pasa por JSON (o por texto CSV con .csv()), igual que una respuesta
+HTTP real, para que el tiempo de deserialización quede incluido en las mediciones.
+
+Con 'max_rows' cada respuesta (tabla o rpc) se corta a ese número de filas, como el
+"max rows" (db-max-rows) de PostgREST; con 'rollup_rpc' se sirve oee_rollup calculado
+con modules.aggregations.rollup.
+"""
+import json
+import types
+
+import numpy as np
+import pandas as pd
+from postgrest.exceptions import APIError
+
+from benchmarks.bench_aggregations import synthetic_records
+from modules.aggregations import rollup
+from modules.metrics import calculate_metrics_batch, DERIVED_COLS
+
+
+def synthetic_table(rows: int, days: int = 90, seed: int = 0) -> pd.DataFrame:
+    """
+    Filas de registros_oee con el esquema completo (ids, hora, línea y KPIs derivados).
+    """
+    rng = np.random.default_rng(seed + 1)
+    df = synthetic_records(rows, days, seed)
+    metrics = calculate_metrics_batch(df)
+    for col in DERIVED_COLS:
+        if col != 'scrap_total':
+            df[col] = metrics[col]
+    df['hora'] = rng.integers(6, 24, size=rows)
+    df['linea'] = 'Rotarys'
+    df['created_at'] = df['fecha'] + 'T00:00:00'
+    df = df.sort_values(['fecha', 'hora'], ignore_index=True)
+    df.insert(0, 'id', np.arange(1, rows + 1))
+    return df
+
+
+class _Query:
+    def __init__(self, client: 'StandInClient'):
+        self._client = client
+        self._filters = []
+        self._columns = None
+        self._count = None
+        self._order = []
+        self._slice = None
+        self._csv = False
+
+    def select(self, *columns, count=None):
+        projection = ",".join(columns)
+        self._columns = None if projection == "*" else projection.split(",")
+        self._count = count
+        return self
+
+    def eq(self, column, value):
+        self._filters.append(('eq', column, value))
+        return self
+
+    def gt(self, column, value):
+        self._filters.append(('gt', column, value))
+        return self
+
+    def gte(self, column, value):
+        self._filters.append(('gte', column, value))
+        return self
+
+    def lte(self, column, value):
+        self._filters.append(('lte', column, value))
+        return self
+
+    def in_(self, column, values):
+        self._filters.append(('in', column, tuple(values)))
+        return self
+
+    def order(self, column, desc=False, nullsfirst=None):
+        self._order.append((column, not desc))
+        return self
+
+    def range(self, start, end):
+        self._slice = (start, end + 1)
+        return self
+
+    def limit(self, n):
+        self._slice = (0, n)
+        return self
+
+    def csv(self):
+        self._csv = True
+        return self
+
+    def execute(self):
+        positions = self._client.positions(tuple(self._filters), tuple(self._order))
+        total = len(positions)
+        if self._slice:
+            positions = positions[self._slice[0]:self._slice[1]]
+        positions = positions[:self._client.max_rows]
+        cuerpo = self._client.body(positions, self._columns, self._csv)
+        # Cuerpo text/csv tal cual; el JSON se decodifica como lo hace el cliente HTTP
+        data = cuerpo if self._csv else json.loads(cuerpo)
+        return types.SimpleNamespace(data=data, count=total if self._count else None)
+
+
+class _RollupQuery:
+    """
+    Resultado de rpc('oee_rollup', ...): order / range / limit / execute sobre el rollup.
+    """
+    def __init__(self, client: 'StandInClient', params: dict, count=None):
+        self._client = client
+        self._params = params
+        self._count = count
+        self._order = []
+        self._slice = None
+
+    def order(self, column, desc=False, nullsfirst=None):
+        self._order.append((column, not desc))
+        return self
+
+    def range(self, start, end):
+        self._slice = (start, end + 1)
+        return self
+
+    def limit(self, n):
+        self._slice = (0, n)
+        return self
+
+    def execute(self):
+        df = self._client.rollup(self._params)
+        if self._order:
+            df = df.sort_values([c for c, _ in self._order], ascending=[a for _, a in self._order],
+                                kind='stable', ignore_index=True)
+        total = len(df)
+        if self._slice:
+            df = df.iloc[self._slice[0]:self._slice[1]]
+        df = df.iloc[:self._client.max_rows]
+        data = json.loads(df.to_json(orient='records'))
+        return types.SimpleNamespace(data=data, count=total if self._count else None)
+
+
+class StandInClient:
+    """
+    Cliente con la misma API de consultas que supabase.Client, sobre 'table'.
+    Sin 'rollup_rpc', rpc() responde como una función no desplegada (db.aggregate usa el
+    cálculo local). Solo existe la tabla registros_oee.
+    """
+    def __init__(self, table: pd.DataFrame, cache_bodies: bool = False, max_rows: int = None,
+                 rollup_rpc: bool = False):
+        self.table_data = table.reset_index(drop=True)
+        self.max_rows = max_rows
+        self.rollup_rpc = rollup_rpc
+        # cache_bodies=True guarda el cuerpo de cada respuesta: las mediciones solo
+        # incluyen el costo del cliente (decodificar y armar el DataFrame)
+        self.cache_bodies = cache_bodies
+        self._bodies = {}
+        # Posiciones ya filtradas y ordenadas por consulta, como el plan en caché de un
+        # servidor: las páginas siguientes de una misma consulta solo cuestan el corte
+        self._positions = {}
+
+    def table(self, name):
+        if name != 'registros_oee':
+            # Como una tabla no desplegada: el catálogo 'maquinas' usa MAQUINAS_RATES
+            raise NotImplementedError(f"tabla '{name}' no disponible en el sustituto local")
+        return _Query(self)
+
+    def body(self, positions: np.ndarray, columns: list, csv: bool) -> str:
+        """
+        Cuerpo de la respuesta HTTP: JSON (lista de objetos) o text/csv (nulos como campo vacío).
+        """
+        key = (positions.tobytes(), tuple(columns or ()), csv)
+        if key in self._bodies:
+            return self._bodies[key]
+        df = self.table_data.iloc[positions]
+        if columns:
+            df = df[columns]
+        if csv:
+            cuerpo = df.to_csv(index=False) if len(df) else ""
+        else:
+            cuerpo = df.to_json(orient='records')
+        if self.cache_bodies:
+            self._bodies[key] = cuerpo
+        return cuerpo
+
+    def positions(self, filters: tuple, order: tuple) -> np.ndarray:
+        key = (filters, order)
+        if key not in self._positions:
+            df = self.table_data
+            mask = np.ones(len(df), dtype=bool)
+            for op, column, value in filters:
+                col = df[column]
+                if op == 'eq':
+                    mask &= (col == value).to_numpy()
+                elif op == 'gt':
+                    mask &= (col > value).to_numpy()
+                elif op == 'gte':
+                    mask &= (col >= value).to_numpy()
+                elif op == 'lte':
+                    mask &= (col <= value).to_numpy()
+                else:
+                    mask &= col.isin(list(value)).to_numpy()
+            selected = df[mask]
+            if order:
+                selected = selected.sort_values([c for c, _ in order], ascending=[a for _, a in order],
+                                                kind='stable')
+            self._positions[key] = df.index.get_indexer(selected.index)
+        return self._positions[key]
+
+    def rpc(self, name, params, count=None):
+        if name != 'oee_rollup' or not self.rollup_rpc:
+            # Como una función no desplegada (PostgREST PGRST202)
+            raise APIError({'code': 'PGRST202', 'message': f"rpc '{name}' no disponible en el sustituto local"})
+        return _RollupQuery(self, params, count)
+
+    def rollup(self, params: dict) -> pd.DataFrame:
+        """
+        Equivalente de oee_rollup(p_start, p_end, p_grain, p_maquinas, p_turnos, p_linea).
+        """
+        df = self.table_data
+        mask = (df['fecha'] >= params['p_start']) & (df['fecha'] <= params['p_end'])
+        if params.get('p_maquinas') is not None:
+            mask &= df['maquina'].isin(params['p_maquinas'])
+        if params.get('p_turnos') is not None:
+            mask &= df['turno'].isin(params['p_turnos'])
+        if params.get('p_linea'):
+            mask &= df['linea'] == params['p_linea']
+        return rollup(df[mask], tuple(params['p_grain']))
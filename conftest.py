@@ -0,0 +1 @@
+# Raíz del repositorio en sys.path para que las pruebas de tests/ importen modules/
@@ -0,0 +1,478 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de agregación compartido por el Dashboard y los Reportes.
+
+Todas las vistas usan el mismo formato de "rollup" que la función oee_rollup de
+schema.sql: columnas de agrupación, 'registros' (número de filas), promedios de KPIs con
+su número de valores no nulos ('<kpi>_n', los nulos no entran al promedio) y sumas de
+tiempos muertos y scrap. Como cada promedio lleva su conteo, un rollup fino (p. ej.
+fecha × máquina × turno) se puede re-agregar a cualquier grano más grueso con promedios
+ponderados, sin volver a recorrer las filas crudas.
+
+El estado incremental del Dashboard y los Reportes (IncrementalRollup) se guarda como un
+cubo de medidas aditivas (OEECube) indexado por fecha × (hora, turno) × máquina: cualquier
+combinación de filtros y cualquier grano se resuelve rebanando y sumando el cubo.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from modules.instrumentation import stage
+from modules.metrics import SCRAP_COLS, FAILURE_COLS, KPI_COLS
+
+# Formato de salida de oee_rollup() en schema.sql
+ROLLUP_DIMS = ['fecha', 'mes', 'maquina', 'turno', 'hora']
+ROLLUP_SUM_COLS = ['tiempo_programado_min', 'producido', 'scrap', 'tiempo_muerto'] + FAILURE_COLS + SCRAP_COLS
+# Valores no nulos de cada KPI: peso de su promedio al re-agregar
+KPI_N_COLS = [f'{col}_n' for col in KPI_COLS]
+
+# 'hora' de los registros capturados sin hora (la columna admite nulos)
+SIN_HORA = -1
+
+# Granos que consumen el Dashboard y los Reportes
+BASE_GRAIN = ('fecha', 'maquina', 'turno')
+# Grano del cubo de IncrementalRollup (el más fino que consulta la app)
+CUBE_GRAIN = ('fecha', 'hora', 'maquina', 'turno')
+GRAINS = {
+    'total': (),
+    'fecha': ('fecha',),
+    'mes': ('mes',),
+    'maquina': ('maquina',),
+}
+
+
+def rollup_columns(grain: tuple) -> list:
+    return list(grain) + ['registros'] + KPI_COLS + KPI_N_COLS + ROLLUP_SUM_COLS
+
+
+def _output_columns(grain: tuple, df: pd.DataFrame, id_col: str) -> list:
+    # 'max_id' acompaña al rollup cuando la entrada trae ids (marca de agua incremental)
+    return rollup_columns(grain) + (['max_id'] if id_col in df.columns else [])
+
+
+def _with_mes(df: pd.DataFrame) -> pd.DataFrame:
+    if 'mes' not in df.columns:
+        fechas = df['fecha']
+        if not pd.api.types.is_datetime64_any_dtype(fechas):
+            fechas = pd.to_datetime(fechas)
+        df = df.assign(mes=fechas.dt.strftime('%Y-%m'))
+    return df
+
+
+def _sumables(df: pd.DataFrame) -> pd.DataFrame:
+    # Los conteos compactos (int16 / int32, ver modules/record_schema.py) se suman en int64
+    angostas = {col: 'int64' for col in ROLLUP_SUM_COLS
+                if pd.api.types.is_integer_dtype(df[col]) and df[col].dtype.itemsize < 8}
+    return df.astype(angostas) if angostas else df
+
+
+def _dims_texto(out: pd.DataFrame, grain: tuple) -> pd.DataFrame:
+    # Dimensiones del rollup como en oee_rollup: fecha ISO y máquina como texto
+    if 'fecha' in grain and pd.api.types.is_datetime64_any_dtype(out['fecha']):
+        out['fecha'] = out['fecha'].dt.strftime('%Y-%m-%d')
+    for col in grain:
+        if isinstance(out[col].dtype, pd.CategoricalDtype):
+            out[col] = out[col].astype(str)
+    return out
+
+
+def rollup(df: pd.DataFrame, grain: tuple) -> pd.DataFrame:
+    """
+    Agrega filas crudas de registros_oee en un solo groupby().agg.
+    Equivalente en pandas a la función oee_rollup de la base de datos.
+    """
+    grain = tuple(grain)
+    if df.empty:
+        return pd.DataFrame(columns=rollup_columns(grain))
+
+    missing = [col for col in ROLLUP_SUM_COLS if col not in df.columns]
+    if missing:
+        df = df.assign(**{col: 0 for col in missing})
+    if 'mes' in grain:
+        df = _with_mes(df)
+    if 'hora' in grain:
+        df = df.assign(hora=df['hora'].fillna(SIN_HORA).astype('int64'))
+    df = _sumables(df)
+
+    spec = {'registros': ('oee', 'size')}
+    spec.update({col: (col, 'mean') for col in KPI_COLS})
+    spec.update({f'{col}_n': (col, 'count') for col in KPI_COLS})
+    spec.update({col: (col, 'sum') for col in ROLLUP_SUM_COLS})
+    if 'id' in df.columns:
+        spec['max_id'] = ('id', 'max')
+    if grain:
+        out = _dims_texto(df.groupby(list(grain), sort=True, observed=True).agg(**spec).reset_index(), grain)
+    else:
+        out = df.assign(_total=0).groupby('_total').agg(**spec).reset_index(drop=True)
+    return out[_output_columns(grain, df, 'id')]
+
+
+def reaggregate(rolled: pd.DataFrame, grain: tuple) -> pd.DataFrame:
+    """
+    Re-agrega un rollup a un grano más grueso.
+    Cada promedio se pondera por su conteo de valores no nulos ('<kpi>_n'), así que el
+    resultado es el mismo que agregar las filas crudas directamente.
+    """
+    grain = tuple(grain)
+    if rolled.empty:
+        return pd.DataFrame(columns=rollup_columns(grain))
+    if 'mes' in grain:
+        rolled = _with_mes(rolled)
+
+    # Sumas ponderadas de los promedios para poder combinarlos
+    conteos = rolled[KPI_N_COLS].astype('int64')
+    weighted = rolled[KPI_COLS].astype(float) * conteos.to_numpy()
+    work = pd.concat([_sumables(rolled[list(grain) + ['registros'] + ROLLUP_SUM_COLS]), conteos, weighted],
+                     axis=1)
+    if grain:
+        out = _dims_texto(work.groupby(list(grain), sort=True, observed=True).sum(min_count=1).reset_index(),
+                          grain)
+    else:
+        out = work.sum(numeric_only=True, min_count=1).to_frame().T
+    # Sin valores no nulos el promedio queda nulo (0 / 0), igual que avg() en SQL
+    out[KPI_COLS] = out[KPI_COLS] / out[KPI_N_COLS].astype(float).to_numpy()
+    if 'max_id' in rolled.columns:
+        if grain:
+            out['max_id'] = rolled.groupby(list(grain), sort=True, observed=True)['max_id'].max().to_numpy()
+        else:
+            out['max_id'] = rolled['max_id'].max()
+    return out[_output_columns(grain, rolled, 'max_id')]
+
+
+def rollups_from_base(base: pd.DataFrame, grains: dict = None) -> dict:
+    """
+    Re-agrega un rollup al grano BASE_GRAIN (p. ej. el de db.aggregate) a cada grano de 'grains'.
+    Returns:
+        dict {nombre: DataFrame} con los granos de 'grains' (por defecto GRAINS).
+    """
+    rollups = {}
+    for name, grain in (grains or GRAINS).items():
+        with stage(f'groupby.{name}', filas=len(base)):
+            rollups[name] = reaggregate(base, grain)
+    return rollups
+
+
+def compute_rollups(df: pd.DataFrame, grains: dict = None) -> dict:
+    """
+    Calcula todos los rollups del Dashboard / Reportes con una sola pasada sobre
+    las filas crudas (al grano BASE_GRAIN) y re-agregaciones sobre ese resultado.
+    Returns:
+        dict {nombre: DataFrame} con los granos de 'grains' (por defecto GRAINS).
+    """
+    return rollups_from_base(rollup(df, BASE_GRAIN), grains)
+
+
+def pareto(totals: pd.Series, cols: list, label: str, value: str) -> pd.DataFrame:
+    """
+    Tabla de Pareto (orden descendente y % acumulado) a partir de la fila de totales.
+    """
+    out = totals[cols].astype(float).sort_values(ascending=False).reset_index()
+    out.columns = [label, value]
+    out['Acumulado'] = (out[value].cumsum() / out[value].sum() * 100).fillna(0)
+    return out
+
+
+class OEECube:
+    """
+    Cubo de medidas aditivas de un rollup al grano CUBE_GRAIN.
+
+    Ejes: fecha × franja × máquina × medida. Cada franja es un par (hora, turno)
+    observado; como cada hora pertenece casi siempre a un solo turno, guardar los pares
+    en lugar de hora × turno evita un cubo mayormente vacío. Las medidas son 'registros',
+    los conteos KPI_N_COLS, las sumas de ROLLUP_SUM_COLS y los KPIs como sumas ponderadas
+    (promedio × su conteo de valores no nulos '<kpi>_n'), así que cualquier grano se obtiene sumando y dividiendo al final.
+
+    Tamaño: fechas × franjas × máquinas × 30 float64 (30 días × 24 franjas × 12 máquinas
+    ≈ 2.1 MB; un año ≈ 25 MB).
+    """
+    MEDIDAS = ['registros'] + KPI_COLS + KPI_N_COLS + ROLLUP_SUM_COLS
+
+    def __init__(self, base: pd.DataFrame):
+        # Ejes vacíos; add() los crea con las etiquetas de 'base'
+        self.fechas = np.array([], dtype=object)
+        self.maquinas = np.array([], dtype=object)
+        self.horas = np.array([], dtype=np.int64)
+        self.turnos = np.array([], dtype=np.int64)
+        self.meses = np.array([], dtype=object)
+        self.valores = np.zeros((0, 0, 0, len(self.MEDIDAS)))
+        self.add(base)
+
+    def add(self, delta: pd.DataFrame):
+        """
+        Suma un rollup al grano CUBE_GRAIN (p. ej. el de los registros nuevos) al cubo.
+        Los ejes crecen si 'delta' trae fechas, franjas o máquinas nuevas.
+        """
+        if delta.empty:
+            return
+        delta = delta[rollup_columns(CUBE_GRAIN)].astype({'hora': 'int64', 'turno': 'int64'})
+        fechas = delta['fecha'].astype(str).to_numpy(dtype=object)
+        maquinas = delta['maquina'].astype(str).to_numpy(dtype=object)
+        franjas = pd.MultiIndex.from_frame(delta[['hora', 'turno']])
+        self._ampliar(fechas, maquinas, franjas)
+
+        i_fecha = np.searchsorted(self.fechas, fechas)
+        i_maquina = np.searchsorted(self.maquinas, maquinas)
+        i_franja = self._franjas().get_indexer(franjas)
+        np.add.at(self.valores, (i_fecha, i_franja, i_maquina), self._medidas(delta))
+
+    def _franjas(self) -> pd.MultiIndex:
+        return pd.MultiIndex.from_arrays([self.horas, self.turnos], names=['hora', 'turno'])
+
+    def _ampliar(self, fechas: np.ndarray, maquinas: np.ndarray, franjas: pd.MultiIndex):
+        # Etiquetas ordenadas de cada eje; los valores existentes se copian a su nueva posición
+        actuales = self._franjas()
+        todas_fechas = np.union1d(self.fechas, pd.unique(fechas)).astype(object)
+        todas_maquinas = np.union1d(self.maquinas, pd.unique(maquinas)).astype(object)
+        todas_franjas = actuales.union(franjas.unique()).unique().sort_values()
+        forma = (len(todas_fechas), len(todas_franjas), len(todas_maquinas))
+        if forma == self.valores.shape[:3]:
+            return
+        valores = np.zeros(forma + (len(self.MEDIDAS),))
+        valores[np.ix_(np.searchsorted(todas_fechas, self.fechas), todas_franjas.get_indexer(actuales),
+                       np.searchsorted(todas_maquinas, self.maquinas))] = self.valores
+        self.valores = valores
+        self.fechas, self.maquinas = todas_fechas, todas_maquinas
+        self.horas = todas_franjas.get_level_values(0).to_numpy(dtype=np.int64)
+        self.turnos = todas_franjas.get_level_values(1).to_numpy(dtype=np.int64)
+        self.meses = np.array([f[:7] for f in self.fechas], dtype=object)
+
+    def _medidas(self, delta: pd.DataFrame) -> np.ndarray:
+        # Una fila de MEDIDAS por fila del rollup: cada promedio pasa a suma ponderada por su
+        # conteo de valores no nulos (un promedio nulo tiene conteo 0 y no suma nada)
+        conteos = {col: delta[f'{col}_n'].to_numpy(dtype=float) for col in KPI_COLS}
+        return np.column_stack(
+            [delta['registros'].to_numpy(dtype=float)]
+            + [np.nan_to_num(delta[col].to_numpy(dtype=float)) * conteos[col] for col in KPI_COLS]
+            + [delta[col].to_numpy(dtype=float) for col in KPI_N_COLS + ROLLUP_SUM_COLS])
+
+    @property
+    def nbytes(self) -> int:
+        return self.valores.nbytes
+
+    def _rebanada(self, start_date: date = None, end_date: date = None,
+                  maquinas: list = None, turnos: list = None):
+        # Rango de fechas contiguo (ejes ordenados) y máscaras de máquina / turno
+        f0 = np.searchsorted(self.fechas, start_date.isoformat(), 'left') if start_date else 0
+        f1 = np.searchsorted(self.fechas, end_date.isoformat(), 'right') if end_date else len(self.fechas)
+        valores = self.valores[f0:f1]
+        franjas = slice(None) if turnos is None else np.flatnonzero(np.isin(self.turnos, list(turnos)))
+        maqs = slice(None) if maquinas is None else np.flatnonzero(np.isin(self.maquinas, list(maquinas)))
+        if turnos is not None:
+            valores = valores[:, franjas]
+        if maquinas is not None:
+            valores = valores[:, :, maqs]
+        etiquetas = {
+            'fecha': self.fechas[f0:f1], 'mes': self.meses[f0:f1],
+            'hora': self.horas[franjas], 'turno': self.turnos[franjas],
+            'maquina': self.maquinas[maqs],
+        }
+        return valores, etiquetas
+
+    def rollups(self, start_date: date = None, end_date: date = None, maquinas: list = None,
+                turnos: list = None, grains: dict = None) -> dict:
+        """
+        Rollups de 'grains' (por defecto GRAINS) para el rango y filtros indicados, con el
+        mismo formato que reaggregate. Los granos pueden usar 'fecha', 'mes', 'hora',
+        'turno' y 'maquina'.
+        """
+        valores, etiquetas = self._rebanada(start_date, end_date, maquinas, turnos)
+        return {name: self._reducir(valores, etiquetas, tuple(grain))
+                for name, grain in (grains or GRAINS).items()}
+
+    def _reducir(self, valores: np.ndarray, etiquetas: dict, grain: tuple) -> pd.DataFrame:
+        ejes = [[d for d in grain if d in dims] for dims in (('fecha', 'mes'), ('hora', 'turno'), ('maquina',))]
+        # Primero se suman completos los ejes fuera del grano (reduce el tamaño) ...
+        sumar = tuple(eje for eje, dims in enumerate(ejes) if not dims)
+        if sumar:
+            valores = valores.sum(axis=sumar, keepdims=True)
+        # ... y después se agrupan los demás con una matriz de pertenencia (producto matricial)
+        claves = []
+        for eje, dims in enumerate(ejes):
+            if not dims:
+                claves.append({})
+                continue
+            codigos, unicos = pd.MultiIndex.from_arrays([etiquetas[d] for d in dims]).factorize(sort=True)
+            if len(unicos) < valores.shape[eje]:
+                grupos = np.zeros((len(unicos), valores.shape[eje]))
+                grupos[codigos, np.arange(len(codigos))] = 1
+                valores = np.moveaxis(np.tensordot(grupos, valores, axes=(1, eje)), 0, eje)
+            claves.append({d: unicos.get_level_values(i) for i, d in enumerate(dims)})
+
+        planos = valores.reshape(-1, len(self.MEDIDAS))
+        presentes = planos[:, 0] > 0
+        if not presentes.any():
+            return pd.DataFrame(columns=rollup_columns(grain))
+        # Etiquetas de cada celda en el mismo orden que reshape (C: el último eje varía más rápido)
+        indices = np.indices(valores.shape[:3]).reshape(3, -1)[:, presentes]
+        out = {d: np.asarray(clave)[indices[eje]] for eje, dims in enumerate(claves) for d, clave in dims.items()}
+        planos = planos[presentes]
+        out['registros'] = planos[:, 0].astype(np.int64)
+        n0 = 1 + len(KPI_COLS)
+        # Sin valores no nulos el promedio queda nulo (0 / 0), igual que en reaggregate
+        with np.errstate(invalid='ignore'):
+            for j, col in enumerate(KPI_COLS, start=1):
+                out[col] = planos[:, j] / planos[:, n0 + j - 1]
+        for j, col in enumerate(KPI_N_COLS + ROLLUP_SUM_COLS, start=n0):
+            out[col] = np.rint(planos[:, j]).astype(np.int64)
+        df = pd.DataFrame(out)
+        if len(grain) > 1:
+            df = df.sort_values(list(grain), ignore_index=True)
+        return df[rollup_columns(grain)]
+
+
+class _Ventana:
+    """
+    Estado incremental de una ventana de fechas: cubo, marca de agua e ids ya sumados
+    dentro del traslape. 'lock' serializa su carga / refresco y las lecturas del cubo.
+    """
+    def __init__(self, window: tuple):
+        self.window = window
+        self.cube = None
+        self.watermark = 0
+        self.vistos = set()
+        self.error = None
+        self.last_refresh = 0.0
+        self.lock = threading.Lock()
+
+
+class IncrementalRollup:
+    """
+    Rollup de registros_oee mantenido de forma incremental.
+
+    Por cada ventana de fechas consultada guarda su cubo (OEECube, al grano CUBE_GRAIN:
+    fecha × hora × máquina × turno) y el id más alto ya procesado (marca de agua); se
+    conservan las 'max_windows' ventanas usadas más recientemente, así que sesiones con
+    rangos distintos no se reemplazan el estado entre sí. Cada refresco descarga los
+    registros con id mayor a la marca de agua menos 'overlap' (un id menor puede
+    confirmarse después que uno mayor), descarta los ids ya sumados y suma el rollup de
+    los nuevos al cubo; los filtros de máquina / turno y los granos de salida se
+    resuelven sobre el cubo, sin volver a recorrer filas.
+
+    registros_oee es de solo-inserción en la práctica: las ediciones o borrados de filas
+    ya procesadas no se reflejan hasta llamar a reset() o cambiar la ventana.
+
+    Con 'linea' el estado se limita a esa línea (una partición de registros_oee).
+    """
+    def __init__(self, min_interval: float = 5.0, linea: str = None, max_windows: int = 4,
+                 overlap: int = 1000):
+        self.min_interval = min_interval
+        self.linea = linea
+        self.max_windows = max_windows
+        self.overlap = overlap
+        # Ventanas en orden de uso (la última es la más reciente); el lock solo protege el diccionario
+        self._ventanas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._ventanas.clear()
+
+    def error(self, start_date: date, end_date: date) -> str:
+        """
+        Error del último refresco de la ventana que sirve el rango (None si se actualizó
+        bien); mientras tanto se siguen sirviendo sus agregados anteriores.
+        """
+        with self._lock:
+            ventana = self._buscar((start_date.isoformat(), end_date.isoformat()))
+        return ventana.error if ventana else None
+
+    def _buscar(self, window: tuple) -> _Ventana:
+        # La ventana usada más recientemente que cubre el rango
+        for ventana in reversed(self._ventanas.values()):
+            if ventana.window[0] <= window[0] and window[1] <= ventana.window[1]:
+                return ventana
+        return None
+
+    def _ventana(self, start_date: date, end_date: date) -> _Ventana:
+        window = (start_date.isoformat(), end_date.isoformat())
+        with self._lock:
+            ventana = self._buscar(window)
+            if ventana is None:
+                ventana = self._ventanas[window] = _Ventana(window)
+                while len(self._ventanas) > self.max_windows:
+                    self._ventanas.popitem(last=False)
+            self._ventanas.move_to_end(ventana.window)
+            return ventana
+
+    def refresh(self, db, start_date: date, end_date: date) -> _Ventana:
+        """
+        Carga la ventana (vía db.aggregate) si no hay una que cubra el rango; si la hay,
+        le suma los registros nuevos.
+        """
+        ventana = self._ventana(start_date, end_date)
+        with ventana.lock:
+            self._refresh(ventana, db)
+        return ventana
+
+    def _refresh(self, ventana: _Ventana, db):
+        if ventana.cube is None:
+            self._load(ventana, db)
+        elif time.monotonic() - ventana.last_refresh >= self.min_interval:
+            self._apply_new(ventana, db)
+
+    def _load(self, ventana: _Ventana, db):
+        start_date, end_date = (date.fromisoformat(d) for d in ventana.window)
+        # Base leída en el momento (sin la caché de consultas): los ids del traslape se
+        # leen justo después y se dan por sumados, así que deben estar en esta base
+        base = db.aggregate(start_date, end_date, grain=CUBE_GRAIN, linea=self.linea, use_cache=False)
+        if base.empty:
+            watermark = db.latest_id(linea=self.linea)
+        else:
+            watermark = int(base['max_id'].max())
+        # Ids del traslape ya incluidos en el agregado: no se vuelven a sumar
+        recientes = db.fetch_records_since(max(0, watermark - self.overlap), columns=['id'],
+                                           linea=self.linea, raise_errors=True)
+        with stage('cubo.construccion', filas=len(base)) as info:
+            ventana.cube = OEECube(base)
+            info['bytes'] = ventana.cube.nbytes
+        ventana.watermark = watermark
+        ventana.vistos = {int(i) for i in recientes.get('id', []) if i <= watermark}
+        ventana.error = None
+        ventana.last_refresh = time.monotonic()
+
+    def _apply_new(self, ventana: _Ventana, db):
+        ventana.last_refresh = time.monotonic()
+        try:
+            nuevos = db.fetch_records_since(max(0, ventana.watermark - self.overlap),
+                                            columns=['id'] + list(CUBE_GRAIN) + KPI_COLS + ROLLUP_SUM_COLS,
+                                            linea=self.linea, raise_errors=True)
+        except Exception as e:
+            # Se siguen sirviendo los agregados anteriores; el error queda en 'errores'
+            ventana.error = str(e)
+            return
+        ventana.error = None
+        if nuevos.empty:
+            return
+        nuevos = nuevos[~nuevos['id'].isin(ventana.vistos)]
+        if nuevos.empty:
+            return
+        ventana.watermark = max(ventana.watermark, int(nuevos['id'].max()))
+        ventana.vistos.update(int(i) for i in nuevos['id'])
+        piso = ventana.watermark - self.overlap
+        ventana.vistos = {i for i in ventana.vistos if i > piso}
+
+        nuevos = nuevos[(nuevos['fecha'] >= ventana.window[0]) & (nuevos['fecha'] <= ventana.window[1])]
+        if nuevos.empty:
+            return
+        with stage('groupby.incremental', filas=len(nuevos)):
+            delta = rollup(nuevos, CUBE_GRAIN)
+        with stage('cubo.incremental', filas=len(delta)) as info:
+            ventana.cube.add(delta)
+            info['bytes'] = ventana.cube.nbytes
+
+    def rollups(self, db, start_date: date, end_date: date, maquinas: list = None,
+                turnos: list = None, grains: dict = None) -> dict:
+        """
+        Refresca el estado y devuelve los rollups de 'grains' (por defecto GRAINS)
+        para el rango y los filtros indicados.
+        """
+        ventana = self._ventana(start_date, end_date)
+        with ventana.lock:
+            self._refresh(ventana, db)
+            with stage('cubo.rollups', granos=len(grains or GRAINS)):
+                return ventana.cube.rollups(start_date, end_date, maquinas=maquinas, turnos=turnos,
+                                            grains=grains)
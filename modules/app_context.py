@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Estado compartido entre OEE_Dash.py (punto de entrada y sidebar) y las páginas de
+paginas/ (Dashboard, Captura, Reportes).
+
+OEE_Dash.py guarda en st.session_state, en cada corrida, la vista de la federación y
+los filtros globales del sidebar; cada página los lee con contexto(). Este módulo no
+importa librerías de gráficas: la página de captura no las carga nunca.
+"""
+import os
+
+import pandas as pd
+import streamlit as st
+
+from modules.downsampling import ANCHO_PX
+from modules.spool import CaptureSpool
+
+CLAVE_CONTEXTO = "contexto"
+
+
+def guardar_contexto(**valores):
+    st.session_state[CLAVE_CONTEXTO] = valores
+
+
+def contexto() -> dict:
+    """
+    Valores de la corrida actual: federacion, db (vista de la planta elegida), planta_sel,
+    y en las páginas de análisis meta_oee, filter_date_range, filter_maquina y filter_turn.
+    """
+    return st.session_state[CLAVE_CONTEXTO]
+
+
+# --- BITÁCORA LOCAL DE CAPTURAS (write-ahead, una por planta / línea) ---
+@st.cache_resource
+def init_spool(_federacion, planta):
+    spool_cfg = st.secrets.get("spool", {})
+    path = spool_cfg.get("path", "capturas_pendientes.db")
+    if _federacion and len(_federacion.fuentes) > 1:
+        raiz, ext = os.path.splitext(path)
+        path = f"{raiz}_{planta}{ext}"
+    spool = CaptureSpool(path=path, batch_size=spool_cfg.get("batch_size", 100),
+                         max_attempts=spool_cfg.get("max_attempts", 5),
+                         retention_days=spool_cfg.get("retention_days", 7.0))
+    if _federacion:
+        spool.start(_federacion.select(planta))
+    return spool
+
+
+def mostrar_fuentes_omitidas(vista):
+    # Resultados parciales: las plantas que fallaron o excedieron su límite no se incluyen
+    for nombre, error in vista.errores.items():
+        st.warning(f"⚠️ {nombre}: sin datos ({error}). Se muestran las demás plantas / líneas.")
+    # Agregados incrementales que no se pudieron actualizar: se muestran los últimos obtenidos
+    for nombre, error in vista.avisos.items():
+        st.warning(f"⚠️ {nombre}: datos sin actualizar, se reintentará ({error}).")
+
+
+def ancho_graficas() -> int:
+    """
+    Ancho en pixeles para reducir las tendencias ([graficas] ancho_px en secrets.toml).
+    """
+    return int(st.secrets.get("graficas", {}).get("ancho_px", ANCHO_PX))
+
+
+def rango_zoom(df: pd.DataFrame, x: str, ancho_px: int, key: str) -> pd.DataFrame:
+    """
+    Si la serie tiene más puntos que pixeles, ofrece un deslizador para acercar un
+    sub-rango de 'x'; dentro de un rango corto la serie se dibuja con resolución completa.
+    """
+    if len(df) <= ancho_px:
+        return df
+    valores = df[x].tolist()
+    desde, hasta = st.select_slider("🔍 Acercar rango (resolución completa al acercar)", options=valores,
+                                    value=(valores[0], valores[-1]), key=key)
+    return df[(df[x] >= desde) & (df[x] <= hasta)]
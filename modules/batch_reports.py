@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Generación masiva de reportes sin Streamlit (cierre de mes).
+
+Los registros del rango completo se descargan una sola vez y se escriben en un archivo
+Arrow (IPC, sin compresión) que cada proceso de trabajo mapea en memoria: el sistema
+operativo comparte las páginas entre procesos y cada tarea copia solo sus filas. Cada
+combinación de máquina × turno × período del reporte se genera en paralelo con los
+mismos cálculos (rollups, gráficas y reporte HTML) que la pestaña de Reportes, y se
+escribe como HTML y CSV en el directorio de salida.
+
+Uso (desde la raíz del repositorio):
+    python -m modules.batch_reports --inicio 2026-09-01 --fin 2026-09-30 --salida reportes/
+    python -m modules.batch_reports --inicio 2026-07-01 --fin 2026-09-30 --periodo mes \\
+        --maquinas CS0525 CS0524 --turnos 1 2 3 todos --procesos 8
+"""
+import argparse
+import base64
+import itertools
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+from modules.aggregations import compute_rollups
+from modules.metrics import rates_vigentes
+from modules.report import REPORT_COLS, COLUMNAS_DETALLE, report_figures, preparar_detalle, write_report
+
+# Valores de --maquinas / --turnos que significan "sin filtro"
+TODAS = 'todas'
+TODOS = 'todos'
+
+# Registros del rango (tabla Arrow mapeada en memoria), compartidos por las tareas de cada proceso
+_DATOS = None
+
+
+def _init_worker(path: str):
+    global _DATOS
+    _DATOS = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def _seleccion(tabla: pa.Table, maquina: str, turno, desde: date, hasta: date) -> pd.DataFrame:
+    # Filtro sobre la tabla mapeada: solo las filas de la tarea pasan a pandas
+    filtro = (pc.field('fecha') >= pa.scalar(datetime.combine(desde, datetime.min.time()))) & \
+             (pc.field('fecha') <= pa.scalar(datetime.combine(hasta, datetime.min.time())))
+    if maquina != TODAS:
+        filtro &= pc.field('maquina') == maquina
+    if turno != TODOS:
+        filtro &= pc.field('turno') == int(turno)
+    return tabla.filter(filtro).to_pandas()
+
+
+def periodos(inicio: date, fin: date, periodo: str) -> list:
+    """
+    Divide [inicio, fin] en meses calendario ('mes') o lo deja como un solo período ('rango').
+    Returns:
+        list de (etiqueta, inicio, fin).
+    """
+    if periodo == 'rango':
+        return [(f"{inicio}_{fin}", inicio, fin)]
+    out = []
+    for mes in pd.period_range(inicio, fin, freq='M'):
+        desde = max(inicio, mes.start_time.date())
+        hasta = min(fin, mes.end_time.date())
+        out.append((str(mes), desde, hasta))
+    return out
+
+
+def report_matrix(maquinas: list, turnos: list, rangos: list) -> list:
+    """
+    Combinaciones máquina × turno × período a generar.
+    """
+    return list(itertools.product(maquinas, turnos, rangos))
+
+
+def _nombre(tarea: tuple) -> str:
+    maquina, turno, (etiqueta, _, _) = tarea
+    return f"Reporte_OEE_{maquina}_T{turno}_{etiqueta}"
+
+
+def _render(tarea: tuple, salida: str, logo_b64: str, offline: bool, csv: bool) -> tuple:
+    maquina, turno, (etiqueta, desde, hasta) = tarea
+    df = _seleccion(_DATOS, maquina, turno, desde, hasta)
+    nombre = _nombre(tarea)
+    if df.empty:
+        return nombre, 0
+
+    rollups = compute_rollups(df)
+    alcance = f"Máquina: {'Todas' if maquina == TODAS else maquina} · Turno: {'Todos' if turno == TODOS else turno}"
+    with open(os.path.join(salida, nombre + ".html"), "w", encoding="utf-8") as out:
+        write_report(out, desde, hasta, rollups['total'].iloc[0], COLUMNAS_DETALLE, preparar_detalle(df),
+                     report_figures(rollups), logo_b64=logo_b64, offline=offline, alcance=alcance)
+    if csv:
+        df.to_csv(os.path.join(salida, nombre + ".csv"), index=False)
+    return nombre, len(df)
+
+
+def run_batch(db, inicio: date, fin: date, salida: str, maquinas: list = None, turnos: list = None,
+              periodo: str = 'rango', procesos: int = None, logo_b64: str = "", offline: bool = True,
+              csv: bool = True, progress=None) -> dict:
+    """
+    Genera todos los reportes de la matriz máquina × turno × período en 'salida'.
+    Args:
+        maquinas: Máquinas a reportar (TODAS = sin filtro). Por defecto, las del catálogo 'maquinas'.
+        turnos: Turnos a reportar (TODOS = sin filtro). Por defecto 1, 2 y 3.
+        periodo: 'rango' (un solo período) o 'mes' (un reporte por mes calendario).
+        progress: Callback opcional progress(nombre, filas, hechos, total).
+    Returns:
+        dict {nombre: filas}; 0 filas = combinación sin datos (no se escribe archivo).
+    """
+    maquinas = maquinas or list(rates_vigentes(db.fetch_machines()))
+    turnos = turnos or [1, 2, 3]
+    os.makedirs(salida, exist_ok=True)
+
+    # Una sola descarga para toda la matriz
+    filtro_maquinas = None if TODAS in maquinas else maquinas
+    filtro_turnos = None if TODOS in turnos else [int(t) for t in turnos]
+    datos = db.fetch_records(inicio, fin, columns=REPORT_COLS, maquinas=filtro_maquinas, turnos=filtro_turnos)
+
+    tareas = report_matrix(maquinas, turnos, periodos(inicio, fin, periodo))
+    if datos.empty:
+        return {_nombre(tarea): 0 for tarea in tareas}
+
+    resultados = {}
+    with tempfile.TemporaryDirectory(prefix="oee_batch_") as tmp:
+        # Los procesos reciben la ruta del archivo, no una copia serializada del DataFrame
+        path = os.path.join(tmp, "registros.arrow")
+        feather.write_feather(datos, path, compression='uncompressed')
+        del datos
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_init_worker, initargs=(path,)) as pool:
+            futuros = [pool.submit(_render, tarea, salida, logo_b64, offline, csv) for tarea in tareas]
+            for hechos, futuro in enumerate(as_completed(futuros), start=1):
+                nombre, filas = futuro.result()
+                resultados[nombre] = filas
+                if progress:
+                    progress(nombre, filas, hechos, len(tareas))
+    return resultados
+
+
+def _logo_base64(path: str) -> str:
+    try:
+        with open(path, "rb") as image_file:
+            return base64.b64encode(image_file.read()).decode()
+    except OSError:
+        return ""
+
+
+if __name__ == '__main__':
+    from modules.supabase_client import init_supabase
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--inicio', type=date.fromisoformat, required=True)
+    parser.add_argument('--fin', type=date.fromisoformat, required=True)
+    parser.add_argument('--salida', default='reportes')
+    parser.add_argument('--maquinas', nargs='+', help=f"Por defecto todas las del catálogo 'maquinas'; '{TODAS}' = sin filtro")
+    parser.add_argument('--turnos', nargs='+', help=f"Por defecto 1 2 3; '{TODOS}' = sin filtro")
+    parser.add_argument('--periodo', choices=['rango', 'mes'], default='rango')
+    parser.add_argument('--procesos', type=int, default=None)
+    parser.add_argument('--logo', default='EA_2.png')
+    parser.add_argument('--cdn', action='store_true', help="Cargar plotly.js del CDN (reportes más ligeros)")
+    parser.add_argument('--sin-csv', action='store_true')
+    args = parser.parse_args()
+
+    db = init_supabase()
+    if db is None:
+        sys.exit(1)
+
+    resultados = run_batch(
+        db, args.inicio, args.fin, args.salida, maquinas=args.maquinas, turnos=args.turnos,
+        periodo=args.periodo, procesos=args.procesos, logo_b64=_logo_base64(args.logo),
+        offline=not args.cdn, csv=not args.sin_csv,
+        progress=lambda nombre, filas, hechos, total: print(f"[{hechos}/{total}] {nombre}: {filas} filas"),
+    )
+    generados = sum(1 for filas in resultados.values() if filas)
+    print(f"{generados} de {len(resultados)} reportes generados en {args.salida}")
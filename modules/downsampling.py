@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Reducción de puntos de las series de tendencia antes de enviarlas al navegador.
+
+Una gráfica de línea no puede mostrar más puntos que pixeles de ancho, así que cada
+serie se reduce a ~ancho_px puntos con LTTB (Largest-Triangle-Three-Buckets, conserva
+la forma visual) o con mínimo / máximo por cubeta. Siempre se conservan:
+  - el primer y el último punto,
+  - el mínimo y el máximo globales de cada serie,
+  - los puntos a ambos lados de cada cruce de la meta (acotados para que una serie
+    que oscila alrededor de la meta no rompa el límite).
+
+Con esto el tamaño de la figura queda acotado por el ancho de la gráfica y no por la
+longitud del rango; para ver la resolución completa se acerca el rango (ver
+modules/app_context.py: rango_zoom).
+"""
+import numpy as np
+import pandas as pd
+
+# Ancho en pixeles de las gráficas de tendencia (pantallas de piso de 1080p)
+ANCHO_PX = 1200
+
+
+def _numeric(values: pd.Series) -> np.ndarray:
+    # Eje x como números: fechas / horas a nanosegundos
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float)
+    return pd.to_datetime(values).to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(float)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Índices de los 'n_out' puntos que elige LTTB para la serie (x, y) ordenada por x.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # Cubetas entre el primer y el último punto (que siempre se conservan)
+    bordes = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    anterior = 0
+    for i in range(n_out - 2):
+        inicio, fin = bordes[i], bordes[i + 1]
+        # Promedio de la cubeta siguiente (o el último punto) como tercer vértice
+        sig_inicio, sig_fin = fin, bordes[i + 2] if i + 2 < len(bordes) else n
+        x_sig, y_sig = x[sig_inicio:sig_fin].mean(), y[sig_inicio:sig_fin].mean()
+        # Área del triángulo (anterior, candidato, promedio siguiente) para cada candidato
+        areas = np.abs((x[anterior] - x_sig) * (y[inicio:fin] - y[anterior])
+                       - (x[anterior] - x[inicio:fin]) * (y_sig - y[anterior]))
+        anterior = inicio + int(np.argmax(areas))
+        indices[i + 1] = anterior
+    return indices
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Índices del mínimo y el máximo de cada una de n_out / 2 cubetas.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+    indices = [0, n - 1]
+    for cubeta in np.array_split(np.arange(n), n_out // 2):
+        valores = y[cubeta]
+        indices.extend((cubeta[np.argmin(valores)], cubeta[np.argmax(valores)]))
+    return np.unique(indices)
+
+
+def _cruces_meta(y: np.ndarray, meta: float, limite: int) -> np.ndarray:
+    # Puntos a ambos lados de cada cambio de lado respecto a la meta
+    arriba = y >= meta
+    cambios = np.flatnonzero(arriba[1:] != arriba[:-1])
+    if len(cambios) > limite:
+        cambios = cambios[np.linspace(0, len(cambios) - 1, limite).astype(int)]
+    return np.concatenate([cambios, cambios + 1])
+
+
+def downsample(df: pd.DataFrame, x: str, ys: list, ancho_px: int = ANCHO_PX,
+               metas: dict = None, metodo: str = 'lttb') -> pd.DataFrame:
+    """
+    Filas de 'df' (ordenado por 'x') que bastan para dibujar las series 'ys' en una
+    gráfica de 'ancho_px' pixeles.
+    Args:
+        metas (dict): {columna: valor} de las series con línea de meta; se conservan
+            los puntos donde la serie la cruza.
+        metodo (str): 'lttb' o 'minmax'.
+    Returns:
+        DataFrame con a lo más ~len(ys) * ancho_px filas (el mismo df si ya cabe).
+    """
+    n = len(df)
+    if n <= ancho_px:
+        return df
+    xs = _numeric(df[x])
+    conservar = []
+    for col in ys:
+        y = df[col].to_numpy(dtype=float)
+        validos = np.flatnonzero(~np.isnan(y))
+        if len(validos) == 0:
+            continue
+        yv = y[validos]
+        if metodo == 'minmax':
+            elegidos = minmax_indices(yv, ancho_px)
+        else:
+            elegidos = lttb_indices(xs[validos], yv, ancho_px)
+        conservar.append(validos[elegidos])
+        conservar.append(validos[[np.argmin(yv), np.argmax(yv)]])
+        if metas and col in metas:
+            conservar.append(validos[_cruces_meta(yv, metas[col], ancho_px // 8)])
+    if not conservar:
+        return df
+    return df.iloc[np.unique(np.concatenate(conservar))]
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Importación masiva de históricos desde los libros de Excel heredados ("celdas naranjas").
+
+Los libros se leen en modo read-only de openpyxl (fila por fila, sin cargar el libro
+completo en memoria), las métricas se calculan por lotes con calculate_metrics_batch y
+los registros se insertan en bloques con SupabaseManager.insert_records.
+
+Uso (desde la raíz del repositorio, con .streamlit/secrets.toml configurado):
+    python -m modules.excel_import historico_2024.xlsx [otro.xlsx ...]
+"""
+import sys
+import unicodedata
+import uuid
+from collections import Counter
+from datetime import date, datetime, time as dtime
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.datetime import from_excel
+
+from modules.metrics import calculate_metrics_batch, rates_por_fecha, MAQUINAS_RATES, SCRAP_COLS, FAILURE_COLS
+from modules.spool import IDEMPOTENCY_KEY
+
+# Encabezados del libro (normalizados) -> columna de registros_oee.
+# Incluye las etiquetas del formulario de captura y los nombres de columna directos.
+HEADER_ALIASES = {
+    'fecha': 'fecha',
+    'hora': 'hora',
+    'turno': 'turno',
+    'maquina': 'maquina',
+    'tiempo_programado': 'tiempo_programado_min',
+    'tiempo_programado_min': 'tiempo_programado_min',
+    'rate': 'rate_teorico',
+    'rate_teorico': 'rate_teorico',
+    'producido': 'producido',
+    'total_producido': 'producido',
+    'ajuste_set_up': 'scrap_setup',
+    'pruebas_destructivas': 'scrap_pruebas',
+    'msf_pnut_quemados': 'scrap_msf',
+    'tubo_quemado': 'scrap_tubo',
+    'soldadura_quemada': 'scrap_soldadura_quemada',
+    'ajuste_scrap': 'scrap_ajuste',
+    'soldadura_porosa': 'scrap_soldadura_porosa',
+    'falta_de_soldadura': 'scrap_falta_soldadura',
+    'primera_pieza': 'scrap_primera_pieza',
+    'ajuste': 'ajuste',
+    'falla_mecanica': 'falla_mecanica',
+    'falla_electrica': 'falla_electrica',
+    'falta_personal': 'falta_personal',
+    'falta_material': 'falta_material',
+    'cambio_modelo': 'cambio_modelo',
+    'cambio_de_modelo': 'cambio_modelo',
+}
+HEADER_ALIASES.update({col: col for col in SCRAP_COLS + FAILURE_COLS})
+
+COUNT_COLS = ['tiempo_programado_min', 'producido'] + SCRAP_COLS + FAILURE_COLS
+
+# Espacio de nombres de las llaves de idempotencia (uuid5) de las filas importadas
+IMPORT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, 'oee-dash/excel_import')
+
+
+def _normalize_header(value) -> str:
+    text = unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode()
+    text = text.strip().lower().replace('(min)', '')
+    for ch in '()/-.':
+        text = text.replace(ch, ' ')
+    return '_'.join(text.split())
+
+
+def _parse_fecha(value):
+    """
+    Fecha de una celda; None si no es una fecha (p. ej. filas de pie como 'TOTAL').
+    Los números son fechas seriales de Excel (celdas de fecha sin formato).
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            fecha = from_excel(value)
+        except (ValueError, TypeError, OverflowError):
+            return None
+        return fecha.date() if isinstance(fecha, datetime) else None
+    if not isinstance(value, str):
+        return None
+    try:
+        fecha = pd.to_datetime(value, dayfirst=True)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    return None if pd.isna(fecha) else fecha.date()
+
+
+def _parse_hora(value):
+    """
+    Hora (0-23) de una celda; None si está vacía o no es una hora ('6 am', '—', 'TOTAL').
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (datetime, dtime)):
+        return value.hour
+    try:
+        hora = int(value.split(':')[0]) if isinstance(value, str) else int(value)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    return hora if 0 <= hora <= 23 else None
+
+
+def _parse_turno(value):
+    """
+    Turno (entero positivo) de una celda; None si está vacío o no es numérico.
+    """
+    turno = pd.to_numeric(pd.Series([value]), errors='coerce').iloc[0]
+    if pd.isna(turno) or turno != int(turno) or turno < 1:
+        return None
+    return int(turno)
+
+
+def _iter_sheet_rows(ws, max_header_scan: int = 20):
+    """
+    Genera dicts {columna: valor} por cada fila de datos de la hoja.
+    El encabezado es la primera fila (de las primeras 'max_header_scan') que contiene 'fecha'.
+    """
+    mapping = None
+    for i, row in enumerate(ws.iter_rows(values_only=True)):
+        if mapping is None:
+            headers = [_normalize_header(v) if v is not None else '' for v in row]
+            if 'fecha' in headers:
+                mapping = {idx: HEADER_ALIASES[h] for idx, h in enumerate(headers) if h in HEADER_ALIASES}
+            elif i >= max_header_scan:
+                return
+            continue
+        if all(v is None for v in row):
+            continue
+        yield {col: row[idx] for idx, col in mapping.items() if idx < len(row)}
+
+
+def _build_payloads(rows: list, sheet_name: str, rates: dict, catalogo: pd.DataFrame = None,
+                    vistas: Counter = None) -> tuple:
+    """
+    Returns:
+        (payloads, omitidas): las filas cuya 'fecha' no es una fecha (totales, notas al
+        pie) o cuyo 'turno' está vacío o no es numérico no se importan; 'omitidas' lista
+        (columna, valor) de cada una.
+
+    Cada payload lleva una llave determinista (IDEMPOTENCY_KEY) derivada de hoja, fecha,
+    hora, máquina, turno y el número de aparición de esa combinación en la hoja
+    ('vistas' lleva la cuenta entre lotes), así que reimportar un libro no duplica filas.
+    """
+    df = pd.DataFrame(rows)
+    df = df[df['fecha'].notna()]
+    if df.empty:
+        return [], []
+
+    fechas = df['fecha'].map(_parse_fecha)
+    omitidas = [('fecha', str(v)) for v in df.loc[fechas.isna(), 'fecha']]
+    df = df[fechas.notna()].assign(fecha=fechas[fechas.notna()].map(date.isoformat))
+
+    # Sin turno válido no se adivina: la fila se omite y se reporta como las fechas
+    if 'turno' in df.columns:
+        turnos = df['turno'].map(_parse_turno)
+        omitidas += [('turno', f"{f} ({'' if v is None else v})")
+                     for f, v in zip(df.loc[turnos.isna(), 'fecha'], df.loc[turnos.isna(), 'turno'])]
+        df = df[turnos.notna()].assign(turno=turnos[turnos.notna()].astype(int))
+    else:
+        df = df.assign(turno=1)
+    if df.empty:
+        return [], omitidas
+
+    # Hojas sin columna de máquina: el nombre de la hoja es la máquina
+    if 'maquina' not in df.columns:
+        df['maquina'] = sheet_name
+    df['maquina'] = df['maquina'].fillna(sheet_name).astype(str).str.strip()
+
+    # Rate de la hoja; si no, el vigente en la fecha de cada fila (catálogo) o el de 'rates'
+    if 'rate_teorico' not in df.columns:
+        df['rate_teorico'] = None
+    rate = pd.to_numeric(df['rate_teorico'], errors='coerce')
+    if catalogo is not None and not catalogo.empty:
+        rate = rate.fillna(rates_por_fecha(catalogo, df['maquina'], df['fecha']))
+    df['rate_teorico'] = rate.fillna(df['maquina'].map(rates)).fillna(0).astype(float)
+
+    for col in COUNT_COLS:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int) if col in df.columns else 0
+
+    if 'hora' in df.columns:
+        df['hora'] = df['hora'].map(_parse_hora).astype('Int64')
+    else:
+        df['hora'] = pd.Series(pd.NA, index=df.index, dtype='Int64')
+
+    vistas = Counter() if vistas is None else vistas
+    llaves = []
+    for fila in zip(df['fecha'], df['hora'], df['maquina'], df['turno']):
+        fila = tuple(None if pd.isna(v) else v for v in fila)
+        vistas[fila] += 1
+        partes = (sheet_name, *fila, vistas[fila])
+        llaves.append(str(uuid.uuid5(IMPORT_NAMESPACE, '|'.join('' if v is None else str(v) for v in partes))))
+    df[IDEMPOTENCY_KEY] = llaves
+
+    metrics = calculate_metrics_batch(df)
+    df['scrap'] = metrics['scrap_total']
+    for col in ['tiempo_muerto', 'tiempo_funcionamiento', 'disponibilidad', 'rendimiento',
+                'calidad', 'oee', 'scrap_pct', 'ftt']:
+        df[col] = metrics[col]
+
+    payload_cols = ['fecha', 'hora', 'turno', 'maquina', 'tiempo_programado_min', 'rate_teorico',
+                    'producido', 'scrap'] + SCRAP_COLS + FAILURE_COLS + \
+                   ['tiempo_muerto', 'tiempo_funcionamiento', 'disponibilidad', 'rendimiento',
+                    'calidad', 'oee', 'scrap_pct', 'ftt', IDEMPOTENCY_KEY]
+    payloads = df[payload_cols].astype(object).where(df[payload_cols].notna(), None).to_dict('records')
+    # Tipos nativos de Python para la serialización JSON
+    return [{k: (v.item() if hasattr(v, 'item') else v) for k, v in p.items()} for p in payloads], omitidas
+
+
+def iter_workbook_records(source, rates: dict = None, batch_size: int = 2000, catalogo: pd.DataFrame = None):
+    """
+    Lee un libro heredado en streaming y genera listas de payloads de registros_oee.
+    Args:
+        source: Ruta o archivo (file-like) .xlsx.
+        rates (dict): Rate teórico por máquina para hojas sin columna de rate.
+        batch_size (int): Filas por lote de cálculo de métricas.
+        catalogo (DataFrame): Tabla 'maquinas' (db.fetch_machines()); con ella el rate de
+            las hojas sin columna de rate es el vigente en la fecha de cada fila ('rates'
+            queda para las máquinas fuera del catálogo).
+    Yields:
+        (nombre_hoja, list[dict], omitidas) por cada lote; 'omitidas' son (columna, valor)
+        de las filas que no se importan por fecha o turno no válidos.
+    """
+    rates = rates or MAQUINAS_RATES
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            rows = []
+            vistas = Counter()
+            for row in _iter_sheet_rows(ws):
+                rows.append(row)
+                if len(rows) >= batch_size:
+                    yield (ws.title, *_build_payloads(rows, ws.title, rates, catalogo, vistas))
+                    rows = []
+            if rows:
+                yield (ws.title, *_build_payloads(rows, ws.title, rates, catalogo, vistas))
+    finally:
+        wb.close()
+
+
+def import_workbook(db, source, rates: dict = None, chunk_size: int = 500, progress=None,
+                    catalogo: pd.DataFrame = None) -> dict:
+    """
+    Importa un libro heredado completo a registros_oee. Es un upsert sobre la llave
+    determinista de cada fila: reimportar el mismo libro no duplica registros.
+    Args:
+        db (SupabaseManager): Conexión destino.
+        catalogo (DataFrame): Tabla 'maquinas' para el rate vigente por fecha (ver iter_workbook_records).
+        progress (callable): progress(hoja, filas_insertadas_total) tras cada bloque insertado.
+    Returns:
+        dict por hoja con filas leídas, insertadas y omitidas (filas cuya fecha no es
+        una fecha, como los totales, o sin turno numérico; 'fechas_omitidas' y
+        'turnos_omitidos' listan sus valores).
+    """
+    summary = {}
+    total = 0
+    for sheet, payloads, omitidas in iter_workbook_records(source, rates, catalogo=catalogo):
+        stats = summary.setdefault(sheet, {'leidas': 0, 'insertadas': 0, 'omitidas': 0,
+                                           'fechas_omitidas': [], 'turnos_omitidos': []})
+        stats['leidas'] += len(payloads)
+        stats['omitidas'] += len(omitidas)
+        stats['fechas_omitidas'].extend(v for col, v in omitidas if col == 'fecha')
+        stats['turnos_omitidos'].extend(v for col, v in omitidas if col == 'turno')
+        base = total
+
+        def report(n, sheet=sheet, base=base):
+            if progress:
+                progress(sheet, base + n)
+
+        inserted = db.insert_records(payloads, chunk_size=chunk_size, progress=report,
+                                     on_conflict=IDEMPOTENCY_KEY)
+        stats['insertadas'] += inserted
+        total += inserted
+        if inserted < len(payloads):
+            break
+    return summary
+
+
+if __name__ == '__main__':
+    from modules.supabase_client import init_supabase
+
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    db = init_supabase()
+    if db is None:
+        sys.exit(1)
+
+    catalogo = db.fetch_machines()
+    for path in sys.argv[1:]:
+        summary = import_workbook(db, path, catalogo=catalogo,
+                                  progress=lambda sheet, n: print(f"\r{path} [{sheet}] {n} filas", end=''))
+        print()
+        for sheet, stats in summary.items():
+            print(f"  {sheet}: {stats['insertadas']}/{stats['leidas']} filas insertadas")
+            if stats['fechas_omitidas']:
+                print(f"    {len(stats['fechas_omitidas'])} filas omitidas (fecha no válida): "
+                      f"{', '.join(stats['fechas_omitidas'][:5])}")
+            if stats['turnos_omitidos']:
+                print(f"    {len(stats['turnos_omitidos'])} filas omitidas (turno no válido): "
+                      f"{', '.join(stats['turnos_omitidos'][:5])}")
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+Federación de plantas / líneas: consultas en abanico sobre varias fuentes.
+
+Cada fuente es un backend de almacenamiento (StorageBackend) más, opcionalmente,
+la línea ('linea' de registros_oee) que le corresponde. Varias líneas pueden vivir en
+proyectos de Supabase separados o como particiones de una misma tabla; para la app
+son indistintas.
+
+Las consultas se lanzan en paralelo a todas las fuentes seleccionadas y cada una
+tiene su propio tiempo límite, así que la latencia total es la de la fuente más lenta
+(o su límite), no la suma. Cada fuente tiene su propio pool de hilos con un máximo de
+consultas en curso: una fuente colgada no ocupa los hilos de las demás y, mientras
+tiene ese máximo sin terminar, se omite en lugar de acumular más consultas. El límite
+también se pasa al cliente HTTP de los proyectos de Supabase. Los agregados parciales
+de cada fuente se combinan con reaggregate (promedios ponderados por su conteo de
+valores no nulos); las fuentes que fallan o no responden a tiempo se omiten y quedan
+listadas en 'errores'.
+
+Configuración en secrets.toml (sin [[plantas]] la app usa una sola fuente, como antes):
+
+    [[plantas]]
+    nombre = "Rotarys"
+    linea = "Rotarys"          # opcional: filtra registros_oee por esta línea
+    timeout = 10               # opcional, segundos
+    max_en_curso = 4           # opcional, consultas simultáneas a esta fuente
+
+    [[plantas]]
+    nombre = "Planta Norte"
+    timeout = 20
+    [plantas.supabase]         # opcional: proyecto propio (si no, se comparte el backend
+    url = "..."                # de [storage] / [supabase])
+    key = "..."
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date
+
+import pandas as pd
+
+from modules.aggregations import GRAINS, IncrementalRollup, reaggregate, rollup_columns
+from modules.instrumentation import stage
+from modules.metrics import CATALOGO_COLS
+from modules.record_schema import typed_records
+from modules.storage import StorageBackend, init_storage
+
+KEYSET_COLS = ['fecha', 'hora', 'id']
+TODAS = "Todas"
+
+
+class Fuente:
+    """
+    Una planta / línea: backend, línea dentro de ese backend, tiempo límite y pool de
+    hilos propio con a lo más 'max_en_curso' consultas sin terminar.
+    """
+    def __init__(self, nombre: str, db: StorageBackend, linea: str = None, timeout: float = 15.0,
+                 max_en_curso: int = 4):
+        self.nombre = nombre
+        self.db = db
+        self.linea = linea
+        self.timeout = timeout
+        self.max_en_curso = max_en_curso
+        self.incremental = IncrementalRollup(linea=linea)
+        # Pool persistente: una consulta que excede el límite sigue en segundo plano sin
+        # bloquear la respuesta ni los hilos de las demás fuentes
+        self._pool = ThreadPoolExecutor(max_workers=max_en_curso, thread_name_prefix=f"planta-{nombre}")
+        self._en_curso = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        """
+        Lanza fn(*args) en el pool de la fuente, o devuelve None si ya tiene
+        'max_en_curso' consultas sin terminar (fuente colgada o saturada).
+        """
+        with self._lock:
+            if self._en_curso >= self.max_en_curso:
+                return None
+            self._en_curso += 1
+        future = self._pool.submit(fn, *args)
+        future.add_done_callback(self._terminada)
+        return future
+
+    def _terminada(self, _future):
+        with self._lock:
+            self._en_curso -= 1
+
+
+class Federation(StorageBackend):
+    """
+    StorageBackend que reparte cada lectura entre varias fuentes y combina los resultados.
+
+    select() devuelve una vista con un subconjunto de fuentes (con sus pools de hilos y
+    su estado incremental); los errores de la última consulta de cada vista
+    quedan en 'errores' ({nombre: mensaje}; cada consulta los reemplaza, así que quien
+    encadena varias debe leerlos después de cada una) y las fuentes cuyos agregados
+    incrementales no se pudieron actualizar (se muestran los anteriores) en 'avisos'.
+    """
+    def __init__(self, fuentes: list):
+        self.fuentes = {f.nombre: f for f in fuentes}
+        self._errores_lock = threading.Lock()
+        self.errores = {}
+        self.avisos = {}
+
+    @property
+    def nombres(self) -> list:
+        return list(self.fuentes)
+
+    def select(self, nombres: list = None) -> 'Federation':
+        """
+        Vista con las fuentes de 'nombres' (None o TODAS: todas).
+        """
+        if nombres is None or nombres == TODAS:
+            nombres = self.nombres
+        elif isinstance(nombres, str):
+            nombres = [nombres]
+        return Federation([self.fuentes[n] for n in nombres])
+
+    def _unica(self) -> Fuente:
+        if len(self.fuentes) != 1:
+            raise ValueError("Selecciona una sola planta / línea para esta operación.")
+        return next(iter(self.fuentes.values()))
+
+    def fan_out(self, fn, etapa: str = None) -> tuple:
+        """
+        Ejecuta fn(fuente) en paralelo para cada fuente de la vista. Con 'etapa', cada
+        llamada se mide (modules/instrumentation.py) con la planta, filas y bytes.
+        Returns:
+            (resultados, errores): {nombre: resultado} de las fuentes que respondieron a
+            tiempo y {nombre: mensaje} de las demás (y de las que aún tienen 'max_en_curso'
+            consultas sin terminar). Los errores también quedan en self.errores.
+        """
+        inicio = time.monotonic()
+        if etapa:
+            fn = _medida(etapa, fn)
+        resultados, errores, futures = {}, {}, {}
+        for nombre, fuente in self.fuentes.items():
+            # copy_context: las mediciones de los hilos cuentan en la corrida de quien consulta
+            future = fuente.submit(contextvars.copy_context().run, fn, fuente)
+            if future is None:
+                errores[nombre] = f"consultas anteriores sin terminar (límite {fuente.timeout:g} s)"
+            else:
+                futures[nombre] = future
+        # Cada fuente espera solo hasta su propio límite, contado desde el inicio común
+        for nombre in sorted(futures, key=lambda n: self.fuentes[n].timeout):
+            future = futures[nombre]
+            restante = max(0.0, inicio + self.fuentes[nombre].timeout - time.monotonic())
+            done, _ = wait([future], timeout=restante)
+            if not done:
+                future.cancel()
+                errores[nombre] = f"sin respuesta en {self.fuentes[nombre].timeout:g} s"
+                continue
+            try:
+                resultados[nombre] = future.result()
+            except Exception as e:
+                errores[nombre] = str(e)
+        with self._errores_lock:
+            self.errores = errores
+        return resultados, errores
+
+    # --- Escritura (una sola fuente) ---
+    def insert_record(self, data: dict):
+        fuente = self._unica()
+        if fuente.linea:
+            data.setdefault('linea', fuente.linea)
+        return fuente.db.insert_record(data)
+
+    def insert_records(self, records: list, chunk_size: int = 500, retries: int = 3,
+                       backoff: float = 1.0, progress=None, raise_errors: bool = False,
+                       on_conflict: str = None) -> int:
+        fuente = self._unica()
+        if fuente.linea:
+            records = ({**r, 'linea': r.get('linea') or fuente.linea} for r in records)
+        return fuente.db.insert_records(records, chunk_size=chunk_size, retries=retries,
+                                        backoff=backoff, progress=progress, raise_errors=raise_errors,
+                                        on_conflict=on_conflict)
+
+    # --- Lectura ---
+    def _concat(self, resultados: dict, columns: list = None) -> pd.DataFrame:
+        partes = []
+        for nombre, df in resultados.items():
+            if df is None or df.empty:
+                continue
+            if len(self.fuentes) > 1:
+                df = df.assign(planta=nombre)
+            partes.append(df)
+        if not partes:
+            return pd.DataFrame(columns=columns or [])
+        # Las categóricas de fuentes distintas se unen como texto; se vuelven a tipar
+        return typed_records(pd.concat(partes, ignore_index=True))
+
+    def fetch_records(self, start_date: date, end_date: date, linea: str = None,
+                      columns: list = None, maquinas: list = None, turnos: list = None) -> pd.DataFrame:
+        """
+        Registros de todas las fuentes; con más de una se agrega la columna 'planta'.
+        """
+        resultados, _ = self.fan_out(lambda f: f.db.fetch_records(
+            start_date, end_date, linea or f.linea, columns=columns, maquinas=maquinas, turnos=turnos),
+            etapa='fetch_records')
+        return self._concat(resultados, columns)
+
+    def fetch_page(self, start_date: date, end_date: date, linea: str = None, columns: list = None,
+                   maquinas: list = None, turnos: list = None, after: tuple = None,
+                   page_size: int = 100, raise_errors: bool = False, use_cache: bool = True) -> pd.DataFrame:
+        """
+        Une la página de cada fuente y se queda con las primeras 'page_size' filas
+        por (fecha, hora, id). Con varias fuentes los ids pueden repetirse entre
+        proyectos, así que el cursor solo es exacto por fuente: las filas que empatan
+        en (fecha, hora, id) con el cursor se repiten o se omiten en ese caso raro.
+        Con raise_errors, una fuente que falla o no responde lanza RuntimeError.
+        """
+        resultados, errores = self.fan_out(lambda f: f.db.fetch_page(
+            start_date, end_date, linea or f.linea, columns=columns, maquinas=maquinas,
+            turnos=turnos, after=after, page_size=page_size, raise_errors=raise_errors,
+            use_cache=use_cache), etapa='fetch_page')
+        if raise_errors and errores:
+            raise RuntimeError("; ".join(f"{nombre}: {error}" for nombre, error in errores.items()))
+        df = self._concat(resultados, columns)
+        if df.empty or len(resultados) < 2:
+            return df
+        orden = KEYSET_COLS + (['planta'] if 'planta' in df.columns else [])
+        return df.sort_values(orden, na_position='last', kind='stable', ignore_index=True).head(page_size)
+
+    def fetch_records_since(self, after_id: int, columns: list = None, linea: str = None,
+                            raise_errors: bool = False, use_mirror: bool = True) -> pd.DataFrame:
+        # Los ids solo son comparables dentro de una misma fuente
+        fuente = self._unica()
+        return fuente.db.fetch_records_since(after_id, columns=columns, linea=linea or fuente.linea,
+                                             raise_errors=raise_errors, use_mirror=use_mirror)
+
+    def latest_id(self, linea: str = None) -> int:
+        fuente = self._unica()
+        return fuente.db.latest_id(linea=linea or fuente.linea)
+
+    def fetch_machines(self, linea: str = None, refresh: bool = False) -> pd.DataFrame:
+        """
+        Catálogo de máquinas de todas las fuentes (cada una con su línea), sin repetir
+        los renglones de las fuentes que comparten backend.
+        """
+        resultados, _ = self.fan_out(lambda f: f.db.fetch_machines(linea=linea or f.linea, refresh=refresh))
+        partes = [df for df in resultados.values() if df is not None and not df.empty]
+        if not partes:
+            return pd.DataFrame(columns=CATALOGO_COLS)
+        return pd.concat(partes, ignore_index=True).drop_duplicates(['maquina', 'vigente_desde', 'linea'])
+
+    def aggregate(self, start_date: date, end_date: date, grain: tuple = ('fecha',),
+                  maquinas: list = None, turnos: list = None, linea: str = None,
+                  use_cache: bool = True) -> pd.DataFrame:
+        """
+        Rollup combinado: agregados parciales de cada fuente unidos con reaggregate.
+        Con varias fuentes 'max_id' es el máximo entre ellas (los ids de proyectos
+        distintos no son comparables; úsese junto con 'registros' como versión).
+        """
+        grain = tuple(grain)
+        resultados, _ = self.fan_out(lambda f: f.db.aggregate(
+            start_date, end_date, grain=grain, maquinas=maquinas, turnos=turnos, linea=linea or f.linea,
+            use_cache=use_cache), etapa='aggregate')
+        return _merge_rollups(resultados, grain, max_id=True)
+
+    def rollups(self, start_date: date, end_date: date, maquinas: list = None,
+                turnos: list = None, grains: dict = None) -> dict:
+        """
+        Rollups de 'grains' (por defecto GRAINS) combinando el estado incremental de
+        cada fuente (ver IncrementalRollup).
+        """
+        grains = grains or GRAINS
+        resultados, _ = self.fan_out(lambda f: f.incremental.rollups(
+            f.db, start_date, end_date, maquinas=maquinas, turnos=turnos, grains=grains),
+            etapa='rollups_incrementales')
+        avisos = {nombre: self.fuentes[nombre].incremental.error(start_date, end_date) for nombre in resultados}
+        with self._errores_lock:
+            self.avisos = {nombre: error for nombre, error in avisos.items() if error}
+        return {name: _merge_rollups({n: r[name] for n, r in resultados.items()}, grain)
+                for name, grain in grains.items()}
+
+
+def _medida(etapa: str, fn):
+    def medida(fuente):
+        with stage(etapa, planta=fuente.nombre) as info:
+            resultado = fn(fuente)
+            if isinstance(resultado, pd.DataFrame):
+                info['filas'] = len(resultado)
+                # Tamaño en memoria del DataFrame (sin el contenido de las cadenas)
+                info['bytes'] = int(resultado.memory_usage(index=False).sum())
+        return resultado
+    return medida
+
+
+def _merge_rollups(partes: dict, grain: tuple, max_id: bool = False) -> pd.DataFrame:
+    columnas = rollup_columns(grain) + (['max_id'] if max_id else [])
+    partes = [df for df in partes.values() if df is not None and not df.empty]
+    if not partes:
+        return pd.DataFrame(columns=columnas)
+    if len(partes) == 1:
+        return partes[0]
+    with stage('groupby.merge_plantas', fuentes=len(partes)):
+        return reaggregate(pd.concat(partes, ignore_index=True), grain)[columnas]
+
+
+def init_federation(secrets) -> Federation:
+    """
+    Crea la federación de [[plantas]] en 'secrets' (st.secrets o un dict equivalente).
+    Las plantas sin sección [plantas.supabase] / [plantas.storage] propia comparten el
+    backend por defecto (init_storage(secrets)). Sin [[plantas]], una sola fuente.
+    """
+    plantas = secrets.get("plantas", [])
+    compartido = None
+
+    def backend_compartido():
+        nonlocal compartido
+        if compartido is None:
+            compartido = init_storage(secrets)
+        return compartido
+
+    if not plantas:
+        return Federation([Fuente("Rotarys", backend_compartido())])
+
+    fuentes = []
+    for planta in plantas:
+        timeout = float(planta.get("timeout", 15.0))
+        if "supabase" in planta or "storage" in planta:
+            # El límite de la planta también corta las peticiones HTTP de su proyecto
+            supabase = {"timeout": timeout, **planta.get("supabase", {})}
+            db = init_storage({"supabase": supabase, "storage": planta.get("storage", {}),
+                               **({"mirror": planta["mirror"]} if "mirror" in planta else {})})
+        else:
+            db = backend_compartido()
+        fuentes.append(Fuente(planta["nombre"], db, linea=planta.get("linea"), timeout=timeout,
+                              max_en_curso=int(planta.get("max_en_curso", 4))))
+    return Federation(fuentes)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Caché de figuras (Plotly / Vega-Lite) compartida por todas las sesiones del proceso.
+
+Cada figura se identifica con clave_figura(nombre, *datos, meta=..., tema=...): el
+nombre de la gráfica, una firma (hash) de los agregados con los que se dibuja, la meta
+de OEE y el tema. Mientras los agregados no cambien, las corridas siguientes reutilizan
+la figura ya construida en lugar de volver a llamar a plotly.express / altair:
+
+    with stage('figura.tab1.trend_oee') as info:
+        fig = FIGURAS.get_or_build(clave_figura('tab1.trend_oee', df_trend, meta=meta_oee),
+                                   lambda: construir(df_trend), info)
+
+Lo guardado se comparte entre sesiones y no debe modificarse: las figuras de Plotly se
+guardan como objetos (st.plotly_chart solo las serializa) y las de Altair como la
+especificación Vega-Lite en JSON (ver vega_lite_json). El tamaño de cada entrada se
+estima sin serializarla (arreglos de datos de las trazas y propiedades del layout); la
+caché descarta las menos usadas al exceder 'max_entries' o 'max_bytes'.
+
+Este módulo no importa librerías de gráficas (la página de captura no las carga).
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def firma(*datos) -> str:
+    """
+    Hash estable de DataFrames, Series y valores simples (p. ej. los rollups de una gráfica).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for valor in datos:
+        if isinstance(valor, (pd.DataFrame, pd.Series)):
+            h.update(repr(list(valor.columns) if isinstance(valor, pd.DataFrame) else valor.name).encode())
+            h.update(pd.util.hash_pandas_object(valor, index=False).to_numpy().tobytes())
+        else:
+            h.update(repr(valor).encode())
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+def clave_figura(nombre: str, *datos, meta: float = None, tema: str = "plotly_dark") -> tuple:
+    return (nombre, firma(*datos), meta, tema)
+
+
+def vega_lite_json(chart) -> str:
+    """
+    Especificación Vega-Lite (JSON) de un gráfico de Altair, para guardar en la caché y
+    dibujar con st.vega_lite_chart(json.loads(spec)).
+    """
+    return json.dumps(chart.to_dict(), separators=(',', ':'))
+
+
+def _estimar(valor) -> int:
+    # Bytes aproximados de un valor de to_plotly_json(): los arreglos numéricos cuentan su
+    # buffer, los de objetos (texto, customdata) el largo de cada elemento como texto
+    if isinstance(valor, np.ndarray):
+        if valor.dtype == object:
+            return sum(len(str(v)) for v in valor.flat)
+        return valor.nbytes
+    if isinstance(valor, dict):
+        return sum(len(k) + _estimar(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple)):
+        return sum(_estimar(v) for v in valor)
+    if isinstance(valor, (str, bytes)):
+        return len(valor)
+    return 8
+
+
+def _tamano(valor) -> int:
+    if isinstance(valor, (str, bytes)):
+        return len(valor)
+    if hasattr(valor, 'to_plotly_json'):
+        # Figura de Plotly: se recorren las trazas sin pasar por pio.to_json (cada fallo
+        # de la caché costaría una serialización completa)
+        return sum(_estimar(traza.to_plotly_json()) for traza in valor.data) + \
+            _estimar(valor.layout.to_plotly_json())
+    return len(json.dumps(valor, default=str))
+
+
+class FigureCache:
+    """
+    Caché LRU de figuras acotada por número de entradas y bytes (tamaño estimado).
+    """
+    def __init__(self, max_entries: int = 128, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries = OrderedDict()
+        # Clave de cada objeto guardado (por id, válido mientras la caché lo retiene)
+        self._claves = {}
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build, info: dict = None):
+        """
+        Devuelve la figura de 'key'; si no está, la construye con build() y la guarda.
+        Con 'info' (el dict de una etapa de modules.instrumentation) anota 'cache': hit / miss.
+        """
+        with self._lock:
+            entrada = self._entries.get(key)
+            if entrada is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if info is not None:
+            info['cache'] = 'hit' if entrada is not None else 'miss'
+        if entrada is not None:
+            return entrada[0]
+
+        # Se construye fuera del candado: otras sesiones no esperan a esta figura
+        valor = build()
+        tamano = _tamano(valor)
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key][0]
+            self._entries[key] = (valor, tamano)
+            self._claves[id(valor)] = key
+            self.bytes += tamano
+            while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+                _, (descartado, tam) = self._entries.popitem(last=False)
+                self._claves.pop(id(descartado), None)
+                self.bytes -= tam
+        return valor
+
+    def key_of(self, valor):
+        """
+        Clave con la que se guardó 'valor' (el mismo objeto), o None si no viene de la caché.
+        """
+        with self._lock:
+            key = self._claves.get(id(valor))
+            if key is not None and self._entries.get(key, (None,))[0] is valor:
+                return key
+            return None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._claves.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "kb": round(self.bytes / 1024, 1)}
+
+
+# Instancia del proceso: la comparten las páginas, los reportes y todas las sesiones
+FIGURAS = FigureCache()
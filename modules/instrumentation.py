@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentación de las etapas costosas de la app (descargas, filtros, groupby,
+gráficas y serialización de reportes).
+
+Cada etapa se mide con:
+
+    with stage('fetch_records', planta='Rotarys') as info:
+        df = db.fetch_records(...)
+        info['filas'] = len(df)
+
+y produce un registro {etapa, ms, mem_kb, ...info} que:
+  - se agrega a la corrida (rerun) actual de Streamlit (begin_rerun / end_rerun),
+  - se acumula por etapa para calcular p50 / p95 entre corridas (summary),
+  - se escribe como una línea JSON en el logger 'oee.rendimiento'.
+
+La memoria (pico asignado durante la etapa, vía tracemalloc) solo se mide con
+enable_memory(True): tracemalloc vuelve más lento todo el proceso.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("oee.rendimiento")
+
+# Registros de la corrida actual; se propaga a los hilos con contextvars.copy_context()
+_corrida = contextvars.ContextVar("oee_corrida", default=None)
+
+
+class Instrumentation:
+    """
+    Tiempos y memoria por etapa, compartidos por todas las sesiones del proceso.
+    """
+    def __init__(self, max_samples: int = 500):
+        self.max_samples = max_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+        # Pila de picos de memoria de las etapas anidadas (por hilo)
+        self._local = threading.local()
+
+    # --- Memoria ---
+    def enable_memory(self, enabled: bool):
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @property
+    def memory_enabled(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def _mem_enter(self):
+        if not tracemalloc.is_tracing():
+            return None
+        pila = getattr(self._local, 'pila', None)
+        if pila is None:
+            pila = self._local.pila = []
+        actual, pico = tracemalloc.get_traced_memory()
+        if pila:
+            # El pico de la etapa exterior hasta ahora se conserva antes de reiniciarlo
+            pila[-1][1] = max(pila[-1][1], pico)
+        tracemalloc.reset_peak()
+        pila.append([actual, 0])
+        return actual
+
+    def _mem_exit(self, inicio):
+        if inicio is None or not tracemalloc.is_tracing():
+            return None
+        pila = self._local.pila
+        _, pico_hijos = pila.pop()
+        pico = max(tracemalloc.get_traced_memory()[1], pico_hijos)
+        if pila:
+            pila[-1][1] = max(pila[-1][1], pico)
+        tracemalloc.reset_peak()
+        return round((pico - inicio) / 1024, 1)
+
+    # --- Etapas ---
+    @contextmanager
+    def stage(self, name: str, **info):
+        """
+        Mide el bloque como la etapa 'name'. 'info' (y lo que el bloque agregue al dict
+        devuelto, p. ej. filas o bytes) se guarda junto con el tiempo.
+        """
+        mem = self._mem_enter()
+        t0 = time.perf_counter()
+        try:
+            yield info
+        finally:
+            registro = {'etapa': name, 'ms': round((time.perf_counter() - t0) * 1000, 3),
+                        'mem_kb': self._mem_exit(mem), **info}
+            self.record(registro)
+
+    def record(self, registro: dict):
+        with self._lock:
+            muestras = self._samples.get(registro['etapa'])
+            if muestras is None:
+                muestras = self._samples[registro['etapa']] = deque(maxlen=self.max_samples)
+            muestras.append((registro['ms'], registro['mem_kb']))
+        corrida = _corrida.get()
+        if corrida is not None:
+            corrida.append(registro)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({'ts': datetime.now().isoformat(timespec='milliseconds'), **registro},
+                                   default=str, ensure_ascii=False))
+
+    # --- Corridas de Streamlit ---
+    def begin_rerun(self) -> 'Corrida':
+        """
+        Inicia una corrida del script; las etapas medidas en este hilo (y en los hilos
+        lanzados con contextvars.copy_context) se agregan a la Corrida devuelta.
+        """
+        corrida = Corrida()
+        _corrida.set(corrida)
+        return corrida
+
+    def end_rerun(self, corrida: 'Corrida') -> dict:
+        """
+        Cierra la corrida y registra su duración total como la etapa 'rerun'.
+        """
+        _corrida.set(None)
+        registro = {'etapa': 'rerun', 'ms': round((time.perf_counter() - corrida.inicio) * 1000, 3),
+                    'mem_kb': None, 'etapas': len(corrida)}
+        self.record(registro)
+        return registro
+
+    # --- Resumen entre corridas ---
+    def summary(self) -> pd.DataFrame:
+        """
+        Percentiles por etapa sobre las últimas 'max_samples' mediciones.
+        """
+        with self._lock:
+            muestras = {etapa: list(valores) for etapa, valores in self._samples.items()}
+        filas = []
+        for etapa, valores in muestras.items():
+            ms = np.array([v[0] for v in valores], dtype=float)
+            mem = np.array([v[1] for v in valores if v[1] is not None], dtype=float)
+            filas.append({
+                'etapa': etapa,
+                'n': len(ms),
+                'p50_ms': np.percentile(ms, 50),
+                'p95_ms': np.percentile(ms, 95),
+                'max_ms': ms.max(),
+                'p95_mem_kb': np.percentile(mem, 95) if len(mem) else np.nan,
+            })
+        columnas = ['etapa', 'n', 'p50_ms', 'p95_ms', 'max_ms', 'p95_mem_kb']
+        if not filas:
+            return pd.DataFrame(columns=columnas)
+        return pd.DataFrame(filas, columns=columnas).sort_values('p95_ms', ascending=False, ignore_index=True)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+class Corrida(list):
+    """
+    Registros de las etapas de una corrida del script, en orden de término.
+    """
+    def __init__(self):
+        super().__init__()
+        self.inicio = time.perf_counter()
+
+
+def configure_log(path: str):
+    """
+    Escribe los registros de 'oee.rendimiento' (una línea JSON por etapa) en 'path'.
+    """
+    if any(isinstance(h, logging.FileHandler) and h.baseFilename == os.path.abspath(path) for h in logger.handlers):
+        return
+    handler = logging.FileHandler(path, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+# Instancia del proceso: la comparten la app, los módulos y todas las sesiones
+INSTRUMENTATION = Instrumentation()
+stage = INSTRUMENTATION.stage
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Réplica local de registros_oee en Parquet, particionada por mes.
+
+La réplica se sincroniza por deltas (registros con id mayor al último replicado menos
+un traslape de 'overlap' ids: un id menor puede confirmarse después de uno mayor, y los
+ids del traslape ya replicados no se vuelven a escribir) y SupabaseManager la lee de forma transparente, con poda de particiones por fecha,
+filtros de máquina / turno y selección de columnas. Si la red no está disponible la
+lectura sigue funcionando con los datos ya replicados (solo lectura).
+
+Las páginas del detalle (read_page) leen las particiones en orden desde la fecha del
+cursor y se detienen al completar la página: su costo no depende de su profundidad.
+
+Un delta se escribe antes de guardar la marca de agua, así que una caída entre ambos
+pasos vuelve a descargar esos registros: las lecturas y la compactación descartan los
+ids repetidos. La compactación escribe fuera de las particiones (carpeta '_tmp', que la
+lectura ignora) y, igual que la escritura de deltas, no coincide con ninguna lectura.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from modules.record_schema import INT_COLS, FLOAT_COLS, STRING_COLS, CATEGORY_COLS, typed_records
+
+# Esquema fijo para que todos los archivos delta sean compatibles entre sí
+MIRROR_SCHEMA = pa.schema(
+    [pa.field(c, pa.string()) for c in STRING_COLS] +
+    [pa.field(c, pa.int64()) for c in INT_COLS] +
+    [pa.field(c, pa.float64()) for c in FLOAT_COLS]
+)
+PARTITION_COL = 'mes'
+# Orden de las páginas del detalle ('hora' nula al final de cada día)
+KEYSET_COLS = ['fecha', 'hora', 'id']
+
+
+def keyset_mask(df: pd.DataFrame, after: tuple) -> pd.Series:
+    """
+    Filas que van después del cursor (fecha, hora, id) en el orden KEYSET_COLS (mismo
+    predicado que el filtro de PostgREST de SupabaseManager.fetch_page).
+    """
+    fecha, hora, row_id = after
+    same_day = df['fecha'] == fecha
+    if hora is None:
+        return (df['fecha'] > fecha) | (same_day & df['hora'].isna() & (df['id'] > row_id))
+    return (df['fecha'] > fecha) | (same_day & (df['hora'] > hora)) | \
+        (same_day & (df['hora'] == hora) & (df['id'] > row_id)) | (same_day & df['hora'].isna())
+
+
+class LocalMirror:
+    """
+    Réplica Parquet de registros_oee en 'path/mes=AAAA-MM/*.parquet'.
+    """
+    def __init__(self, path: str = "replica_registros_oee", sync_interval: float = 60.0,
+                 compact_threshold: int = 24, overlap: int = 1000):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.compact_threshold = compact_threshold
+        self.overlap = overlap
+        self.last_error = None
+        self.synced_at = None
+        self._last_attempt = 0.0
+        self._lock = threading.Lock()
+        # Archivos de las particiones: escritura de deltas / compactación contra lecturas
+        self._files_lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        # Las carpetas con prefijo '_' no forman parte del dataset Parquet
+        self._tmp_dir = os.path.join(path, "_tmp")
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        self._state_path = os.path.join(path, "_estado.json")
+        self._state = self._load_state()
+
+    @property
+    def max_id(self) -> int:
+        return self._state.get("max_id", 0)
+
+    @property
+    def offline(self) -> bool:
+        return self.last_error is not None
+
+    def _load_state(self) -> dict:
+        if os.path.exists(self._state_path):
+            with open(self._state_path) as f:
+                return json.load(f)
+        return {"max_id": 0}
+
+    def _save_state(self):
+        tmp = self._state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._state, f)
+        os.replace(tmp, self._state_path)
+
+    def sync(self, db, force: bool = False) -> int:
+        """
+        Descarga de 'db' los registros con id mayor al último replicado menos 'overlap'
+        y escribe los que aún no están en la réplica como archivos delta en su partición
+        mensual. Se limita a una vez por 'sync_interval'.
+        Returns:
+            int: Registros nuevos replicados.
+        """
+        with self._lock:
+            if not force and time.monotonic() - self._last_attempt < self.sync_interval:
+                return 0
+            self._last_attempt = time.monotonic()
+            desde = max(0, self.max_id - self.overlap)
+            try:
+                delta = db.fetch_records_since(desde, raise_errors=True, use_mirror=False)
+            except Exception as e:
+                self.last_error = str(e)
+                return 0
+            self.last_error = None
+            self.synced_at = datetime.utcnow()
+            if not delta.empty and desde < self.max_id:
+                # Ids del traslape confirmados tarde: solo los que la réplica no tiene
+                replicados = self.read_since(desde, columns=['id'])['id']
+                delta = delta[~delta['id'].isin(replicados)]
+            if delta.empty:
+                return 0
+
+            table = self._to_table(delta)
+            meses = delta['fecha'].astype(str).str[:7]
+            for mes in sorted(meses.unique()):
+                part = table.filter(pa.array((meses == mes).to_numpy()))
+                part_dir = os.path.join(self.path, f"{PARTITION_COL}={mes}")
+                os.makedirs(part_dir, exist_ok=True)
+                self._publish(part, part_dir, "delta")
+                self._maybe_compact(part_dir)
+
+            self._state["max_id"] = max(self.max_id, int(delta['id'].max()))
+            self._save_state()
+            return len(delta)
+
+    def _to_table(self, df: pd.DataFrame) -> pa.Table:
+        columns = {}
+        for field in MIRROR_SCHEMA:
+            values = df[field.name] if field.name in df.columns else pd.Series([None] * len(df))
+            if field.name in INT_COLS:
+                values = pd.to_numeric(values, errors='coerce').astype('Int64')
+            elif field.name in FLOAT_COLS:
+                values = pd.to_numeric(values, errors='coerce').astype(float)
+            elif pd.api.types.is_datetime64_any_dtype(values):
+                # 'fecha' ya tipada (modules/record_schema.py): se guarda como fecha ISO
+                values = values.dt.strftime('%Y-%m-%d')
+            else:
+                values = values.astype(object).where(values.notna(), None).map(
+                    lambda v: None if v is None else str(v))
+            columns[field.name] = pa.array(values, type=field.type, from_pandas=True)
+        return pa.table(columns, schema=MIRROR_SCHEMA)
+
+    def _publish(self, table: pa.Table, part_dir: str, prefix: str) -> str:
+        # Se escribe en '_tmp' y se mueve completo a la partición (mismo sistema de archivos)
+        name = f"{prefix}-{uuid.uuid4().hex}.parquet"
+        tmp = os.path.join(self._tmp_dir, name)
+        pq.write_table(table, tmp)
+        with self._files_lock:
+            os.replace(tmp, os.path.join(part_dir, name))
+        return name
+
+    def _maybe_compact(self, part_dir: str):
+        files = sorted(f for f in os.listdir(part_dir) if f.endswith(".parquet"))
+        if len(files) <= self.compact_threshold:
+            return
+        table = pa.concat_tables([pq.read_table(os.path.join(part_dir, f), schema=MIRROR_SCHEMA) for f in files])
+        # Ordenado por id y sin ids repetidos (deltas descargados dos veces)
+        _, primeros = np.unique(table['id'].to_numpy(zero_copy_only=False), return_index=True)
+        table = table.take(primeros)
+        name = os.path.join(self._tmp_dir, f"compact-{uuid.uuid4().hex}.parquet")
+        pq.write_table(table, name)
+        # El compactado reemplaza a sus deltas sin que una lectura vea ambos (o ninguno)
+        with self._files_lock:
+            os.replace(name, os.path.join(part_dir, os.path.basename(name)))
+            for f in files:
+                os.remove(os.path.join(part_dir, f))
+
+    def _read(self, filters: list, columns: list = None) -> pd.DataFrame:
+        if not any(name.startswith(f"{PARTITION_COL}=") for name in os.listdir(self.path)):
+            return pd.DataFrame(columns=columns or MIRROR_SCHEMA.names)
+        read_cols = None
+        if columns:
+            # 'id' se lee siempre para descartar repetidos
+            read_cols = list(dict.fromkeys(['id'] + [c for c in columns if c in MIRROR_SCHEMA.names]))
+        with self._files_lock:
+            table = pq.read_table(self.path, columns=read_cols, filters=filters, memory_map=True,
+                                  schema=MIRROR_SCHEMA.append(pa.field(PARTITION_COL, pa.string())),
+                                  partitioning='hive')
+        # Máquina / línea se codifican como diccionario en Arrow: to_pandas las entrega
+        # categóricas sin crear un str por fila
+        for col in CATEGORY_COLS:
+            if col in table.column_names:
+                table = table.set_column(table.schema.get_field_index(col), col,
+                                         pc.dictionary_encode(table[col]))
+        df = typed_records(table.to_pandas())
+        df = df.drop_duplicates('id').sort_values('id', ignore_index=True)
+        # Sin la columna de partición ni 'id' si no se pidieron
+        conservar = columns or [c for c in df.columns if c != PARTITION_COL]
+        return df[[c for c in df.columns if c in conservar]]
+
+    @staticmethod
+    def _filtros(linea: str = None, maquinas: list = None, turnos: list = None) -> list:
+        filters = []
+        if linea:
+            filters.append(('linea', '=', linea))
+        if maquinas is not None:
+            filters.append(('maquina', 'in', list(maquinas)))
+        if turnos is not None:
+            filters.append(('turno', 'in', [int(t) for t in turnos]))
+        return filters
+
+    def read(self, start_date: date, end_date: date, linea: str = None, columns: list = None,
+             maquinas: list = None, turnos: list = None) -> pd.DataFrame:
+        """
+        Lee el rango de fechas desde la réplica con poda de particiones (mes),
+        filtros de máquina / turno / línea y selección de columnas.
+        """
+        start, end = start_date.isoformat(), end_date.isoformat()
+        filters = [
+            (PARTITION_COL, '>=', start[:7]), (PARTITION_COL, '<=', end[:7]),
+            ('fecha', '>=', start), ('fecha', '<=', end),
+        ]
+        return self._read(filters + self._filtros(linea, maquinas, turnos), columns)
+
+    def read_page(self, start_date: date, end_date: date, linea: str = None, columns: list = None,
+                  maquinas: list = None, turnos: list = None, after: tuple = None,
+                  limit: int = 100) -> pd.DataFrame:
+        """
+        Hasta 'limit' registros del rango ordenados por KEYSET_COLS después del cursor
+        'after' (fecha, hora, id). Se leen las particiones en orden a partir de la fecha
+        del cursor y la lectura se detiene al completar la página: cada página lee a lo
+        más el resto del mes en curso, no el período completo.
+        """
+        desde, hasta = start_date.isoformat(), end_date.isoformat()
+        if after is not None:
+            desde = max(desde, str(after[0])[:10])
+        leer = list(dict.fromkeys(columns + KEYSET_COLS)) if columns else None
+        meses = sorted(name.split('=', 1)[1] for name in os.listdir(self.path)
+                       if name.startswith(f"{PARTITION_COL}=") and desde[:7] <= name.split('=', 1)[1] <= hasta[:7])
+        partes, filas = [], 0
+        for mes in meses:
+            filters = [(PARTITION_COL, '=', mes), ('fecha', '>=', desde), ('fecha', '<=', hasta)]
+            df = self._read(filters + self._filtros(linea, maquinas, turnos), leer)
+            df = df.sort_values(KEYSET_COLS, na_position='last', ignore_index=True)
+            if after is not None:
+                df = df[keyset_mask(df, after)]
+            partes.append(df.head(limit - filas))
+            filas += len(partes[-1])
+            if filas >= limit:
+                break
+        if not partes:
+            return pd.DataFrame(columns=columns or MIRROR_SCHEMA.names)
+        # Las categóricas de meses distintos se unen como texto; se vuelven a tipar
+        df = typed_records(pd.concat(partes, ignore_index=True)) if len(partes) > 1 else partes[0]
+        return df[columns] if columns else df
+
+    def read_since(self, after_id: int, columns: list = None, linea: str = None) -> pd.DataFrame:
+        filters = [('id', '>', int(after_id))]
+        if linea:
+            filters.append(('linea', '=', linea))
+        return self._read(filters, columns)
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Catálogo de máquinas y cálculo de KPIs de OEE: versión escalar (un registro) y vectorizada (lotes).
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# --- CATÁLOGO DE MÁQUINAS Y RATES ---
+# Rates iniciales: semilla de la tabla 'maquinas' (schema.sql) y respaldo mientras la
+# tabla no exista o no responda. Los cambios de rate se hacen en la tabla, sin redeploy.
+MAQUINAS_RATES = {
+    "CS0525": 115, "CS0524": 115, "CS0516": 180, "CS0523": 100,
+    "CS0522": 100, "CS0537": 200, "CS0514": 180, "CS0515": 180,
+    "CS0505": 200, "CS0544": 200, "CS0575": 120, "CS0595": 120
+}
+
+# Columnas de la tabla 'maquinas': un renglón por máquina y fecha de inicio de vigencia
+CATALOGO_COLS = ['maquina', 'rate_teorico', 'vigente_desde', 'linea', 'activa']
+
+
+def rates_vigentes(catalogo: pd.DataFrame, fecha: date = None, solo_activas: bool = False) -> dict:
+    """
+    Rate teórico de cada máquina vigente en 'fecha' (hoy por defecto): el renglón con la
+    mayor 'vigente_desde' que no pase de 'fecha'; antes de su primera vigencia se usa el
+    primer rate de la máquina.
+    Args:
+        catalogo: Renglones de la tabla 'maquinas' (db.fetch_machines()).
+        solo_activas: Omite las máquinas dadas de baja en 'fecha' (p. ej. para capturar).
+    Returns:
+        dict {maquina: rate} ordenado por máquina; MAQUINAS_RATES si el catálogo está vacío.
+    """
+    if catalogo is None or catalogo.empty:
+        return dict(MAQUINAS_RATES)
+    dia = (fecha or date.today()).isoformat()
+    ordenado = catalogo.assign(vigente_desde=catalogo['vigente_desde'].astype(str).str[:10])\
+        .sort_values(['maquina', 'vigente_desde'])
+    vigentes = ordenado[ordenado['vigente_desde'] <= dia]
+    # Máquinas cuya primera vigencia es posterior a 'fecha'
+    futuras = ordenado[~ordenado['maquina'].isin(vigentes['maquina'])]
+    filas = pd.concat([vigentes.groupby('maquina').tail(1), futuras.groupby('maquina').head(1)])
+    if solo_activas and 'activa' in filas.columns:
+        filas = filas[filas['activa'].fillna(True).astype(bool)]
+    filas = filas.sort_values('maquina')
+    return dict(zip(filas['maquina'].tolist(), filas['rate_teorico'].astype(float).tolist()))
+
+
+def rates_por_fecha(catalogo: pd.DataFrame, maquinas: pd.Series, fechas: pd.Series) -> pd.Series:
+    """
+    Rate teórico vigente de cada (máquina, fecha), con la misma regla que rates_vigentes
+    pero resuelto por fila (p. ej. al importar históricos de varios meses).
+    Returns:
+        Series float con el índice de 'maquinas'; NaN para máquinas fuera del catálogo.
+    """
+    if catalogo is None or catalogo.empty:
+        return maquinas.map(MAQUINAS_RATES).astype(float)
+    vigencias = pd.DataFrame({
+        'maquina': catalogo['maquina'].astype(str).to_numpy(),
+        'desde': pd.to_datetime(catalogo['vigente_desde'].astype(str).str[:10]).astype('datetime64[ns]').to_numpy(),
+        'rate': catalogo['rate_teorico'].astype(float).to_numpy(),
+    }).sort_values('desde', kind='stable')
+    filas = pd.DataFrame({
+        'maquina': maquinas.astype(str).to_numpy(),
+        'dia': pd.to_datetime(fechas).astype('datetime64[ns]').to_numpy(),
+        'pos': np.arange(len(maquinas)),
+    }).sort_values('dia', kind='stable')
+    # Última vigencia que no pase de la fecha; antes de la primera, el primer rate
+    filas = pd.merge_asof(filas, vigencias, left_on='dia', right_on='desde', by='maquina')
+    primeros = vigencias.groupby('maquina')['rate'].first()
+    rates = filas['rate'].fillna(filas['maquina'].map(primeros))
+    return pd.Series(rates.to_numpy()[np.argsort(filas['pos'].to_numpy())], index=maquinas.index, dtype=float)
+
+# --- GRUPOS DE COLUMNAS DE REGISTROS_OEE ---
+SCRAP_COLS = ['scrap_setup', 'scrap_pruebas', 'scrap_msf', 'scrap_tubo',
+              'scrap_soldadura_quemada', 'scrap_ajuste', 'scrap_soldadura_porosa',
+              'scrap_falta_soldadura', 'scrap_primera_pieza']
+FAILURE_COLS = ['ajuste', 'falla_mecanica', 'falla_electrica', 'falta_personal', 'falta_material', 'cambio_modelo']
+KPI_COLS = ['oee', 'disponibilidad', 'rendimiento', 'ftt', 'scrap_pct']
+
+# Columnas calculadas por calculate_metrics / calculate_metrics_batch
+DERIVED_COLS = ['tiempo_muerto', 'tiempo_funcionamiento', 'disponibilidad', 'rendimiento',
+                'calidad', 'oee', 'scrap_pct', 'ftt', 'scrap_total']
+
+
+# --- FUNCIONES DE CÁLCULO (CORREGIDAS según Excel y con contribuidores de scrap) ---
+def calculate_metrics(tiempo_programado, rate_teorico, producido,
+                      scrap_setup, scrap_pruebas, scrap_msf, scrap_tubo,
+                      scrap_soldadura_quemada, scrap_ajuste, scrap_soldadura_porosa,
+                      scrap_falta_soldadura, scrap_primera_pieza,
+                      ajuste, f_mec, f_elec, f_personal, f_mat, c_modelo):
+    """
+    Calcula los KPIs de OEE.
+    El scrap total es la suma de los 9 contribuidores.
+    """
+    # Suma de todos los contribuidores de scrap
+    scrap_total = (scrap_setup + scrap_pruebas + scrap_msf + scrap_tubo +
+                   scrap_soldadura_quemada + scrap_ajuste + scrap_soldadura_porosa +
+                   scrap_falta_soldadura + scrap_primera_pieza)
+
+    tiempo_muerto = ajuste + f_mec + f_elec + f_personal + f_mat + c_modelo
+    tiempo_funcionamiento = max(0, tiempo_programado - tiempo_muerto)
+
+    disponibilidad = (tiempo_funcionamiento / tiempo_programado) if tiempo_programado > 0 else 0
+
+    # Capacidad teórica = tiempo_programado * (rate_teorico / 60)  --> como en Excel
+    capacidad_teorica = tiempo_programado * (rate_teorico / 60)
+    rendimiento = (producido / capacidad_teorica) if capacidad_teorica > 0 else 0
+
+    # Scrap % = scrap_total / producido
+    scrap_pct = (scrap_total / producido) if producido > 0 else 0
+    # FTT y Calidad = producido / (producido + scrap_total)
+    ftt = (producido / (producido + scrap_total)) if (producido + scrap_total) > 0 else 0
+    calidad = ftt
+
+    oee = disponibilidad * rendimiento * calidad
+
+    return {
+        "tiempo_muerto": tiempo_muerto,
+        "tiempo_funcionamiento": tiempo_funcionamiento,
+        "disponibilidad": disponibilidad * 100,
+        "rendimiento": rendimiento * 100,
+        "calidad": calidad * 100,
+        "oee": oee * 100,
+        "scrap_pct": scrap_pct * 100,
+        "ftt": ftt * 100,
+        "scrap_total": scrap_total
+    }
+
+
+def _safe_div(num, den):
+    # Igual que la versión escalar: 0 cuando el denominador no es positivo
+    out = np.zeros(np.shape(num), dtype=np.float64)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+def calculate_metrics_batch(data) -> pd.DataFrame:
+    """
+    Versión vectorizada de calculate_metrics para lotes de registros.
+    Args:
+        data: DataFrame o dict de arrays con las columnas de registros_oee
+              ('tiempo_programado_min', 'rate_teorico', 'producido', SCRAP_COLS, FAILURE_COLS).
+              Las columnas faltantes se toman como 0.
+    Returns:
+        DataFrame con DERIVED_COLS, idéntico (bit a bit) a aplicar calculate_metrics fila por fila.
+    """
+    if isinstance(data, pd.DataFrame):
+        n = len(data)
+        index = data.index
+    else:
+        n = len(next(iter(data.values()))) if data else 0
+        index = None
+
+    def col(name, dtype=np.int64):
+        if name in data:
+            return np.asarray(data[name], dtype=dtype)
+        return np.zeros(n, dtype=dtype)
+
+    tiempo_programado = col('tiempo_programado_min')
+    rate_teorico = col('rate_teorico', np.float64)
+    producido = col('producido')
+
+    # Misma secuencia de sumas que la versión escalar
+    scrap_total = col(SCRAP_COLS[0])
+    for name in SCRAP_COLS[1:]:
+        scrap_total = scrap_total + col(name)
+    tiempo_muerto = col(FAILURE_COLS[0])
+    for name in FAILURE_COLS[1:]:
+        tiempo_muerto = tiempo_muerto + col(name)
+
+    tiempo_funcionamiento = np.maximum(0, tiempo_programado - tiempo_muerto)
+    disponibilidad = _safe_div(tiempo_funcionamiento, tiempo_programado)
+
+    capacidad_teorica = tiempo_programado * (rate_teorico / 60)
+    rendimiento = _safe_div(producido, capacidad_teorica)
+
+    scrap_pct = _safe_div(scrap_total, producido)
+    ftt = _safe_div(producido, producido + scrap_total)
+    calidad = ftt
+
+    oee = disponibilidad * rendimiento * calidad
+
+    return pd.DataFrame({
+        "tiempo_muerto": tiempo_muerto,
+        "tiempo_funcionamiento": tiempo_funcionamiento,
+        "disponibilidad": disponibilidad * 100,
+        "rendimiento": rendimiento * 100,
+        "calidad": calidad * 100,
+        "oee": oee * 100,
+        "scrap_pct": scrap_pct * 100,
+        "ftt": ftt * 100,
+        "scrap_total": scrap_total
+    }, index=index)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Esquema tipado de registros_oee en memoria.
+
+Las descargas de PostgREST llegan como una lista de dicts JSON y pd.DataFrame deja
+cada columna como int64 / float64 / object genérico; 'fecha' queda como texto. Con
+typed_records cada backend entrega sus registros con tipos compactos:
+  - 'maquina' y 'linea' categóricas (una docena de valores repetidos en cada fila),
+  - conteos de piezas y minutos en enteros pequeños (int16 / int32, solo si todos los
+    valores caben y no hay nulos; si no, la columna conserva su tipo),
+  - 'turno' int8 y 'hora' Int8 (entero con nulos: hay registros sin hora),
+  - 'fecha' convertida una sola vez a datetime64; se compara directo con fechas ISO
+    ('2024-01-31'), así que los filtros por rango no cambian.
+
+Los agregados (modules/aggregations.py) devuelven sus dimensiones como texto, igual
+que oee_rollup en la base de datos.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+from modules.metrics import SCRAP_COLS, FAILURE_COLS, KPI_COLS
+
+# --- GRUPOS DE COLUMNAS POR TIPO ---
+# Minutos (una jornada cabe en int16) y piezas (int32)
+MINUTE_COLS = ['tiempo_programado_min'] + FAILURE_COLS + ['tiempo_muerto', 'tiempo_funcionamiento']
+PIECE_COLS = ['producido', 'scrap'] + SCRAP_COLS
+# Mismo orden que el esquema Parquet de modules/local_mirror.py
+INT_COLS = ['id', 'hora', 'turno', 'tiempo_programado_min', 'producido', 'scrap'] + SCRAP_COLS + \
+           FAILURE_COLS + ['tiempo_muerto', 'tiempo_funcionamiento']
+FLOAT_COLS = ['rate_teorico', 'calidad'] + KPI_COLS
+CATEGORY_COLS = ['maquina', 'linea']
+STRING_COLS = ['created_at', 'fecha'] + CATEGORY_COLS
+
+# Tipo compacto de cada columna entera; 'id' se queda en int64
+RECORD_DTYPES = {
+    'turno': 'int8',
+    'hora': 'Int8',
+    **{col: 'int16' for col in MINUTE_COLS},
+    **{col: 'int32' for col in PIECE_COLS},
+}
+
+# Tipos para leer registros en CSV (wire_format = "csv"): el texto se deja como
+# str y typed_records lo convierte una vez sobre el resultado completo
+CSV_DTYPES = {'created_at': str, 'fecha': str, 'maquina': str, 'linea': str}
+
+
+def _narrow(values: pd.Series, dtype: str) -> pd.Series:
+    # Solo se reduce si todos los valores caben; con nulos (salvo en tipos nullable)
+    # o fuera de rango la columna se queda como está
+    if str(values.dtype) == dtype:
+        return values
+    values = pd.to_numeric(values, errors='coerce')
+    nullable = dtype[0].isupper()
+    if values.isna().any() and not nullable:
+        return values
+    validos = values.dropna()
+    if len(validos) and not (validos == np.floor(validos)).all():
+        return values
+    limites = np.iinfo(dtype.lower())
+    if len(validos) and (validos.min() < limites.min or validos.max() > limites.max):
+        return values
+    return values.astype(dtype)
+
+
+def typed_records(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convierte registros de registros_oee (cualquier subconjunto de columnas) al esquema
+    compacto. Es idempotente: las columnas que ya tienen su tipo no se copian.
+    """
+    if df.empty:
+        return df
+    cambios = {}
+    for col in df.columns:
+        values = df[col]
+        if col == 'fecha':
+            if not pd.api.types.is_datetime64_any_dtype(values):
+                cambios[col] = pd.to_datetime(values, format='ISO8601')
+        elif col in CATEGORY_COLS:
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                cambios[col] = values.astype('category')
+            elif not values.cat.categories.is_monotonic_increasing:
+                # Categorías en orden alfabético: groupby(sort=True) ordena como con texto
+                cambios[col] = values.cat.reorder_categories(sorted(values.cat.categories))
+        elif col in RECORD_DTYPES:
+            narrowed = _narrow(values, RECORD_DTYPES[col])
+            if narrowed is not values:
+                cambios[col] = narrowed
+    return df.assign(**cambios) if cambios else df
+
+
+def read_csv_records(text: str) -> pd.DataFrame:
+    """
+    Registros de una respuesta CSV de PostgREST (Accept: text/csv), sin tipar.
+    """
+    if not text or not text.strip():
+        return pd.DataFrame()
+    return pd.read_csv(io.StringIO(text), dtype=CSV_DTYPES, keep_default_na=False, na_values=[''])
@@ -0,0 +1,504 @@
+# -*- coding: utf-8 -*-
+"""
+Generador del reporte ejecutivo HTML por secciones.
+
+El documento se escribe directamente en un archivo o búfer, sección por sección:
+  - plotly.js se incrusta una sola vez (modo sin conexión) o se carga del CDN.
+  - Las gráficas se emiten como JSON; los arreglos repetidos entre gráficas (p. ej.
+    las fechas de las tendencias diarias) y la plantilla de estilo se guardan una
+    sola vez y se referencian desde cada figura.
+  - La tabla de detalle viaja como JSON compacto en bloques de 'chunk_rows' filas y
+    se pagina en el navegador, así que la memoria de generación no depende del
+    número de registros del período.
+
+write_downloads genera el reporte y el CSV de registros en archivos, en una sola
+pasada por los bloques de iter_detalle (paginación keyset sobre la base de datos):
+el período completo nunca se carga en memoria.
+"""
+import itertools
+import json
+from typing import Iterable, Union
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.subplots import make_subplots
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+from modules.aggregations import pareto
+from modules.downsampling import ANCHO_PX, downsample
+from modules.figure_cache import FIGURAS, clave_figura
+from modules.instrumentation import stage
+from modules.metrics import SCRAP_COLS, FAILURE_COLS, KPI_COLS
+
+# Proyección de registros_oee que necesita el reporte (solo las columnas que muestra)
+REPORT_COLS = ['id', 'fecha', 'hora', 'turno', 'maquina', 'tiempo_programado_min', 'producido', 'scrap'] + \
+              KPI_COLS + FAILURE_COLS + SCRAP_COLS
+
+# plotly.js del CDN con la misma versión que el incrustado en modo sin conexión
+PLOTLY_CDN_URL = f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"
+
+# Columnas con semáforo en la tabla de detalle (mismos umbrales que en la app)
+SEMAFORO_COLS = ['oee', 'rendimiento', 'ftt']
+SEMAFORO_UMBRALES = (70, 85)
+
+# Tabla de detalle (con desglose de scrap)
+COLUMNAS_DETALLE = ['fecha', 'hora', 'turno', 'maquina', 'tiempo_prog_hrs',
+                    'producido', 'scrap'] + SCRAP_COLS + ['scrap_pct', 'ftt',
+                    'disponibilidad', 'rendimiento', 'oee']
+COLS_KPI_DETALLE = ['scrap_pct', 'ftt', 'disponibilidad', 'rendimiento', 'oee'] + SCRAP_COLS
+
+# Propiedades de las trazas que se comparten entre figuras
+SHARED_TRACE_KEYS = ('x', 'y', 'z', 'customdata', 'text', 'ids')
+
+DARK_LAYOUT = dict(
+    template="plotly_dark",
+    paper_bgcolor="#0f172a",
+    plot_bgcolor="#0f172a",
+    font=dict(color="#f8fafc"),
+)
+
+# Ajustes visuales adicionales por figura
+TRACE_STYLE = {
+    'trend_oee': dict(line=dict(color="#38bdf8", width=3), marker=dict(size=6)),
+    'trend_all': dict(marker=dict(size=6)),
+}
+
+# (página, título de sección, clave de la figura)
+FIGURAS_REPORTE = [
+    (1, "OEE Promedio por Máquina", 'bar'),
+    (1, "Tendencia Diaria de OEE", 'trend_oee'),
+    (2, "Tendencia Diaria - OEE, FTT y Scrap", 'trend_all'),
+    (2, "Tendencia Mensual - OEE, FTT y Scrap", 'month_all'),
+    (2, "Top 5 Máquinas con Peor OEE", 'top5'),
+    (2, "Pareto Global de Tiempos Muertos (Minutos)", 'pareto'),
+    (2, "Pareto Global de Causas de Scrap (Piezas)", 'pareto_scrap'),
+]
+
+_CSS = """
+    body { background-color: #0f172a; color: #f8fafc; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 0; padding: 40px; text-align: center; }
+    .page { max-width: 1200px; margin: 0 auto 50px auto; background: linear-gradient(135deg, #1e293b 0%, #0f172a 100%); padding: 60px 50px 50px 50px; border-radius: 15px; box-shadow: 0 10px 25px rgba(0,0,0,0.5); border: 1px solid #334155; min-height: 1000px; position: relative; }
+    h1 { color: #38bdf8; font-size: 2.5em; margin-bottom: 10px; }
+    h3 { color: #94a3b8; border-bottom: 1px solid #334155; padding-bottom: 10px; margin-top: 40px; }
+    p { color: #94a3b8; font-size: 1.2em; margin: 5px 0; }
+    table { width: 100%; border-collapse: collapse; margin: 30px auto; background-color: rgba(15, 23, 42, 0.6); border-radius: 10px; overflow: hidden; font-size: 0.8em; }
+    th { background-color: #334155; color: #38bdf8; padding: 10px; text-align: center; text-transform: uppercase; }
+    td { padding: 8px; border-bottom: 1px solid #334155; text-align: center; }
+    .chart-container { background-color: #0f172a; border: 1px solid #334155; border-radius: 12px; padding: 10px; margin: 20px auto; max-width: 100%; }
+    .page-break { page-break-before: always; }
+    .footer { margin-top: 60px; font-size: 0.9em; color: #64748b; border-top: 1px solid #334155; padding-top: 20px; }
+    .pager { display: flex; justify-content: center; align-items: center; gap: 15px; color: #94a3b8; }
+    .pager button { background-color: #2563eb; color: white; border: none; border-radius: 8px; padding: 6px 14px; cursor: pointer; }
+    .pager button:disabled { background-color: #334155; cursor: default; }
+"""
+
+# Paginación de la tabla de detalle en el navegador
+_TABLE_JS = """
+(function () {
+  var T = window.OEE_TABLE, page = 0, size = T.pageSize;
+  var body = document.getElementById('detalle-body'), info = document.getElementById('detalle-info');
+  function color(v) { return v < T.umbrales[0] ? '#ef4444' : (v < T.umbrales[1] ? '#f59e0b' : '#10b981'); }
+  function esc(v) { return String(v).replace(/&/g, '&amp;').replace(/</g, '&lt;'); }
+  function render() {
+    var pages = Math.max(1, Math.ceil(T.rows.length / size)), html = [];
+    page = Math.min(Math.max(page, 0), pages - 1);
+    T.rows.slice(page * size, (page + 1) * size).forEach(function (row) {
+      html.push('<tr>');
+      row.forEach(function (v, j) {
+        var style = (T.semaforo.indexOf(j) >= 0 && v !== null) ?
+          ' style="background-color: ' + color(v) + '; color: white; font-weight: bold"' : '';
+        html.push('<td' + style + '>' + (v === null ? '' : esc(v)) + '</td>');
+      });
+      html.push('</tr>');
+    });
+    body.innerHTML = html.join('');
+    info.textContent = 'Página ' + (page + 1) + ' de ' + pages + ' (' + T.rows.length.toLocaleString() + ' registros)';
+    document.getElementById('detalle-prev').disabled = page === 0;
+    document.getElementById('detalle-next').disabled = page >= pages - 1;
+  }
+  document.getElementById('detalle-prev').onclick = function () { page--; render(); };
+  document.getElementById('detalle-next').onclick = function () { page++; render(); };
+  render();
+})();
+"""
+
+# Reconstrucción de las figuras a partir de los arreglos compartidos
+_FIGURES_JS = """
+(function () {
+  function hydrate(o) {
+    if (Array.isArray(o)) return o.map(hydrate);
+    if (o && typeof o === 'object') {
+      if (Object.keys(o).length === 1 && '$ref' in o) return OEE_SHARED[o['$ref']];
+      var out = {};
+      for (var k in o) out[k] = hydrate(o[k]);
+      return out;
+    }
+    return o;
+  }
+  for (var id in OEE_FIGURES) {
+    var fig = hydrate(OEE_FIGURES[id]);
+    Plotly.newPlot(id, fig.data, fig.layout, {responsive: true});
+  }
+})();
+"""
+
+
+def preparar_detalle(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Columnas y redondeo de la tabla de detalle a partir de registros de registros_oee.
+    """
+    df = df.copy()
+    # Asegurar que existan las columnas de scrap (por si faltan en registros antiguos)
+    for col in SCRAP_COLS:
+        if col not in df.columns:
+            df[col] = 0
+    df['tiempo_prog_hrs'] = (df['tiempo_programado_min'] / 60).round(2)
+    # Con varias plantas / líneas (modules/federation.py) se indica el origen de cada fila
+    columnas = (['planta'] if 'planta' in df.columns else []) + COLUMNAS_DETALLE
+    vista = df[columnas].copy()
+    vista[COLS_KPI_DETALLE] = vista[COLS_KPI_DETALLE].astype(float).round(2)
+    if pd.api.types.is_datetime64_any_dtype(vista['fecha']):
+        vista['fecha'] = vista['fecha'].dt.strftime('%Y-%m-%d')
+    return vista
+
+
+def _cacheada(clave: str, build, *datos, meta: float = None):
+    # Figura del reporte memorizada por sus agregados (modules/figure_cache.py)
+    with stage(f'figura.reporte.{clave}') as info:
+        return FIGURAS.get_or_build(clave_figura(f'reporte.{clave}', *datos, meta=meta), build, info)
+
+
+def report_figures(rollups: dict, ancho_px: int = ANCHO_PX, meta_oee: float = None) -> dict:
+    """
+    Gráficas del reporte a partir de los rollups 'total', 'fecha', 'mes' y 'maquina'
+    (ver modules.aggregations.GRAINS). Las tendencias diarias se reducen a ~ancho_px
+    puntos por serie (modules/downsampling.py), conservando los cruces de 'meta_oee'.
+    Cada figura se reutiliza de FIGURAS mientras sus agregados no cambien.
+    Returns:
+        dict {clave: go.Figure} con las claves de FIGURAS_REPORTE. Las figuras pueden
+        venir de la caché compartida: no deben modificarse.
+    """
+    totales = rollups['total'].iloc[0]
+    df_daily, df_monthly, df_mach = rollups['fecha'], rollups['mes'], rollups['maquina']
+    metas = {'oee': meta_oee} if meta_oee is not None else None
+    figuras = {}
+
+    # --- 1. OEE por máquina ---
+    def bar():
+        return px.bar(df_mach, x='maquina', y='oee', color='oee',
+                      color_continuous_scale='RdYlGn', title="OEE por Máquina (Promedio)",
+                      hover_data={'oee': ':.2f}%', 'ftt': ':.2f}%', 'scrap_pct': ':.2f}%'})
+    figuras['bar'] = _cacheada('bar', bar, df_mach)
+
+    # --- 2. Tendencia diaria de OEE ---
+    def trend_oee():
+        with stage('downsampling', filas=len(df_daily)):
+            df_trend = downsample(df_daily, 'fecha', ['oee'], ancho_px, metas)
+        return px.line(df_trend, x='fecha', y='oee', markers=True,
+                       title="Tendencia Diaria OEE (Promedio)",
+                       hover_data={'oee': ':.2f}%', 'ftt': ':.2f}%', 'scrap_pct': ':.2f}%'})
+    figuras['trend_oee'] = _cacheada('trend_oee', trend_oee, df_daily, ancho_px, meta=meta_oee)
+
+    # --- 3. Tendencia diaria de OEE, FTT y Scrap ---
+    def trend_all():
+        with stage('downsampling', filas=len(df_daily)):
+            df_trend_all = downsample(df_daily, 'fecha', ['oee', 'ftt', 'scrap_pct'], ancho_px, metas)
+        fig = px.line(df_trend_all, x='fecha', y=['oee', 'ftt', 'scrap_pct'],
+                      labels={'value': 'Porcentaje (%)', 'variable': 'Métrica'},
+                      title="Tendencia Diaria - OEE, FTT y Scrap",
+                      template="plotly_dark",
+                      color_discrete_map={'oee': '#38bdf8', 'ftt': '#10b981', 'scrap_pct': '#ef4444'})
+        fig.update_traces(mode='lines+markers', marker=dict(size=6))
+        return fig
+    figuras['trend_all'] = _cacheada('trend_all', trend_all, df_daily, ancho_px, meta=meta_oee)
+
+    # --- 4. Tendencia mensual de OEE, FTT y Scrap ---
+    def month_all():
+        return px.bar(df_monthly, x='mes', y=['oee', 'ftt', 'scrap_pct'],
+                      barmode='group',
+                      labels={'value': 'Porcentaje (%)', 'variable': 'Métrica'},
+                      title="Tendencia Mensual - OEE, FTT y Scrap",
+                      template="plotly_dark",
+                      color_discrete_map={'oee': '#38bdf8', 'ftt': '#10b981', 'scrap_pct': '#ef4444'})
+    figuras['month_all'] = _cacheada('month_all', month_all, df_monthly)
+
+    # --- 5. Top 5 máquinas con peor OEE ---
+    def top5():
+        df_mach_oee = df_mach[['maquina', 'oee']].sort_values('oee', ascending=True).head(5)
+        if df_mach_oee.empty:
+            # Figura vacía para no dejar huecos en el reporte
+            fig = go.Figure()
+            fig.update_layout(title="No hay datos suficientes para mostrar el top 5")
+            return fig
+        fig = px.bar(df_mach_oee, x='oee', y='maquina', orientation='h',
+                     color='oee', color_continuous_scale='RdYlGn_r',
+                     title="Top 5 Peor OEE por Máquina",
+                     labels={'oee': 'OEE Promedio (%)', 'maquina': 'Máquina'},
+                     template="plotly_dark")
+        fig.update_layout(coloraxis_colorbar=dict(title="OEE %"))
+        return fig
+    figuras['top5'] = _cacheada('top5', top5, df_mach)
+
+    # --- Pareto de tiempos muertos ---
+    def pareto_tiempos():
+        failures = pareto(totales, FAILURE_COLS, 'Falla', 'Minutos')
+        fig_pareto = make_subplots(specs=[[{"secondary_y": True}]])
+        fig_pareto.add_trace(go.Bar(x=failures['Falla'], y=failures['Minutos'], name="Minutos", marker_color="#ef4444"), secondary_y=False)
+        fig_pareto.add_trace(go.Scatter(x=failures['Falla'], y=failures['Acumulado'], name="% Acumulado", marker_color="#3b82f6"), secondary_y=True)
+        fig_pareto.update_layout(title="Pareto Global de Tiempos Muertos", template="plotly_dark")
+        return fig_pareto
+    figuras['pareto'] = _cacheada('pareto', pareto_tiempos, totales[FAILURE_COLS])
+
+    # --- Pareto de scrap ---
+    def pareto_scrap():
+        scrap_contrib = pareto(totales, SCRAP_COLS, 'Causa', 'Piezas')
+        fig_pareto_scrap = make_subplots(specs=[[{"secondary_y": True}]])
+        fig_pareto_scrap.add_trace(go.Bar(x=scrap_contrib['Causa'], y=scrap_contrib['Piezas'], name="Piezas", marker_color="#f59e0b"), secondary_y=False)
+        fig_pareto_scrap.add_trace(go.Scatter(x=scrap_contrib['Causa'], y=scrap_contrib['Acumulado'], name="% Acumulado", marker_color="#3b82f6"), secondary_y=True)
+        fig_pareto_scrap.update_layout(title="Pareto Global de Causas de Scrap", template="plotly_dark")
+        return fig_pareto_scrap
+    figuras['pareto_scrap'] = _cacheada('pareto_scrap', pareto_scrap, totales[SCRAP_COLS])
+
+    return figuras
+
+
+def _script_json(obj) -> str:
+    # JSON seguro dentro de <script>
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).replace('</', '<\\/')
+
+
+class _SharedArrays:
+    """
+    Registro de valores repetidos entre figuras: cada valor distinto se guarda
+    una sola vez y las figuras lo referencian como {"$ref": i}.
+    """
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def ref(self, value) -> dict:
+        key = json.dumps(value, sort_keys=True, separators=(',', ':'))
+        if key not in self._index:
+            self._index[key] = len(self.values)
+            self.values.append(value)
+        return {'$ref': self._index[key]}
+
+    def share(self, spec_json: str) -> dict:
+        spec = json.loads(spec_json)
+        for trace in spec.get('data', []):
+            for key in SHARED_TRACE_KEYS:
+                if isinstance(trace.get(key), (list, dict)):
+                    trace[key] = self.ref(trace[key])
+        layout = spec.get('layout', {})
+        if 'template' in layout:
+            layout['template'] = self.ref(layout['template'])
+        return spec
+
+
+def _spec_reporte(clave: str, fig: go.Figure) -> str:
+    """
+    JSON de la figura con el estilo del reporte (DARK_LAYOUT y TRACE_STYLE). Para las
+    figuras de report_figures se memoriza junto a la figura de pantalla en FIGURAS.
+    """
+    def build():
+        estilizada = go.Figure(fig).update_layout(**DARK_LAYOUT)
+        if clave in TRACE_STYLE:
+            estilizada.update_traces(**TRACE_STYLE[clave])
+        return pio.to_json(estilizada, validate=False)
+
+    origen = FIGURAS.key_of(fig)
+    if origen is None:
+        return build()
+    with stage(f'figura.reporte_html.{clave}') as info:
+        return FIGURAS.get_or_build(origen[:3] + ('reporte_html',), build, info)
+
+
+def _iter_chunks(detalle: Union[pd.DataFrame, Iterable[pd.DataFrame]], chunk_rows: int):
+    if isinstance(detalle, pd.DataFrame):
+        for i in range(0, len(detalle), chunk_rows):
+            yield detalle.iloc[i:i + chunk_rows]
+    else:
+        yield from detalle
+
+
+def _kpis_html(total_producido: int, ftt: float, scrap_pct: float) -> str:
+    return f"""
+    <div style="display: flex; justify-content: space-around; background-color: #1e293b; padding: 20px; border-radius: 10px; border: 1px solid #334155; margin-bottom: 30px;">
+        <div>
+            <h2 style="color: #38bdf8; margin: 0; font-size: 2em;">{total_producido:,}</h2>
+            <p style="margin: 0; color: #94a3b8; font-weight: bold; text-transform: uppercase;">Total Producido</p>
+        </div>
+        <div>
+            <h2 style="color: #10b981; margin: 0; font-size: 2em;">{ftt:.2f}%</h2>
+            <p style="margin: 0; color: #94a3b8; font-weight: bold; text-transform: uppercase;">FTT Global (Promedio)</p>
+        </div>
+        <div>
+            <h2 style="color: #ef4444; margin: 0; font-size: 2em;">{scrap_pct:.2f}%</h2>
+            <p style="margin: 0; color: #94a3b8; font-weight: bold; text-transform: uppercase;">Scrap Global (Promedio)</p>
+        </div>
+    </div>
+    """
+
+
+def write_report(out, start_date, end_date, totales: dict, columnas: list,
+                 detalle: Union[pd.DataFrame, Iterable[pd.DataFrame]], figuras: dict,
+                 logo_b64: str = "", offline: bool = True, chunk_rows: int = 5000,
+                 page_size: int = 100, alcance: str = None) -> None:
+    """
+    Escribe el reporte ejecutivo en 'out' (flujo de texto) sección por sección.
+    Args:
+        totales: 'producido', 'ftt' y 'scrap_pct' del período.
+        columnas: Columnas de la tabla de detalle, en orden.
+        detalle: DataFrame o iterable de DataFrames (bloques) con esas columnas.
+        figuras: {clave: go.Figure} con las claves de FIGURAS_REPORTE.
+        offline: Incrusta plotly.js en el documento en lugar de cargarlo del CDN.
+        alcance: Texto opcional bajo el período (p. ej. máquina y turno del reporte).
+    """
+    logo_html = f'<img src="data:image/png;base64,{logo_b64}" style="width:120px; position:absolute; top:30px; left:30px;">' if logo_b64 else ""
+    semaforo = [columnas.index(c) for c in SEMAFORO_COLS if c in columnas]
+
+    out.write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n')
+    out.write('<title>Reporte Ejecutivo OEE Rotarys | EA Innovation</title>\n')
+    out.write(f'<style>{_CSS}</style>\n')
+    if offline:
+        out.write('<script type="text/javascript">')
+        out.write(get_plotlyjs())
+        out.write('</script>\n')
+    else:
+        out.write(f'<script src="{PLOTLY_CDN_URL}" charset="utf-8"></script>\n')
+    out.write('</head>\n<body>\n')
+
+    # --- PÁGINA 1: KPIs y detalle ---
+    out.write(f"""
+    <div class="page">
+        {logo_html}
+        <h1>EA Innovation Suite</h1>
+        <p>Reporte de Desempeño OEE - Área de Rotarys</p>
+        <p style="font-size: 1em; opacity: 0.8; margin-bottom: 30px;">Período: {start_date} al {end_date}{f" · {alcance}" if alcance else ""}</p>
+        {_kpis_html(int(totales['producido']), totales['ftt'], totales['scrap_pct'])}
+        <h3>Listado Detallado de Operaciones (con desglose de scrap)</h3>
+        <div style="overflow-x: auto;">
+            <table>
+                <thead><tr>{''.join(f'<th>{c}</th>' for c in columnas)}</tr></thead>
+                <tbody id="detalle-body"></tbody>
+            </table>
+        </div>
+        <div class="pager">
+            <button id="detalle-prev">◀</button><span id="detalle-info"></span><button id="detalle-next">▶</button>
+        </div>
+    """)
+    out.write('<script>window.OEE_TABLE = ')
+    out.write(_script_json({'pageSize': page_size, 'semaforo': semaforo,
+                            'umbrales': SEMAFORO_UMBRALES, 'rows': []}))
+    out.write(';</script>\n')
+    for chunk in _iter_chunks(detalle, chunk_rows):
+        if chunk.empty:
+            continue
+        rows = chunk[columnas].to_json(orient='values', date_format='iso', double_precision=4)
+        out.write('<script>Array.prototype.push.apply(OEE_TABLE.rows, ')
+        out.write(rows.replace('</', '<\\/'))
+        out.write(');</script>\n')
+    out.write(f'<script>{_TABLE_JS}</script>\n')
+
+    # --- GRÁFICAS ---
+    shared = _SharedArrays()
+    specs = {}
+
+    def write_figures(pagina):
+        for num, titulo, clave in FIGURAS_REPORTE:
+            if num != pagina or clave not in figuras:
+                continue
+            specs[f'fig-{clave}'] = shared.share(_spec_reporte(clave, figuras[clave]))
+            out.write(f'<h3>{titulo}</h3>\n<div class="chart-container"><div id="fig-{clave}"></div></div>\n')
+
+    write_figures(1)
+    out.write("""
+        <div class="footer">
+            Generado por Master Engineer Erik Armenta | EA Innovation Suite 2026
+        </div>
+    </div>
+    <div class="page-break"></div>
+    """)
+
+    # --- PÁGINA 2: tendencias y Paretos ---
+    out.write(f"""
+    <div class="page">
+        {logo_html}
+        <h1>Análisis Detallado de Tendencias y Rendimiento</h1>
+        <p>Comparativa de OEE, FTT y Scrap</p>
+    """)
+    write_figures(2)
+    out.write("""
+        <div class="footer">
+            Este reporte constituye una auditoría técnica de EA Innovation. <br>
+            Cálculos basados en promedios de los valores registrados.
+        </div>
+    </div>
+    """)
+
+    out.write('<script>var OEE_SHARED = ')
+    out.write(_script_json(shared.values))
+    out.write(';\nvar OEE_FIGURES = ')
+    out.write(_script_json(specs))
+    out.write(f';\n{_FIGURES_JS}</script>\n')
+    out.write('</body>\n</html>\n')
+
+
+def cursor_keyset(fila: pd.Series) -> tuple:
+    """
+    Cursor (fecha, hora, id) de fetch_page a partir de la última fila de una página.
+    """
+    return (str(fila['fecha'])[:10], None if pd.isna(fila['hora']) else int(fila['hora']), int(fila['id']))
+
+
+def iter_detalle(db, start_date, end_date, maquinas: list = None, turnos: list = None,
+                 columns: list = None, chunk_rows: int = 5000):
+    """
+    Registros del período en bloques de 'chunk_rows' filas, ordenados por (fecha, hora, id)
+    y leídos con db.fetch_page: solo un bloque está en memoria a la vez y ninguno pasa
+    por la caché de consultas. Un bloque que falla lanza la excepción (no se confunde
+    con el final de los datos).
+    """
+    after = None
+    while True:
+        bloque = db.fetch_page(start_date, end_date, columns=columns or REPORT_COLS, maquinas=maquinas,
+                               turnos=turnos, after=after, page_size=chunk_rows,
+                               raise_errors=True, use_cache=False)
+        if bloque.empty:
+            return
+        yield bloque
+        if len(bloque) < chunk_rows:
+            return
+        after = cursor_keyset(bloque.iloc[-1])
+
+
+def write_downloads(html_path: str, csv_path: str, start_date, end_date, totales: dict,
+                    bloques: Iterable[pd.DataFrame], figuras: dict, **kwargs) -> int:
+    """
+    Escribe el reporte HTML (write_report) y el CSV de los registros en una sola pasada
+    por 'bloques' (p. ej. iter_detalle). kwargs se pasan a write_report.
+    Returns:
+        int: Registros escritos.
+    """
+    bloques = iter(bloques)
+    primero = next(bloques, None)
+    columnas = list(preparar_detalle(primero).columns) if primero is not None else COLUMNAS_DETALLE
+    filas = 0
+
+    with open(csv_path, 'w', encoding='utf-8', newline='') as csv_out, \
+            open(html_path, 'w', encoding='utf-8', newline='') as out:
+        def detalle():
+            nonlocal filas
+            for bloque in itertools.chain([primero] if primero is not None else [], bloques):
+                bloque.to_csv(csv_out, index=False, header=filas == 0)
+                filas += len(bloque)
+                yield preparar_detalle(bloque)
+
+        with stage('reporte_html') as info:
+            write_report(out, start_date, end_date, totales, columnas, detalle(), figuras, **kwargs)
+            info['filas'] = filas
+            info['bytes'] = out.tell()
+        if not filas:
+            csv_out.write(','.join(REPORT_COLS) + '\n')
+    return filas
@@ -1,25 +1,38 @@
 -- Create the OEE records table
+-- Columns mirror the payload written by the capture form in OEE_Dash.py
 create table public.registros_oee (
     id bigint generated by default as identity primary key,
     created_at timestamp with time zone default timezone('utc'::text, now()) not null,
-    
+
     -- Inputs (from Orange cells)
     fecha date not null,
-    linea text not null,
-    turno text not null,
-    modelo text,
+    hora integer,
+    turno integer not null,
+    maquina text not null,
+    linea text,
     tiempo_programado_min integer default 0,
     rate_teorico float default 0,
     producido integer default 0,
-    rechazos_fugas integer default 0,
-    
-    -- Failure Modes (Orange cells)
-    setup_excesivo integer default 0,
+
+    -- Scrap contributors (pieces)
+    scrap integer default 0,
+    scrap_setup integer default 0,
+    scrap_pruebas integer default 0,
+    scrap_msf integer default 0,
+    scrap_tubo integer default 0,
+    scrap_soldadura_quemada integer default 0,
+    scrap_ajuste integer default 0,
+    scrap_soldadura_porosa integer default 0,
+    scrap_falta_soldadura integer default 0,
+    scrap_primera_pieza integer default 0,
+
+    -- Failure Modes (minutes)
+    ajuste integer default 0,
     falla_mecanica integer default 0,
     falla_electrica integer default 0,
-    falla_chamber integer default 0,
-    ajuste_no_programado integer default 0,
+    falta_personal integer default 0,
     falta_material integer default 0,
+    cambio_modelo integer default 0,
 
     -- Calculated Fields (Backend Logic)
     tiempo_muerto integer default 0,
@@ -27,5 +40,143 @@ create table public.registros_oee (
     disponibilidad float default 0,
     rendimiento float default 0,
     calidad float default 0,
-    oee float default 0
+    oee float default 0,
+    scrap_pct float default 0,
+    ftt float default 0,
+
+    -- Client-generated idempotency key of spooled captures (modules/spool.py upserts on it)
+    capture_id uuid
+);
+
+create index registros_oee_fecha_idx on public.registros_oee (fecha, maquina, turno);
+-- Keyset pagination of the report detail table (SupabaseManager.fetch_page)
+create index registros_oee_keyset_idx on public.registros_oee (fecha, hora, id);
+-- Upgrading an existing table:
+--   alter table public.registros_oee add column if not exists capture_id uuid;
+create unique index registros_oee_capture_idx on public.registros_oee (capture_id);
+
+-- Server-side rollup used by SupabaseManager.aggregate()
+-- p_grain lists the dimensions to group by: any of 'fecha', 'mes', 'maquina', 'turno', 'hora'.
+-- Dimensions not in p_grain come back as null; an empty p_grain returns a single total row.
+-- Records without 'hora' are grouped under hora = -1.
+-- Each KPI mean comes with its non-null count (<kpi>_n), used to weight it when
+-- rollups are re-aggregated (modules/aggregations.py reaggregate).
+-- Upgrading from the version without 'hora' or the <kpi>_n counts changes the return
+-- type, so drop it first:
+--   drop function if exists public.oee_rollup(date, date, text[], text[], integer[], text);
+create or replace function public.oee_rollup(
+    p_start date,
+    p_end date,
+    p_grain text[] default array['fecha'],
+    p_maquinas text[] default null,
+    p_turnos integer[] default null,
+    p_linea text default null
+)
+returns table (
+    fecha date,
+    mes text,
+    maquina text,
+    turno integer,
+    hora integer,
+    registros bigint,
+    tiempo_programado_min bigint,
+    producido bigint,
+    scrap bigint,
+    tiempo_muerto bigint,
+    oee float,
+    disponibilidad float,
+    rendimiento float,
+    ftt float,
+    scrap_pct float,
+    oee_n bigint,
+    disponibilidad_n bigint,
+    rendimiento_n bigint,
+    ftt_n bigint,
+    scrap_pct_n bigint,
+    ajuste bigint,
+    falla_mecanica bigint,
+    falla_electrica bigint,
+    falta_personal bigint,
+    falta_material bigint,
+    cambio_modelo bigint,
+    scrap_setup bigint,
+    scrap_pruebas bigint,
+    scrap_msf bigint,
+    scrap_tubo bigint,
+    scrap_soldadura_quemada bigint,
+    scrap_ajuste bigint,
+    scrap_soldadura_porosa bigint,
+    scrap_falta_soldadura bigint,
+    scrap_primera_pieza bigint,
+    max_id bigint
+)
+language sql stable
+as $$
+    select
+        case when 'fecha' = any(p_grain) then r.fecha end,
+        case when 'mes' = any(p_grain) then to_char(r.fecha, 'YYYY-MM') end,
+        case when 'maquina' = any(p_grain) then r.maquina end,
+        case when 'turno' = any(p_grain) then r.turno end,
+        case when 'hora' = any(p_grain) then coalesce(r.hora, -1) end,
+        count(*),
+        coalesce(sum(r.tiempo_programado_min), 0),
+        coalesce(sum(r.producido), 0),
+        coalesce(sum(r.scrap), 0),
+        coalesce(sum(r.tiempo_muerto), 0),
+        avg(r.oee),
+        avg(r.disponibilidad),
+        avg(r.rendimiento),
+        avg(r.ftt),
+        avg(r.scrap_pct),
+        count(r.oee),
+        count(r.disponibilidad),
+        count(r.rendimiento),
+        count(r.ftt),
+        count(r.scrap_pct),
+        coalesce(sum(r.ajuste), 0),
+        coalesce(sum(r.falla_mecanica), 0),
+        coalesce(sum(r.falla_electrica), 0),
+        coalesce(sum(r.falta_personal), 0),
+        coalesce(sum(r.falta_material), 0),
+        coalesce(sum(r.cambio_modelo), 0),
+        coalesce(sum(r.scrap_setup), 0),
+        coalesce(sum(r.scrap_pruebas), 0),
+        coalesce(sum(r.scrap_msf), 0),
+        coalesce(sum(r.scrap_tubo), 0),
+        coalesce(sum(r.scrap_soldadura_quemada), 0),
+        coalesce(sum(r.scrap_ajuste), 0),
+        coalesce(sum(r.scrap_soldadura_porosa), 0),
+        coalesce(sum(r.scrap_falta_soldadura), 0),
+        coalesce(sum(r.scrap_primera_pieza), 0),
+        max(r.id)
+    from public.registros_oee r
+    where r.fecha between p_start and p_end
+      and (p_maquinas is null or r.maquina = any(p_maquinas))
+      and (p_turnos is null or r.turno = any(p_turnos))
+      and (p_linea is null or r.linea = p_linea)
+    group by 1, 2, 3, 4, 5
+    order by 1, 2, 3, 4, 5;
+$$;
+
+-- Machine catalog read by SupabaseManager.fetch_machines() (sidebar and capture form)
+-- One row per machine and effective date: a rate change is a new row with a later
+-- vigente_desde, so records captured before the change keep the old rate.
+-- 'linea' null = the machine belongs to every line; 'activa' false hides it from capture.
+create table public.maquinas (
+    maquina text not null,
+    vigente_desde date not null default '2000-01-01',
+    rate_teorico float not null,
+    linea text,
+    activa boolean not null default true,
+    primary key (maquina, vigente_desde)
 );
+
+-- Initial rates (MAQUINAS_RATES in modules/metrics.py)
+insert into public.maquinas (maquina, rate_teorico) values
+    ('CS0525', 115), ('CS0524', 115), ('CS0516', 180), ('CS0523', 100),
+    ('CS0522', 100), ('CS0537', 200), ('CS0514', 180), ('CS0515', 180),
+    ('CS0505', 200), ('CS0544', 200), ('CS0575', 120), ('CS0595', 120)
+on conflict do nothing;
+
+-- Example rate change effective from a given date:
+--   insert into public.maquinas (maquina, vigente_desde, rate_teorico) values ('CS0525', '2026-11-01', 125);
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Bitácora local (write-ahead) de capturas pendientes de enviar a Supabase.
+
+Cada captura del formulario se escribe primero en un archivo SQLite local (modo WAL,
+synchronous=FULL: el registro queda en disco al confirmar). Un hilo en segundo plano
+envía los pendientes a Supabase por lotes, con reintentos y espera exponencial,
+de modo que el operador no espera la red ni pierde el turno si la base de datos cae.
+
+Cada captura lleva un 'capture_id' (uuid) generado aquí; el envío es un upsert sobre
+esa llave, así que reenviar un lote cuya respuesta se perdió no duplica registros.
+Un lote que la base de datos rechaza (datos inválidos, no una caída de red) se reenvía
+fila por fila; la fila que sigue siendo rechazada tras 'max_attempts' intentos pasa a
+descartadas (no bloquea la cola) y se muestra en la página de captura para revisarla.
+Las capturas enviadas se borran de la bitácora después de 'retention_days' días.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from postgrest.exceptions import APIError
+
+# Llave de idempotencia de registros_oee (índice único en schema.sql)
+IDEMPOTENCY_KEY = 'capture_id'
+
+
+# Errores que rechazan los datos: SQLSTATE 22xxx (dato inválido), 23xxx (restricción)
+# y PGRST1xx (petición mal formada). El resto (sin código / HTTP 5xx, 57014 timeout,
+# 53300 sin conexiones, 40001 serialización, PGRST0xx...) es transitorio y se reintenta
+_CODIGOS_RECHAZO = ('22', '23', 'PGRST1')
+
+
+def _rechazado(error: Exception) -> bool:
+    """
+    True si la base de datos respondió y rechazó los datos; False si es una falla
+    transitoria (red, timeout, base saturada o bloqueada, PostgREST sin Postgres).
+    """
+    if isinstance(error, APIError):
+        return str(error.code or '').startswith(_CODIGOS_RECHAZO)
+    return isinstance(error, (sqlite3.IntegrityError, sqlite3.InterfaceError, ValueError, TypeError))
+
+
+class CaptureSpool:
+    """
+    Cola persistente de payloads de registros_oee.
+    """
+    def __init__(self, path: str = "capturas_pendientes.db", batch_size: int = 100,
+                 poll_interval: float = 5.0, max_backoff: float = 300.0, max_attempts: int = 5,
+                 retention_days: float = 7.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.retention_days = retention_days
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+            create table if not exists spool (
+                id integer primary key autoincrement,
+                payload text not null,
+                captured_at text not null,
+                flushed_at text,
+                attempts integer not null default 0,
+                dead_at text,
+                error text
+            )
+        """)
+        # Bitácoras creadas antes de las columnas de descartadas
+        existentes = {row[1] for row in self._conn.execute("pragma table_info(spool)")}
+        for col in ('dead_at', 'error'):
+            if col not in existentes:
+                self._conn.execute(f"alter table spool add column {col} text")
+        self._conn.execute("create index if not exists spool_pending_idx on spool (flushed_at, id)")
+        self._conn.commit()
+
+    def append(self, payload: dict) -> int:
+        """
+        Guarda una captura en disco y despierta al hilo de envío.
+        'created_at' se fija aquí para conservar la hora real de captura y
+        'capture_id' identifica la captura en la base de datos (reenvíos idempotentes).
+        Returns:
+            int: id local de la captura.
+        """
+        payload = dict(payload)
+        payload.setdefault('created_at', datetime.utcnow().isoformat())
+        payload.setdefault(IDEMPOTENCY_KEY, str(uuid.uuid4()))
+        with self._lock:
+            cur = self._conn.execute(
+                "insert into spool (payload, captured_at) values (?, ?)",
+                (json.dumps(payload), payload['created_at'])
+            )
+            self._conn.commit()
+        self._wake.set()
+        return cur.lastrowid
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending, flushed, dead = self._conn.execute(
+                "select count(*) filter (where flushed_at is null and dead_at is null), "
+                "count(flushed_at), count(dead_at) from spool"
+            ).fetchone()
+        return {"pendientes": pending, "enviados": flushed, "descartados": dead,
+                "ultimo_error": self.last_error}
+
+    def dead_letters(self) -> list:
+        """
+        Capturas descartadas: dicts con id, captured_at, attempts, error y el payload.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "select id, captured_at, attempts, error, payload from spool "
+                "where dead_at is not null order by id"
+            ).fetchall()
+        return [{"id": row_id, "captured_at": captured_at, "attempts": attempts, "error": error,
+                 "payload": json.loads(payload)}
+                for row_id, captured_at, attempts, error, payload in rows]
+
+    def requeue(self, ids: list = None) -> int:
+        """
+        Devuelve capturas descartadas (todas si 'ids' es None) a la cola de envío.
+        Returns:
+            int: Capturas reencoladas.
+        """
+        sql = "update spool set dead_at = null, attempts = 0 where dead_at is not null"
+        params = []
+        if ids is not None:
+            sql += f" and id in ({', '.join('?' * len(ids))})"
+            params = list(ids)
+        with self._lock:
+            count = self._conn.execute(sql, params).rowcount
+            self._conn.commit()
+        self._wake.set()
+        return count
+
+    def flush_once(self, db) -> int:
+        """
+        Envía el lote pendiente más antiguo. Si ese lote ya fue rechazado, se envía
+        solo su primera fila para aislar la captura inválida del resto.
+        Returns:
+            int: Registros enviados. Lanza la excepción del upsert si falla.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "select id, payload, attempts from spool where flushed_at is null and dead_at is null "
+                "order by id limit ?",
+                (self.batch_size,)
+            ).fetchall()
+        if not rows:
+            return 0
+        if rows[0][2]:
+            rows = rows[:1]
+
+        ids = [(row_id,) for row_id, _, _ in rows]
+        payloads = [self._with_key(row_id, json.loads(p)) for row_id, p, _ in rows]
+        try:
+            db.insert_records(payloads, chunk_size=self.batch_size, retries=1, raise_errors=True,
+                              on_conflict=IDEMPOTENCY_KEY)
+        except Exception as e:
+            if _rechazado(e):
+                self._reject(ids, str(e))
+            raise
+
+        now = datetime.utcnow()
+        with self._lock:
+            self._conn.executemany(
+                "update spool set flushed_at = ? where id = ?", [(now.isoformat(), row_id) for (row_id,) in ids]
+            )
+            # Las enviadas solo se conservan 'retention_days' días (la bitácora no crece sin límite)
+            self._conn.execute("delete from spool where flushed_at < ?",
+                               ((now - timedelta(days=self.retention_days)).isoformat(),))
+            self._conn.commit()
+        return len(rows)
+
+    def _with_key(self, row_id: int, payload: dict) -> dict:
+        # Capturas guardadas antes de la llave de idempotencia: se les asigna una una sola vez
+        if IDEMPOTENCY_KEY not in payload:
+            payload[IDEMPOTENCY_KEY] = str(uuid.uuid4())
+            with self._lock:
+                self._conn.execute("update spool set payload = ? where id = ?", (json.dumps(payload), row_id))
+                self._conn.commit()
+        return payload
+
+    def _reject(self, ids: list, error: str):
+        with self._lock:
+            self._conn.executemany("update spool set attempts = attempts + 1, error = ? where id = ?",
+                                   [(error, row_id) for (row_id,) in ids])
+            # Una sola fila que agota sus intentos se descarta; un lote se sigue aislando
+            if len(ids) == 1:
+                self._conn.execute("update spool set dead_at = ? where id = ? and attempts >= ?",
+                                   (datetime.utcnow().isoformat(), ids[0][0], self.max_attempts))
+            self._conn.commit()
+
+    def start(self, db):
+        """
+        Inicia (una sola vez) el hilo que vacía la bitácora hacia 'db'.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, args=(db,), name="oee-spool-flusher", daemon=True)
+        self._thread.start()
+
+    def _run(self, db):
+        backoff = 0.0
+        while True:
+            try:
+                sent = self.flush_once(db)
+                self.last_error = None
+                backoff = 0.0
+                if sent:
+                    continue
+                timeout = self.poll_interval
+            except Exception as e:
+                self.last_error = str(e)
+                backoff = min(self.max_backoff, max(1.0, backoff * 2))
+                # Durante la espera exponencial no se reintenta con cada captura nueva
+                time.sleep(backoff)
+                continue
+            self._wake.wait(timeout)
+            self._wake.clear()
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+Backend SQLite embebido para registros_oee (modo local sin red).
+
+Misma tabla que modules/schema.sql (tipos equivalentes en SQLite) con los índices
+que usan las consultas de la app: rango de fechas con filtros de máquina / turno,
+paginación por (fecha, hora, id) y lecturas incrementales por id. Los agregados se
+calculan con SQL en la propia base, igual que la función oee_rollup de Supabase.
+
+Sirve para plantas de una sola línea (latencia cero, sin dependencia de internet) y
+como backend reproducible para pruebas de carga y benchmarks.
+"""
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+
+import pandas as pd
+import streamlit as st
+
+from modules.aggregations import ROLLUP_SUM_COLS, SIN_HORA, rollup_columns
+from modules.metrics import CATALOGO_COLS, MAQUINAS_RATES, SCRAP_COLS, FAILURE_COLS, KPI_COLS
+from modules.record_schema import typed_records
+from modules.storage import StorageBackend
+
+# Columnas de registros_oee (schema.sql) con su tipo en SQLite
+SCHEMA_COLUMNS = [
+    ('created_at', "text not null default (strftime('%Y-%m-%dT%H:%M:%f', 'now'))"),
+    ('fecha', 'text not null'),
+    ('hora', 'integer'),
+    ('turno', 'integer not null'),
+    ('maquina', 'text not null'),
+    ('linea', 'text'),
+    ('tiempo_programado_min', 'integer default 0'),
+    ('rate_teorico', 'real default 0'),
+    ('producido', 'integer default 0'),
+    ('scrap', 'integer default 0'),
+] + [(col, 'integer default 0') for col in SCRAP_COLS + FAILURE_COLS] + [
+    ('tiempo_muerto', 'integer default 0'),
+    ('tiempo_funcionamiento', 'integer default 0'),
+    ('disponibilidad', 'real default 0'),
+    ('rendimiento', 'real default 0'),
+    ('calidad', 'real default 0'),
+    ('oee', 'real default 0'),
+    ('scrap_pct', 'real default 0'),
+    ('ftt', 'real default 0'),
+    ('capture_id', 'text'),
+]
+COLUMN_NAMES = ['id'] + [name for name, _ in SCHEMA_COLUMNS]
+
+SCHEMA_SQL = f"""
+create table if not exists registros_oee (
+    id integer primary key autoincrement,
+    {', '.join(f'{name} {ddl}' for name, ddl in SCHEMA_COLUMNS)}
+);
+create index if not exists registros_oee_fecha_idx on registros_oee (fecha, maquina, turno);
+create index if not exists registros_oee_keyset_idx on registros_oee (fecha, hora, id);
+create table if not exists maquinas (
+    maquina text not null,
+    vigente_desde text not null default '2000-01-01',
+    rate_teorico real not null,
+    linea text,
+    activa integer not null default 1,
+    primary key (maquina, vigente_desde)
+);
+"""
+
+# Expresión SQL de cada dimensión de los rollups
+DIM_SQL = {
+    'fecha': 'fecha',
+    'mes': "substr(fecha, 1, 7)",
+    'maquina': 'maquina',
+    'turno': 'turno',
+    'hora': f"coalesce(hora, {SIN_HORA})",
+}
+
+
+class SQLiteManager(StorageBackend):
+    def __init__(self, path: str = "registros_oee.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA_SQL)
+        # Bases creadas antes de 'capture_id' (llave de idempotencia de modules/spool.py)
+        if 'capture_id' not in {row[1] for row in self._conn.execute("pragma table_info(registros_oee)")}:
+            self._conn.execute("alter table registros_oee add column capture_id text")
+        self._conn.execute("create unique index if not exists registros_oee_capture_idx on registros_oee (capture_id)")
+        # Catálogo inicial de máquinas (mismos rates que siembra schema.sql), solo en una base nueva
+        if not self._conn.execute("select count(*) from maquinas").fetchone()[0]:
+            self._conn.executemany("insert into maquinas (maquina, rate_teorico) values (?, ?)",
+                                   list(MAQUINAS_RATES.items()))
+        self._conn.commit()
+
+    # --- Escritura ---
+    def insert_record(self, data: dict):
+        try:
+            data['created_at'] = datetime.utcnow().isoformat()
+            self._insert_chunk([data])
+            return data
+        except Exception as e:
+            st.error(f"Error al insertar el registro: {e}")
+            return None
+
+    def insert_records(self, records: list, chunk_size: int = 500, retries: int = 3,
+                       backoff: float = 1.0, progress=None, raise_errors: bool = False,
+                       on_conflict: str = None) -> int:
+        """
+        Inserta por lotes de 'chunk_size' filas (una transacción por lote).
+        Mismos argumentos que SupabaseManager.insert_records.
+        """
+        inserted = 0
+        created_at = datetime.utcnow().isoformat()
+        chunk = []
+        try:
+            for record in records:
+                record.setdefault('created_at', created_at)
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    self._insert_with_retries(chunk, retries, backoff, on_conflict)
+                    inserted += len(chunk)
+                    chunk = []
+                    if progress:
+                        progress(inserted)
+            if chunk:
+                self._insert_with_retries(chunk, retries, backoff, on_conflict)
+                inserted += len(chunk)
+                if progress:
+                    progress(inserted)
+        except Exception as e:
+            if raise_errors:
+                raise
+            st.error(f"Error al insertar registros después de {inserted} filas: {e}")
+        return inserted
+
+    def _insert_with_retries(self, chunk: list, retries: int, backoff: float, on_conflict: str = None):
+        # Reintentos solo por bloqueos de escritura concurrentes (database is locked)
+        for attempt in range(retries):
+            try:
+                return self._insert_chunk(chunk, on_conflict)
+            except sqlite3.OperationalError:
+                if attempt == retries - 1:
+                    raise
+                time.sleep(backoff * (2 ** attempt))
+
+    def _insert_chunk(self, chunk: list, on_conflict: str = None):
+        # Un INSERT por conjunto de columnas: las columnas ausentes conservan su default
+        groups = {}
+        for record in chunk:
+            cols = tuple(c for c in COLUMN_NAMES if c in record)
+            groups.setdefault(cols, []).append(record)
+        with self._lock, self._conn:
+            for cols, rows in groups.items():
+                sql = f"insert into registros_oee ({', '.join(cols)}) values ({', '.join('?' * len(cols))})"
+                if on_conflict:
+                    sql += f" on conflict ({on_conflict}) do nothing"
+                self._conn.executemany(sql, [tuple(_to_sql(r[c]) for c in cols) for r in rows])
+
+    # --- Lectura ---
+    def _query(self, sql: str, params: list) -> pd.DataFrame:
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def _records(self, sql: str, params: list) -> pd.DataFrame:
+        # Registros con el esquema compacto de modules/record_schema.py
+        return typed_records(self._query(sql, params))
+
+    def _where(self, start_date: date, end_date: date, linea: str, maquinas: list, turnos: list):
+        clauses, params = ["fecha between ? and ?"], [start_date.isoformat(), end_date.isoformat()]
+        if linea:
+            clauses.append("linea = ?")
+            params.append(linea)
+        if maquinas is not None:
+            clauses.append(f"maquina in ({', '.join('?' * len(maquinas))})")
+            params.extend(maquinas)
+        if turnos is not None:
+            clauses.append(f"turno in ({', '.join('?' * len(turnos))})")
+            params.extend(int(t) for t in turnos)
+        return clauses, params
+
+    @staticmethod
+    def _projection(columns: list) -> str:
+        if not columns:
+            return "*"
+        return ", ".join(c for c in dict.fromkeys(columns) if c in COLUMN_NAMES)
+
+    def fetch_records(self, start_date: date, end_date: date, linea: str = None,
+                      columns: list = None, maquinas: list = None, turnos: list = None) -> pd.DataFrame:
+        if (maquinas is not None and len(maquinas) == 0) or (turnos is not None and len(turnos) == 0):
+            return pd.DataFrame(columns=columns or [])
+        clauses, params = self._where(start_date, end_date, linea, maquinas, turnos)
+        try:
+            return self._records(f"select {self._projection(columns)} from registros_oee "
+                                 f"where {' and '.join(clauses)} order by id", params)
+        except Exception as e:
+            st.error(f"Error al consultar registros: {e}")
+            return pd.DataFrame()
+
+    def fetch_page(self, start_date: date, end_date: date, linea: str = None, columns: list = None,
+                   maquinas: list = None, turnos: list = None, after: tuple = None,
+                   page_size: int = 100, raise_errors: bool = False, use_cache: bool = True) -> pd.DataFrame:
+        if (maquinas is not None and len(maquinas) == 0) or (turnos is not None and len(turnos) == 0):
+            return pd.DataFrame(columns=columns or [])
+        columns = list(dict.fromkeys(columns + ['fecha', 'hora', 'id'])) if columns else None
+        clauses, params = self._where(start_date, end_date, linea, maquinas, turnos)
+        if after is not None:
+            fecha, hora, row_id = after
+            # Mismo orden que Supabase: 'hora' nula al final de cada día
+            if hora is None:
+                clauses.append("(fecha > ? or (fecha = ? and hora is null and id > ?))")
+                params.extend([fecha, fecha, row_id])
+            else:
+                clauses.append("(fecha > ? or (fecha = ? and (hora is null or hora > ? "
+                               "or (hora = ? and id > ?))))")
+                params.extend([fecha, fecha, hora, hora, row_id])
+        params.append(page_size)
+        try:
+            return self._records(f"select {self._projection(columns)} from registros_oee "
+                                 f"where {' and '.join(clauses)} "
+                                 f"order by fecha, hora is null, hora, id limit ?", params)
+        except Exception as e:
+            if raise_errors:
+                raise
+            st.error(f"Error al consultar la página: {e}")
+            return pd.DataFrame()
+
+    def fetch_records_since(self, after_id: int, columns: list = None, linea: str = None,
+                            raise_errors: bool = False, use_mirror: bool = True) -> pd.DataFrame:
+        clauses, params = ["id > ?"], [int(after_id)]
+        if linea:
+            clauses.append("linea = ?")
+            params.append(linea)
+        try:
+            return self._records(f"select {self._projection(columns)} from registros_oee "
+                                 f"where {' and '.join(clauses)} order by id", params)
+        except Exception as e:
+            if raise_errors:
+                raise
+            st.error(f"Error al consultar registros nuevos: {e}")
+            return pd.DataFrame()
+
+    def latest_id(self, linea: str = None) -> int:
+        sql, params = "select max(id) from registros_oee", []
+        if linea:
+            sql += " where linea = ?"
+            params.append(linea)
+        with self._lock:
+            value = self._conn.execute(sql, params).fetchone()[0]
+        return int(value or 0)
+
+    def fetch_machines(self, linea: str = None, refresh: bool = False) -> pd.DataFrame:
+        # Consulta local (sin red): no necesita caché, 'refresh' no tiene efecto
+        sql, params = f"select {', '.join(CATALOGO_COLS)} from maquinas", []
+        if linea:
+            sql += " where linea is null or linea = ?"
+            params.append(linea)
+        try:
+            df = self._query(sql + " order by maquina, vigente_desde", params)
+        except Exception as e:
+            st.error(f"Error al consultar el catálogo de máquinas: {e}")
+            return pd.DataFrame(columns=CATALOGO_COLS)
+        return df.assign(activa=df['activa'].astype(bool))
+
+    def aggregate(self, start_date: date, end_date: date, grain: tuple = ('fecha',),
+                  maquinas: list = None, turnos: list = None, linea: str = None,
+                  use_cache: bool = True) -> pd.DataFrame:
+        """
+        Rollup calculado por SQLite (equivalente a oee_rollup en schema.sql).
+        """
+        grain = tuple(grain)
+        empty = pd.DataFrame(columns=rollup_columns(grain) + ['max_id'])
+        if (maquinas is not None and len(maquinas) == 0) or (turnos is not None and len(turnos) == 0):
+            return empty
+
+        dims = [f"{DIM_SQL[d]} as {d}" for d in grain]
+        aggs = ["count(*) as registros"] + \
+            [f"avg({col}) as {col}" for col in KPI_COLS] + \
+            [f"count({col}) as {col}_n" for col in KPI_COLS] + \
+            [f"coalesce(sum({col}), 0) as {col}" for col in ROLLUP_SUM_COLS] + \
+            ["max(id) as max_id"]
+        clauses, params = self._where(start_date, end_date, linea, maquinas, turnos)
+        sql = f"select {', '.join(dims + aggs)} from registros_oee where {' and '.join(clauses)}"
+        if grain:
+            positions = ', '.join(str(i + 1) for i in range(len(grain)))
+            sql += f" group by {positions} order by {positions}"
+        try:
+            df = self._query(sql, params)
+        except Exception as e:
+            st.error(f"Error al calcular agregados: {e}")
+            return empty
+        # Sin grano, SQLite devuelve una fila de nulos cuando no hay registros
+        if df.empty or not df['registros'].iloc[0]:
+            return empty
+        return df[rollup_columns(grain) + ['max_id']]
+
+
+def _to_sql(value):
+    # Tipos de pandas / numpy / fechas a tipos nativos de sqlite3
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Interfaz de almacenamiento de registros_oee.
+
+La app, los agregados incrementales, la bitácora de capturas, el importador de Excel
+y los reportes masivos solo usan los métodos de StorageBackend, así que cualquier
+implementación sirve como 'db':
+  - SupabaseManager (modules/supabase_client.py): Supabase / PostgREST.
+  - SQLiteManager (modules/sqlite_backend.py): archivo SQLite local, sin red.
+
+El backend se elige en secrets.toml con la sección [storage] (ver init_storage).
+"""
+from abc import ABC, abstractmethod
+from datetime import date
+
+import pandas as pd
+
+
+class StorageBackend(ABC):
+    """
+    Operaciones sobre registros_oee que necesita la app.
+    """
+    # Réplica local opcional (LocalMirror); solo la usa SupabaseManager
+    mirror = None
+
+    @abstractmethod
+    def insert_record(self, data: dict):
+        """Inserta un registro; devuelve None si falla (el error se reporta con st.error)."""
+
+    @abstractmethod
+    def insert_records(self, records: list, chunk_size: int = 500, retries: int = 3,
+                       backoff: float = 1.0, progress=None, raise_errors: bool = False,
+                       on_conflict: str = None) -> int:
+        """
+        Inserta registros por lotes; devuelve cuántos se insertaron. Con 'on_conflict'
+        (columna con índice único) las filas cuya llave ya existe se omiten.
+        """
+
+    @abstractmethod
+    def fetch_records(self, start_date: date, end_date: date, linea: str = None,
+                      columns: list = None, maquinas: list = None, turnos: list = None) -> pd.DataFrame:
+        """Registros del rango de fechas (ordenados por id), con filtros y proyección."""
+
+    @abstractmethod
+    def fetch_page(self, start_date: date, end_date: date, linea: str = None, columns: list = None,
+                   maquinas: list = None, turnos: list = None, after: tuple = None,
+                   page_size: int = 100, raise_errors: bool = False, use_cache: bool = True) -> pd.DataFrame:
+        """Una página ordenada por (fecha, hora, id) después del cursor 'after' (use_cache=False: sin caché)."""
+
+    @abstractmethod
+    def fetch_records_since(self, after_id: int, columns: list = None, linea: str = None,
+                            raise_errors: bool = False, use_mirror: bool = True) -> pd.DataFrame:
+        """Registros con id mayor a 'after_id'."""
+
+    @abstractmethod
+    def latest_id(self, linea: str = None) -> int:
+        """Id más alto de la tabla (0 si está vacía)."""
+
+    @abstractmethod
+    def aggregate(self, start_date: date, end_date: date, grain: tuple = ('fecha',),
+                  maquinas: list = None, turnos: list = None, linea: str = None,
+                  use_cache: bool = True) -> pd.DataFrame:
+        """Rollup con el formato de oee_rollup (ver modules/aggregations.py) más 'max_id' (use_cache=False: sin caché)."""
+
+    @abstractmethod
+    def fetch_machines(self, linea: str = None, refresh: bool = False) -> pd.DataFrame:
+        """Catálogo 'maquinas' (CATALOGO_COLS de modules/metrics.py) de la línea; vacío si no existe; refresh omite la caché."""
+
+
+def init_storage(secrets) -> StorageBackend:
+    """
+    Crea el backend configurado en 'secrets' (st.secrets o un dict equivalente):
+
+        [storage]
+        backend = "sqlite"          # "supabase" (por defecto) o "sqlite"
+        path = "registros_oee.db"   # solo sqlite
+
+    Con backend "supabase" se usan las secciones [supabase] y [mirror] como hasta ahora.
+    Lanza KeyError si falta la configuración del backend elegido.
+    """
+    storage = secrets.get("storage", {})
+    backend = storage.get("backend", "supabase")
+
+    if backend == "sqlite":
+        from modules.sqlite_backend import SQLiteManager
+        return SQLiteManager(path=storage.get("path", "registros_oee.db"))
+
+    if backend != "supabase":
+        raise ValueError(f"Backend de almacenamiento desconocido: {backend!r}")
+
+    from modules.supabase_client import SupabaseManager
+    supabase = secrets["supabase"]
+    mirror = None
+    if "mirror" in secrets:
+        from modules.local_mirror import LocalMirror
+        mirror = LocalMirror(path=secrets["mirror"].get("path", "replica_registros_oee"),
+                             sync_interval=secrets["mirror"].get("sync_interval", 60.0),
+                             overlap=secrets["mirror"].get("overlap", 1000))
+    return SupabaseManager(supabase["url"], supabase["key"],
+                           cache_ttl=supabase.get("cache_ttl", 60.0),
+                           cache_size=supabase.get("cache_size", 32),
+                           page_size=supabase.get("page_size", 1000),
+                           max_workers=supabase.get("max_workers", 4),
+                           wire_format=supabase.get("wire_format", "json"),
+                           catalog_ttl=supabase.get("catalog_ttl", 300.0),
+                           catalog_check=supabase.get("catalog_check", 30.0),
+                           timeout=supabase.get("timeout"),
+                           mirror=mirror)
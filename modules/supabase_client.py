@@ -1,13 +1,141 @@
 import streamlit as st
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
+from postgrest.exceptions import APIError
 import pandas as pd
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
+from modules.metrics import CATALOGO_COLS, KPI_COLS
+from modules.aggregations import ROLLUP_DIMS, ROLLUP_SUM_COLS, rollup, rollup_columns
+from modules.record_schema import read_csv_records, typed_records
+from modules.storage import StorageBackend, init_storage
 
-class SupabaseManager:
-    def __init__(self, url: str, key: str):
+# Sort key of the paginated detail view
+KEYSET_COLS = ('fecha', 'hora', 'id')
+# PostgREST error code when no function matches the name and arguments of an RPC
+FUNCTION_NOT_FOUND = 'PGRST202'
+
+
+def _keyset_filter(after: tuple) -> str:
+    """
+    PostgREST 'or' filter for rows that sort after (fecha, hora, id),
+    with null 'hora' values sorting last within a day.
+    """
+    fecha, hora, row_id = after
+    if hora is None:
+        return f"fecha.gt.{fecha},and(fecha.eq.{fecha},hora.is.null,id.gt.{row_id})"
+    return (f"fecha.gt.{fecha},and(fecha.eq.{fecha},hora.gt.{hora}),"
+            f"and(fecha.eq.{fecha},hora.eq.{hora},id.gt.{row_id}),and(fecha.eq.{fecha},hora.is.null)")
+
+
+def _date_key(record: dict) -> tuple:
+    """
+    (fecha, linea) of a record, with 'fecha' as an ISO date string like the cache keys.
+    """
+    return (str(record.get('fecha'))[:10], record.get('linea'))
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache with TTL for fetched DataFrames.
+    Shared by every Streamlit session that uses the same SupabaseManager.
+    """
+    def __init__(self, ttl: float = 60.0, max_entries: int = 32):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns a copy of the cached DataFrame for 'key', or None if missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, df = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return df.copy()
+
+    def set(self, key, df: pd.DataFrame):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), df.copy())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate=None):
+        """
+        Drops every cached entry, or only those whose key satisfies 'predicate(key)'.
+        """
+        with self._lock:
+            if predicate is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+class SupabaseManager(StorageBackend):
+    def __init__(self, url: str, key: str, cache_ttl: float = 60.0, cache_size: int = 32,
+                 page_size: int = 1000, max_workers: int = 4, mirror=None, client: Client = None,
+                 wire_format: str = "json", catalog_ttl: float = 300.0, catalog_check: float = 30.0,
+                 timeout: float = None):
         self.url = url
         self.key = key
-        self.client: Client = create_client(self.url, self.key)
+        # 'client' allows injecting a stand-in with the same query API (offline benchmarks).
+        # 'timeout' bounds each PostgREST request, so a hung project releases its thread
+        options = ClientOptions(postgrest_client_timeout=timeout) if timeout else None
+        self.client: Client = client or create_client(self.url, self.key, options=options)
+        self.cache = QueryCache(ttl=cache_ttl, max_entries=cache_size)
+        # page_size must not exceed the PostgREST max-rows setting of the project
+        self.page_size = page_size
+        self.max_workers = max_workers
+        # "csv" asks PostgREST for text/csv pages: one string per page is parsed by
+        # pd.read_csv instead of building a Python dict per row ("json")
+        if wire_format not in ("json", "csv"):
+            raise ValueError(f"Unknown wire_format: {wire_format!r}")
+        self.wire_format = wire_format
+        # Machine catalog: long-lived cache, not dropped by inserts (see fetch_machines)
+        self.catalog_ttl = catalog_ttl
+        self.catalog_check = catalog_check
+        self._catalog = None
+        self._catalog_at = 0.0
+        self._catalog_checked = 0.0
+        self._catalog_version = None
+        self._catalog_lock = threading.Lock()
+        # Optional LocalMirror: reads are served from the local Parquet replica
+        self.mirror = mirror
+
+    def _sync_mirror(self):
+        if self.mirror.sync(self):
+            self.cache.invalidate()
+
+    def _invalidate_dates(self, touched: set):
+        """
+        Drops only the cached queries that can contain rows dated in 'touched', a set of
+        (fecha, linea) pairs. Every cache key starts with (kind, start, end, linea).
+        """
+        def affected(key):
+            _, start, end, linea = key[:4]
+            return any(start <= fecha <= end and (linea is None or linea == record_linea)
+                       for fecha, record_linea in touched)
+        self.cache.invalidate(affected)
 
     def insert_record(self, data: dict):
         """
@@ -20,35 +148,414 @@ class SupabaseManager:
         try:
             data['created_at'] = datetime.utcnow().isoformat()
             response = self.client.table('registros_oee').insert(data).execute()
+            self._invalidate_dates({_date_key(data)})
             return response
         except Exception as e:
             st.error(f"Error inserting record: {e}")
             return None
 
-    def fetch_records(self, start_date: date, end_date: date, linea: str = None):
+    def insert_records(self, records: list, chunk_size: int = 500, retries: int = 3,
+                       backoff: float = 1.0, progress=None, raise_errors: bool = False,
+                       on_conflict: str = None) -> int:
+        """
+        Bulk-inserts OEE records in chunked requests.
+        Args:
+            records (iterable): Dicts reflecting the 'registros_oee' schema.
+            chunk_size (int): Rows per insert request.
+            retries (int): Attempts per chunk before giving up; waits grow exponentially from 'backoff' seconds.
+            progress (callable): Optional callback progress(inserted_so_far) invoked after each chunk.
+            raise_errors (bool): Re-raise the last error instead of reporting it with st.error
+                (for callers running outside a Streamlit script, e.g. background threads).
+            on_conflict (str): Upsert on this uniquely indexed column (e.g. 'capture_id'), skipping
+                rows whose key already exists, so a resent chunk does not duplicate records.
+        Returns:
+            int: Number of rows inserted. Stops at the first chunk that exhausts its retries.
+        """
+        inserted = 0
+        created_at = datetime.utcnow().isoformat()
+        chunk = []
+        # (fecha, linea) of the inserted rows: only cached queries covering them are dropped
+        touched = set()
+        try:
+            for record in records:
+                record.setdefault('created_at', created_at)
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    self._insert_chunk(chunk, retries, backoff, on_conflict)
+                    inserted += len(chunk)
+                    touched.update(_date_key(r) for r in chunk)
+                    chunk = []
+                    if progress:
+                        progress(inserted)
+            if chunk:
+                self._insert_chunk(chunk, retries, backoff, on_conflict)
+                inserted += len(chunk)
+                touched.update(_date_key(r) for r in chunk)
+                if progress:
+                    progress(inserted)
+        except Exception as e:
+            if raise_errors:
+                raise
+            st.error(f"Error inserting records after {inserted} rows: {e}")
+        finally:
+            if touched:
+                self._invalidate_dates(touched)
+        return inserted
+
+    def _insert_chunk(self, chunk: list, retries: int, backoff: float, on_conflict: str = None):
+        for attempt in range(retries):
+            try:
+                table = self.client.table('registros_oee')
+                if on_conflict:
+                    return table.upsert(chunk, on_conflict=on_conflict, ignore_duplicates=True).execute()
+                return table.insert(chunk).execute()
+            except Exception:
+                if attempt == retries - 1:
+                    raise
+                time.sleep(backoff * (2 ** attempt))
+
+    def fetch_records(self, start_date: date, end_date: date, linea: str = None,
+                      columns: list = None, maquinas: list = None, turnos: list = None,
+                      use_cache: bool = True):
         """
         Fetches OEE records within a date range and optionally filters by line.
+        Args:
+            columns (list): Columns to select. Defaults to every column.
+            maquinas (list): Only return these machines (pushed down as an IN filter).
+            turnos (list): Only return these shifts (pushed down as an IN filter).
+        Results are served from the query cache while they are fresh (use_cache=False
+        reads and stores nothing in it).
         """
+        projection = ",".join(columns) if columns else "*"
+
+        # An empty selection can never match; skip the round trip
+        if (maquinas is not None and len(maquinas) == 0) or (turnos is not None and len(turnos) == 0):
+            return pd.DataFrame(columns=columns or [])
+
+        filters = (
+            tuple(sorted(maquinas)) if maquinas is not None else None,
+            tuple(sorted(turnos)) if turnos is not None else None,
+        )
+        cache_key = ('records', start_date.isoformat(), end_date.isoformat(), linea, projection, filters)
+        cached = self.cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            return cached
+
         try:
-            query = self.client.table('registros_oee').select("*")\
-                .gte('fecha', start_date.isoformat())\
-                .lte('fecha', end_date.isoformat())
-            
+            if self.mirror:
+                self._sync_mirror()
+                df = self.mirror.read(start_date, end_date, linea, columns, maquinas, turnos)
+            else:
+                df = self._fetch_paginated(
+                    lambda count=None: self._range_query(start_date, end_date, linea, projection,
+                                                         maquinas, turnos, count=count))
+                if df.empty and columns:
+                    df = pd.DataFrame(columns=columns)
+            if use_cache:
+                self.cache.set(cache_key, df)
+            return df
+        except Exception as e:
+            st.error(f"Error fetching records: {e}")
+            return pd.DataFrame()
+
+    def fetch_page(self, start_date: date, end_date: date, linea: str = None, columns: list = None,
+                   maquinas: list = None, turnos: list = None, after: tuple = None,
+                   page_size: int = 100, raise_errors: bool = False, use_cache: bool = True) -> pd.DataFrame:
+        """
+        Fetches one page of records ordered by (fecha, hora, id) using keyset pagination.
+        Args:
+            after (tuple): (fecha, hora, id) of the last row of the previous page;
+                None for the first page. 'hora' may be None (nulls sort last).
+            page_size (int): Maximum number of rows to return.
+            raise_errors (bool): Raise on failure instead of reporting it and returning
+                an empty page (which a caller streaming pages would take as the end).
+            use_cache (bool): False for pages read once (report streaming), so that
+                they neither evict nor crowd out the dashboard's cached queries.
+        The cost of a page does not depend on how deep into the period it is.
+        """
+        if (maquinas is not None and len(maquinas) == 0) or (turnos is not None and len(turnos) == 0):
+            return pd.DataFrame(columns=columns or [])
+
+        columns = list(dict.fromkeys((columns or []) + list(KEYSET_COLS))) if columns else None
+        projection = ",".join(columns) if columns else "*"
+        cache_key = ('page', start_date.isoformat(), end_date.isoformat(), linea, projection,
+                     tuple(sorted(maquinas)) if maquinas is not None else None,
+                     tuple(sorted(turnos)) if turnos is not None else None, after, page_size)
+        cached = self.cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            return cached
+
+        try:
+            if self.mirror:
+                self._sync_mirror()
+                df = self.mirror.read_page(start_date, end_date, linea, columns, maquinas, turnos,
+                                           after=after, limit=page_size)
+            else:
+                query = self.client.table('registros_oee').select(projection)\
+                    .gte('fecha', start_date.isoformat())\
+                    .lte('fecha', end_date.isoformat())
+                if linea:
+                    query = query.eq('linea', linea)
+                if maquinas is not None:
+                    query = query.in_('maquina', list(maquinas))
+                if turnos is not None:
+                    query = query.in_('turno', list(turnos))
+                if after is not None:
+                    query = query.or_(_keyset_filter(after))
+                df, _ = self._execute_frame(query.order('fecha').order('hora', nullsfirst=False)
+                                            .order('id').limit(page_size))
+                df = typed_records(df)
+            if df.empty and columns:
+                df = pd.DataFrame(columns=columns)
+            if use_cache:
+                self.cache.set(cache_key, df)
+            return df
+        except Exception as e:
+            if raise_errors:
+                raise
+            st.error(f"Error fetching page: {e}")
+            return pd.DataFrame()
+
+    def fetch_records_since(self, after_id: int, columns: list = None, linea: str = None,
+                            raise_errors: bool = False, use_mirror: bool = True) -> pd.DataFrame:
+        """
+        Fetches every record with id greater than 'after_id' (never cached).
+        Used to fold newly appended rows into incrementally maintained aggregates
+        and to sync the local mirror (use_mirror=False forces a database read).
+        """
+        projection = ",".join(columns) if columns else "*"
+        if self.mirror and use_mirror:
+            self._sync_mirror()
+            return self.mirror.read_since(after_id, columns, linea)
+
+        def make_query(count=None):
+            query = self.client.table('registros_oee').select(projection, count=count).gt('id', after_id)
             if linea:
                 query = query.eq('linea', linea)
-            
-            response = query.execute()
-            return pd.DataFrame(response.data)
+            return query.order('id')
+
+        try:
+            df = self._fetch_paginated(make_query)
+            if df.empty and columns:
+                df = pd.DataFrame(columns=columns)
+            return df
         except Exception as e:
-            st.error(f"Error fetching records: {e}")
+            if raise_errors:
+                raise
+            st.error(f"Error fetching new records: {e}")
             return pd.DataFrame()
 
+    def latest_id(self, linea: str = None) -> int:
+        """
+        Returns the highest record id (0 for an empty table).
+        """
+        if self.mirror:
+            self._sync_mirror()
+            return self.mirror.max_id
+        query = self.client.table('registros_oee').select('id')
+        if linea:
+            query = query.eq('linea', linea)
+        response = query.order('id', desc=True).limit(1).execute()
+        return int(response.data[0]['id']) if response.data else 0
+
+    def fetch_machines(self, linea: str = None, refresh: bool = False) -> pd.DataFrame:
+        """
+        Returns the 'maquinas' catalog rows (every effective-dated rate) of 'linea'
+        plus the machines shared by all lines.
+        The whole table is read with one small query and kept for 'catalog_ttl'
+        seconds (refresh=True reloads it now), so rate changes made in the table
+        reach every session without a redeploy. Every 'catalog_check' seconds a
+        one-row probe (row count and latest vigente_desde) reloads it early when a
+        rate row was added or removed; in-place edits wait for the TTL. If the table
+        is not deployed or the query fails, the last loaded catalog is kept (empty
+        on first load; callers then fall back to MAQUINAS_RATES).
+        """
+        with self._catalog_lock:
+            now = time.monotonic()
+            stale = refresh or self._catalog is None or now - self._catalog_at >= self.catalog_ttl
+            if not stale and now - self._catalog_checked >= self.catalog_check:
+                self._catalog_checked = now
+                try:
+                    stale = self._probe_catalog() != self._catalog_version
+                except Exception:
+                    pass
+            if stale:
+                try:
+                    response = self.client.table('maquinas').select(",".join(CATALOGO_COLS))\
+                        .order('maquina').order('vigente_desde').execute()
+                    self._catalog = pd.DataFrame(response.data, columns=CATALOGO_COLS)
+                    self._catalog_version = (len(self._catalog), self._catalog['vigente_desde'].max()
+                                             if len(self._catalog) else None)
+                except Exception:
+                    if self._catalog is None:
+                        self._catalog = pd.DataFrame(columns=CATALOGO_COLS)
+                self._catalog_at = self._catalog_checked = time.monotonic()
+            catalog = self._catalog
+        if linea:
+            catalog = catalog[catalog['linea'].isna() | (catalog['linea'] == linea)]
+        return catalog
+
+    def _probe_catalog(self) -> tuple:
+        """
+        (row count, latest vigente_desde) of the 'maquinas' table, read with a single-row query.
+        """
+        response = self.client.table('maquinas').select('vigente_desde', count='exact')\
+            .order('vigente_desde', desc=True).limit(1).execute()
+        return (response.count, response.data[0]['vigente_desde'] if response.data else None)
+
+    def _range_query(self, start_date: date, end_date: date, linea: str, projection: str,
+                     maquinas: list = None, turnos: list = None, count: str = None):
+        query = self.client.table('registros_oee').select(projection, count=count)\
+            .gte('fecha', start_date.isoformat())\
+            .lte('fecha', end_date.isoformat())
+
+        if linea:
+            query = query.eq('linea', linea)
+        if maquinas is not None:
+            query = query.in_('maquina', list(maquinas))
+        if turnos is not None:
+            query = query.in_('turno', list(turnos))
+
+        # Stable ordering so that .range() pages neither overlap nor skip rows
+        return query.order('id')
+
+    def _execute_frame(self, query) -> tuple:
+        """
+        Executes 'query' in the configured wire format.
+        Returns:
+            (DataFrame of the untyped rows, exact count or None)
+        """
+        if self.wire_format == "csv":
+            response = query.csv().execute()
+            return read_csv_records(response.data), response.count
+        response = query.execute()
+        return pd.DataFrame(response.data), response.count
+
+    def _fetch_pages(self, make_query, execute=None) -> list:
+        """
+        Fetches the rows of 'make_query(count=...)' in pages of 'page_size' rows.
+        The first page also returns the exact row count; the remaining pages are
+        requested concurrently on a bounded thread pool. PostgREST caps every response
+        (tables and RPC results alike) at the project's max-rows setting, so a single
+        request would silently return a partial result.
+        Returns:
+            list of non-empty DataFrames, in order.
+        """
+        execute = execute or self._execute_frame
+        first, total = execute(make_query(count="exact").range(0, self.page_size - 1))
+        pages = [first]
+        total = total if total is not None else len(first)
+
+        offsets = list(range(self.page_size, total, self.page_size))
+        if offsets:
+            def fetch_page(offset):
+                return execute(make_query().range(offset, offset + self.page_size - 1))[0]
+
+            workers = max(1, min(self.max_workers, len(offsets)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # map() preserves the order of the offsets
+                pages.extend(pool.map(fetch_page, offsets))
+        return [page for page in pages if not page.empty]
+
+    def _fetch_paginated(self, make_query) -> pd.DataFrame:
+        """
+        Rows of 'make_query' (see _fetch_pages), converted once to the compact schema
+        of modules/record_schema.py.
+        """
+        pages = self._fetch_pages(make_query)
+        if not pages:
+            return pd.DataFrame()
+        return typed_records(pd.concat(pages, ignore_index=True) if len(pages) > 1 else pages[0])
+
+    def aggregate(self, start_date: date, end_date: date, grain: tuple = ('fecha',),
+                  maquinas: list = None, turnos: list = None, linea: str = None,
+                  use_cache: bool = True) -> pd.DataFrame:
+        """
+        Returns pre-aggregated KPIs from the 'oee_rollup' database function.
+        Args:
+            grain (tuple): Dimensions to group by, any of 'fecha', 'mes', 'maquina', 'turno', 'hora'.
+                An empty tuple returns a single row with the period totals.
+        Returns:
+            DataFrame with one row per group: 'registros', KPI means with their non-null
+            counts ('<kpi>_n'), downtime/scrap sums and 'max_id' (highest record id folded into the group).
+        Fine grains (e.g. CUBE_GRAIN) return about one row per record, so the RPC result
+        is paged like the raw reads (see _fetch_pages).
+        If the function is not deployed (or predates a requested dimension), or a local
+        mirror is configured, the rollup is computed locally from the raw rows. Any other
+        RPC error (auth, timeout, SQL) is raised instead of hidden behind a range scan.
+        use_cache=False always reads the current data (e.g. the base of an incremental
+        rollup, which must match the ids read right after it).
+        """
+        grain = tuple(grain)
+        if (maquinas is not None and len(maquinas) == 0) or (turnos is not None and len(turnos) == 0):
+            return pd.DataFrame(columns=rollup_columns(grain) + ['max_id'])
+
+        cache_key = ('rollup', start_date.isoformat(), end_date.isoformat(), linea, grain,
+                     tuple(sorted(maquinas)) if maquinas is not None else None,
+                     tuple(sorted(turnos)) if turnos is not None else None)
+        cached = self.cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            return cached
+
+        def local_rollup():
+            raw = self.fetch_records(start_date, end_date, linea,
+                                     columns=['id', 'fecha', 'hora', 'maquina', 'turno'] + KPI_COLS + ROLLUP_SUM_COLS,
+                                     maquinas=maquinas, turnos=turnos, use_cache=use_cache)
+            return rollup(raw, grain)
+
+        params = {
+            'p_start': start_date.isoformat(),
+            'p_end': end_date.isoformat(),
+            'p_grain': list(grain),
+            'p_maquinas': list(maquinas) if maquinas is not None else None,
+            'p_turnos': list(turnos) if turnos is not None else None,
+            'p_linea': linea,
+        }
+        def rpc_query(count=None):
+            query = self.client.rpc('oee_rollup', params, count=count)
+            # Same order as the function's 'order by', so that pages neither overlap nor skip groups
+            for dim in (d for d in ROLLUP_DIMS if d in grain):
+                query = query.order(dim)
+            return query
+
+        def execute_rpc(query):
+            response = query.execute()
+            return pd.DataFrame(response.data), response.count
+
+        if self.mirror:
+            # The local replica is cheaper than a round trip; aggregate it locally
+            df = local_rollup()
+        else:
+            try:
+                pages = self._fetch_pages(rpc_query, execute_rpc)
+            except APIError as e:
+                if e.code != FUNCTION_NOT_FOUND:
+                    raise
+                pages = None
+            if pages is None:
+                df = local_rollup()
+            else:
+                df = pd.concat(pages, ignore_index=True) if pages else pd.DataFrame()
+                if df.empty:
+                    df = pd.DataFrame(columns=rollup_columns(grain) + ['max_id'])
+                df = df.drop(columns=[c for c in ROLLUP_DIMS if c in df.columns and c not in grain])
+                # Deployments whose oee_rollup predates a column (e.g. 'hora', 'oee_n') fall back too
+                missing = [c for c in rollup_columns(grain) + ['max_id'] if c not in df.columns]
+                df = local_rollup() if missing else df[rollup_columns(grain) + ['max_id']]
+
+        if use_cache:
+            self.cache.set(cache_key, df)
+        return df
+
+
 # Helper to initialize from st.secrets if available
 def init_supabase():
+    """
+    Returns the storage backend configured in secrets.toml ([storage], defaulting to
+    Supabase with the [supabase] section), or None if it is not configured.
+    """
     try:
-        url = st.secrets["supabase"]["url"]
-        key = st.secrets["supabase"]["key"]
-        return SupabaseManager(url, key)
+        return init_storage(st.secrets)
     except KeyError:
         st.warning("⚠️ Supabase credentials not found in secrets.toml. Please add [supabase] section with 'url' and 'key'.")
         return None
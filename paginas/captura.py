@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Página Captura de Datos: registro hora por hora de una máquina (con contribuidores de
+scrap y hora en lista desplegable) e importación de históricos desde Excel.
+No importa librerías de gráficas ni consulta los agregados del dashboard.
+"""
+import streamlit as st
+from datetime import datetime, date
+from modules.app_context import contexto, init_spool
+from modules.federation import TODAS
+from modules.metrics import calculate_metrics, rates_vigentes
+
+ctx = contexto()
+federacion = ctx['federacion']
+
+# Fragmento: los widgets de la captura solo vuelven a ejecutar esta función, no el
+# dashboard ni los reportes. Las capturas van a la bitácora; al enviarse a la BD solo
+# se invalidan las consultas en caché cuyo rango incluye la fecha capturada.
+@st.fragment
+def captura_de_datos(planta_sel):
+    st.header("📝 Nuevo Registro Rotarys")
+
+    # Cada captura pertenece a una sola planta / línea
+    planta_captura = planta_sel
+    if federacion and planta_sel == TODAS:
+        if len(federacion.fuentes) > 1:
+            planta_captura = st.selectbox("🏭 Planta / Línea de la captura", federacion.nombres)
+        else:
+            planta_captura = federacion.nombres[0]
+    spool = init_spool(federacion, planta_captura)
+    db_captura = federacion.select(planta_captura) if federacion else None
+    linea_captura = federacion.fuentes[planta_captura].linea if federacion else None
+
+    # Rates del catálogo 'maquinas' (caché del backend); sin catálogo, MAQUINAS_RATES
+    catalogo = db_captura.fetch_machines() if db_captura else None
+    rates_hoy = rates_vigentes(catalogo, solo_activas=True)
+    if not rates_hoy:
+        st.warning("⚠️ No hay máquinas activas en el catálogo de esta planta; activa una para capturar.")
+        return
+
+    col_dyn1, col_dyn2 = st.columns(2)
+    with col_dyn1:
+        f_maquina = st.selectbox("🏭 Seleccionar Máquina", list(rates_hoy.keys()))
+    with col_dyn2:
+        f_rate = rates_hoy[f_maquina]
+        st.info(f"⚙️ **Rate Teórico Automático:** `{f_rate:g} u/h`")
+
+    with st.form("oee_form", clear_on_submit=True):
+        st.markdown(f"***Capturando datos para: {f_maquina}***")
+
+        col1, col2, col3, col4 = st.columns(4)
+
+        with col1:
+            f_fecha = st.date_input("Fecha", date.today())
+            # Hora en lista desplegable de 6:00 a 23:00
+            opciones_hora = [f"{i}:00" for i in range(6, 24)]
+            hora_actual = datetime.now().hour
+            if hora_actual < 6 or hora_actual > 23:
+                hora_actual = 6
+            default_index = opciones_hora.index(f"{hora_actual}:00")
+            f_hora_str = st.selectbox("Hora", opciones_hora, index=default_index)
+            f_hora = int(f_hora_str.split(":")[0])
+
+        with col2:
+            f_turno = st.selectbox("Turno", [1, 2, 3])
+            f_tiempo_prog = st.number_input("Tiempo Programado (min)", min_value=0, value=60)
+
+        with col3:
+            f_producido = st.number_input("Total Producido", min_value=0)
+
+        with col4:
+            st.markdown("#### 📊 Scrap Total (calculado)")
+            scrap_total_display = st.empty()
+
+        st.markdown("#### 🧩 Desglose de Scrap (Piezas)")
+        sc1, sc2, sc3 = st.columns(3)
+        with sc1:
+            f_scrap_setup = st.number_input("Ajuste Set Up", min_value=0, value=0, step=1)
+            f_scrap_pruebas = st.number_input("Pruebas Destructivas", min_value=0, value=0, step=1)
+            f_scrap_msf = st.number_input("MSF/PNUT Quemados", min_value=0, value=0, step=1)
+        with sc2:
+            f_scrap_tubo = st.number_input("Tubo Quemado", min_value=0, value=0, step=1)
+            f_scrap_soldadura_quemada = st.number_input("Soldadura Quemada", min_value=0, value=0, step=1)
+            f_scrap_ajuste = st.number_input("Ajuste (scrap)", min_value=0, value=0, step=1)
+        with sc3:
+            f_scrap_soldadura_porosa = st.number_input("Soldadura Porosa", min_value=0, value=0, step=1)
+            f_scrap_falta_soldadura = st.number_input("Falta de Soldadura", min_value=0, value=0, step=1)
+            f_scrap_primera_pieza = st.number_input("Primera Pieza", min_value=0, value=0, step=1)
+
+        st.markdown("#### 🛑 Tiempos Muertos (Minutos)")
+        c1, c2, c3, c4, c5, c6 = st.columns(6)
+        with c1: f_ajuste = st.number_input("Ajuste", min_value=0)
+        with c2: f_mec = st.number_input("Falla Mecánica", min_value=0)
+        with c3: f_elec = st.number_input("Falla Eléctrica", min_value=0)
+        with c4: f_per = st.number_input("Falta Personal", min_value=0)
+        with c5: f_mat = st.number_input("Falta Material", min_value=0)
+        with c6: f_mod = st.number_input("Cambio Modelo", min_value=0)
+
+        submitted = st.form_submit_button("💾 Guardar Registro", type="primary")
+
+        if submitted:
+            # Rate vigente en la fecha capturada (las capturas atrasadas usan el rate de su día)
+            f_rate = rates_vigentes(catalogo, f_fecha).get(f_maquina, f_rate)
+            metrics = calculate_metrics(
+                f_tiempo_prog, f_rate, f_producido,
+                f_scrap_setup, f_scrap_pruebas, f_scrap_msf, f_scrap_tubo,
+                f_scrap_soldadura_quemada, f_scrap_ajuste, f_scrap_soldadura_porosa,
+                f_scrap_falta_soldadura, f_scrap_primera_pieza,
+                f_ajuste, f_mec, f_elec, f_per, f_mat, f_mod
+            )
+
+            payload = {
+                "fecha": f_fecha.isoformat(),
+                "hora": f_hora,
+                "turno": f_turno,
+                "maquina": f_maquina,
+                "tiempo_programado_min": f_tiempo_prog,
+                "rate_teorico": f_rate,
+                "producido": f_producido,
+                "scrap": metrics["scrap_total"],
+                "scrap_setup": f_scrap_setup,
+                "scrap_pruebas": f_scrap_pruebas,
+                "scrap_msf": f_scrap_msf,
+                "scrap_tubo": f_scrap_tubo,
+                "scrap_soldadura_quemada": f_scrap_soldadura_quemada,
+                "scrap_ajuste": f_scrap_ajuste,
+                "scrap_soldadura_porosa": f_scrap_soldadura_porosa,
+                "scrap_falta_soldadura": f_scrap_falta_soldadura,
+                "scrap_primera_pieza": f_scrap_primera_pieza,
+                "ajuste": f_ajuste,
+                "falla_mecanica": f_mec,
+                "falla_electrica": f_elec,
+                "falta_personal": f_per,
+                "falta_material": f_mat,
+                "cambio_modelo": f_mod,
+                "tiempo_muerto": metrics["tiempo_muerto"],
+                "tiempo_funcionamiento": metrics["tiempo_funcionamiento"],
+                "disponibilidad": metrics["disponibilidad"],
+                "rendimiento": metrics["rendimiento"],
+                "calidad": metrics["calidad"],
+                "oee": metrics["oee"],
+                "scrap_pct": metrics["scrap_pct"],
+                "ftt": metrics["ftt"]
+            }
+            if linea_captura:
+                payload["linea"] = linea_captura
+
+            # Se guarda primero en disco local; el envío a Supabase ocurre en segundo plano
+            try:
+                spool.append(payload)
+                st.success(f"✅ Guardado {f_maquina} - FTT: {metrics['ftt']:.2f}% | Scrap: {metrics['scrap_pct']:.2f}%")
+            except Exception as e:
+                st.error(f"❌ Error al guardar la captura localmente: {e}")
+
+    spool_stats = spool.stats()
+    s1, s2, s3 = st.columns(3)
+    s1.metric("⏳ Capturas pendientes de envío", spool_stats["pendientes"])
+    s2.metric(f"☁️ Capturas enviadas a la BD ({spool.retention_days:g} días)", spool_stats["enviados"])
+    s3.metric("🚫 Capturas rechazadas", spool_stats["descartados"])
+    if spool_stats["ultimo_error"]:
+        st.warning(f"Error al enviar a la BD, se reintentará automáticamente: {spool_stats['ultimo_error']}")
+
+    # Capturas que la BD rechazó 'max_attempts' veces: ya no bloquean la cola, se revisan aquí
+    if spool_stats["descartados"]:
+        with st.expander(f"🚫 Capturas rechazadas por la BD ({spool_stats['descartados']})"):
+            descartadas = spool.dead_letters()
+            st.dataframe([{
+                "id": d["id"], "capturada": d["captured_at"], "fecha": d["payload"].get("fecha"),
+                "maquina": d["payload"].get("maquina"), "turno": d["payload"].get("turno"),
+                "intentos": d["attempts"], "error": d["error"],
+            } for d in descartadas], hide_index=True, use_container_width=True)
+            if st.button("🔁 Reintentar capturas rechazadas"):
+                st.success(f"{spool.requeue()} capturas devueltas a la cola de envío")
+
+    # --- IMPORTACIÓN MASIVA DE HISTÓRICOS (libros de Excel heredados) ---
+    with st.expander("📥 Importar históricos desde Excel"):
+        st.caption("Libros de 'celdas naranjas': una hoja por máquina (o columna 'Máquina') con encabezado que incluya 'Fecha'.")
+        archivo_xlsx = st.file_uploader("Libro de Excel (.xlsx)", type=["xlsx"])
+        if archivo_xlsx is not None and db_captura and st.button("📥 Importar libro"):
+            from modules.excel_import import import_workbook
+
+            estado = st.empty()
+
+            def reportar_avance(hoja, filas):
+                estado.text(f"Hoja {hoja}: {filas:,} filas insertadas")
+
+            with st.spinner("Importando..."):
+                # Rate vigente en la fecha de cada fila, no el de hoy
+                resumen = import_workbook(db_captura, archivo_xlsx, catalogo=catalogo, progress=reportar_avance)
+            leidas = sum(r['leidas'] for r in resumen.values())
+            insertadas = sum(r['insertadas'] for r in resumen.values())
+            for hoja, r in resumen.items():
+                if r['fechas_omitidas']:
+                    st.warning(f"⚠️ {hoja}: {len(r['fechas_omitidas'])} fila(s) omitida(s) por fecha no válida "
+                               f"({', '.join(r['fechas_omitidas'][:5])}).")
+                if r['turnos_omitidos']:
+                    st.warning(f"⚠️ {hoja}: {len(r['turnos_omitidos'])} fila(s) omitida(s) por turno no válido "
+                               f"({', '.join(r['turnos_omitidos'][:5])}).")
+            if insertadas == leidas:
+                st.success(f"✅ {insertadas:,} registros importados de {len(resumen)} hoja(s).")
+            else:
+                st.error(f"❌ Importación incompleta: {insertadas:,} de {leidas:,} registros.")
+
+
+captura_de_datos(ctx['planta_sel'])
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Página Dashboard OEE: KPIs, tendencias, top 5 y Paretos del rango y filtros del sidebar.
+Las librerías de gráficas se importan aquí, solo cuando se visita la página.
+"""
+import json
+import streamlit as st
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.express as px
+from plotly.subplots import make_subplots
+import altair as alt
+from modules.app_context import contexto, mostrar_fuentes_omitidas, ancho_graficas, rango_zoom
+from modules.aggregations import GRAINS, SIN_HORA, pareto
+from modules.downsampling import downsample
+from modules.figure_cache import FIGURAS, clave_figura, vega_lite_json
+from modules.instrumentation import stage
+from modules.metrics import SCRAP_COLS, FAILURE_COLS
+
+ctx = contexto()
+db = ctx['db']
+meta_oee = ctx['meta_oee']
+filter_date_range = ctx['filter_date_range']
+filter_maquina = ctx['filter_maquina']
+filter_turn = ctx['filter_turn']
+
+# Granos de la página: los de GRAINS más máquina × hora para el mapa de calor
+GRAINS_DASHBOARD = {**GRAINS, 'maquina_hora': ('maquina', 'hora')}
+
+def make_donut(input_response, input_text, input_color):
+    if input_color == 'blue':
+        chart_color = ['#29b5e8', '#155F7A']
+    if input_color == 'green':
+        chart_color = ['#27AE60', '#12783D']
+    if input_color == 'orange':
+        chart_color = ['#F39C12', '#875A12']
+    if input_color == 'red':
+        chart_color = ['#E74C3C', '#78281F']
+
+    source = pd.DataFrame({
+        "Topic": ['', input_text],
+        "% value": [100-input_response, input_response]
+    })
+    source_bg = pd.DataFrame({
+        "Topic": ['', input_text],
+        "% value": [100, 0]
+    })
+
+    plot = alt.Chart(source).mark_arc(innerRadius=60, cornerRadius=25).encode(
+        theta="% value",
+        color= alt.Color("Topic:N",
+                        scale=alt.Scale(
+                            domain=[input_text, ''],
+                            range=chart_color),
+                        legend=None),
+    ).properties(width=180, height=180)
+
+    text = plot.mark_text(align='center', color=chart_color[0], font="Lato", fontSize=28, fontWeight=700, fontStyle="italic").encode(text=alt.value(f'{input_response:.2f}%'))
+    plot_bg = alt.Chart(source_bg).mark_arc(innerRadius=60, cornerRadius=20).encode(
+        theta="% value",
+        color= alt.Color("Topic:N",
+                        scale=alt.Scale(
+                            domain=[input_text, ''],
+                            range=chart_color),
+                        legend=None),
+    ).properties(width=180, height=180)
+    return plot_bg + plot + text
+
+def figura(nombre, build, *datos, meta=None):
+    # Figura memorizada por los agregados con que se dibuja (modules/figure_cache.py)
+    with stage(f'figura.tab1.{nombre}') as info:
+        return FIGURAS.get_or_build(clave_figura(f'tab1.{nombre}', *datos, meta=meta), build, info)
+
+st.title("📊 Dashboard Rotarys en Tiempo Real")
+
+if not db:
+    st.error("⚠️ Error de conexión: No se encontraron credenciales de Supabase en 'secrets.toml'.")
+    st.info("Por favor configura [supabase] url y key.")
+else:
+    if len(filter_date_range) == 2:
+        start_d, end_d = filter_date_range
+        # Agregados incrementales por planta: carga inicial vía oee_rollup (schema.sql) y
+        # después solo los registros con id mayor al último procesado; las plantas se
+        # consultan en paralelo y sus agregados se combinan. Los filtros de máquina y
+        # turno se resuelven sobre el cubo de cada planta (OEECube), sin recorrer filas
+        rollups = db.rollups(start_d, end_d, maquinas=filter_maquina, turnos=filter_turn,
+                             grains=GRAINS_DASHBOARD)
+        mostrar_fuentes_omitidas(db)
+        df_total = rollups['total']
+
+        if not df_total.empty:
+            totales = df_total.iloc[0]
+            # --- KPIs GLOBALES (PROMEDIO) ---
+            kpi_oee = totales['oee']
+            kpi_disp = totales['disponibilidad']
+            kpi_perf = totales['rendimiento']
+            kpi_ftt = totales['ftt']
+            kpi_scrap = totales['scrap_pct']
+
+            st.markdown("### Indicadores Clave de Rendimiento (KPIs)")
+            col1, col2, col3, col4 = st.columns(4)
+
+            with col1:
+                dona = figura('dona_oee', lambda: vega_lite_json(make_donut(kpi_oee, 'OEE', 'blue')), kpi_oee)
+                st.vega_lite_chart(json.loads(dona), use_container_width=True)
+                st.metric("OEE Global", f"{kpi_oee:.2f}%", delta=f"{kpi_oee-meta_oee:.2f}% vs Meta")
+            with col2:
+                dona = figura('dona_disponibilidad', lambda: vega_lite_json(make_donut(kpi_disp, 'Disponibilidad', 'green')), kpi_disp)
+                st.vega_lite_chart(json.loads(dona), use_container_width=True)
+                st.metric("Disponibilidad", f"{kpi_disp:.2f}%")
+            with col3:
+                dona = figura('dona_rendimiento', lambda: vega_lite_json(make_donut(kpi_perf, 'Rendimiento', 'orange')), kpi_perf)
+                st.vega_lite_chart(json.loads(dona), use_container_width=True)
+                st.metric("Eficiencia / Rendimiento", f"{kpi_perf:.2f}%")
+            with col4:
+                dona = figura('dona_ftt', lambda: vega_lite_json(make_donut(kpi_ftt, 'FTT', 'red')), kpi_ftt)
+                st.vega_lite_chart(json.loads(dona), use_container_width=True)
+                st.metric("FTT (Calidad)", f"{kpi_ftt:.2f}%")
+                st.markdown(f"<h4 style='text-align: center; color: #ef4444;'>🚨 Scrap Global: {kpi_scrap:.2f}%</h4>", unsafe_allow_html=True)
+
+            st.markdown("---")
+
+            # --- PROMEDIOS POR DÍA, MES Y MÁQUINA ---
+            df_daily = rollups['fecha']
+            df_monthly = rollups['mes']
+            df_mach = rollups['maquina']
+
+            # Tendencias diarias: rango acercado y reducción de puntos al ancho de la gráfica
+            ancho_px = ancho_graficas()
+            df_daily_zoom = rango_zoom(df_daily, 'fecha', ancho_px, key="tab1_zoom")
+
+            # Gráficos de Tendencia (existentes)
+            c1, c2 = st.columns(2)
+
+            with c1:
+                def trend_oee():
+                    with stage('downsampling', filas=len(df_daily_zoom)):
+                        df_trend = downsample(df_daily_zoom, 'fecha', ['oee'], ancho_px, metas={'oee': meta_oee})
+                    fig_trend = px.line(df_trend, x='fecha', y='oee', markers=True,
+                                      hover_data={'oee': ':.2f}%', 'ftt': ':.2f}%', 'scrap_pct': ':.2f}%'},
+                                      title="Tendencia OEE Diaria (Promedio)", template="plotly_dark")
+                    fig_trend.add_hline(y=meta_oee, line_dash="dash", line_color="green", annotation_text=f"Meta {meta_oee}%")
+                    fig_trend.update_traces(line=dict(color="#38bdf8", width=3), marker=dict(size=8))
+                    return fig_trend
+                fig_trend = figura('trend_oee', trend_oee, df_daily_zoom, ancho_px, meta=meta_oee)
+                st.plotly_chart(fig_trend, use_container_width=True, key="tab1_trend_oee")
+
+            with c2:
+                def trend_month():
+                    fig_month = px.bar(df_monthly, x='mes', y='oee',
+                                     hover_data={'oee': ':.2f}%', 'ftt': ':.2f}%', 'scrap_pct': ':.2f}%'},
+                                     title="Tendencia OEE Mensual (Promedio)", template="plotly_dark",
+                                     color='oee', color_continuous_scale='Blues')
+                    fig_month.add_hline(y=meta_oee, line_dash="dash", line_color="green", annotation_text=f"Meta {meta_oee}%")
+                    return fig_month
+                fig_month = figura('trend_month', trend_month, df_monthly, meta=meta_oee)
+                st.plotly_chart(fig_month, use_container_width=True, key="tab1_trend_month")
+
+            # --- NUEVAS GRÁFICAS: TENDENCIA DIARIA Y MENSUAL DE OEE, FTT Y SCRAP ---
+            st.markdown("---")
+            st.subheader("📈 Tendencia Diaria de OEE, FTT y Scrap")
+            def trend_all():
+                with stage('downsampling', filas=len(df_daily_zoom)):
+                    df_trend_all = downsample(df_daily_zoom, 'fecha', ['oee', 'ftt', 'scrap_pct'], ancho_px,
+                                              metas={'oee': meta_oee})
+                fig_trend_all = px.line(df_trend_all, x='fecha', y=['oee', 'ftt', 'scrap_pct'],
+                                        labels={'value': 'Porcentaje (%)', 'variable': 'Métrica'},
+                                        title="Tendencia Diaria - OEE, FTT y Scrap",
+                                        template="plotly_dark",
+                                        color_discrete_map={'oee': '#38bdf8', 'ftt': '#10b981', 'scrap_pct': '#ef4444'})
+                fig_trend_all.update_traces(mode='lines+markers', marker=dict(size=6))
+                return fig_trend_all
+            fig_trend_all = figura('trend_all', trend_all, df_daily_zoom, ancho_px, meta=meta_oee)
+            st.plotly_chart(fig_trend_all, use_container_width=True, key="tab1_trend_all")
+
+            st.subheader("📈 Tendencia Mensual de OEE, FTT y Scrap")
+            fig_month_all = figura('month_all', lambda: px.bar(
+                df_monthly, x='mes', y=['oee', 'ftt', 'scrap_pct'],
+                barmode='group',
+                labels={'value': 'Porcentaje (%)', 'variable': 'Métrica'},
+                title="Tendencia Mensual - OEE, FTT y Scrap",
+                template="plotly_dark",
+                color_discrete_map={'oee': '#38bdf8', 'ftt': '#10b981', 'scrap_pct': '#ef4444'}), df_monthly)
+            st.plotly_chart(fig_month_all, use_container_width=True, key="tab1_month_all")
+
+            # --- TOP 5 MÁQUINAS CON PEOR OEE ---
+            st.markdown("---")
+            st.subheader("🏆 Top 5 Máquinas con Peor OEE (Promedio)")
+            df_mach_oee = df_mach[['maquina', 'oee']].sort_values('oee', ascending=True).head(5)
+            if not df_mach_oee.empty:
+                def top5():
+                    fig_top5 = px.bar(df_mach_oee, x='oee', y='maquina', orientation='h',
+                                      color='oee', color_continuous_scale='RdYlGn_r',
+                                      title="Top 5 Peor OEE por Máquina",
+                                      labels={'oee': 'OEE Promedio (%)', 'maquina': 'Máquina'},
+                                      template="plotly_dark")
+                    fig_top5.update_layout(coloraxis_colorbar=dict(title="OEE %"))
+                    return fig_top5
+                fig_top5 = figura('top5', top5, df_mach_oee)
+                st.plotly_chart(fig_top5, use_container_width=True, key="tab1_top5")
+            else:
+                st.info("No hay suficientes datos para mostrar el top 5.")
+
+            # Pareto de Tiempos Muertos y Pareto de Scrap (existentes)
+            st.markdown("---")
+            c3, c4 = st.columns(2)
+
+            with c3:
+                def pareto_time():
+                    failures = pareto(totales, FAILURE_COLS, 'Falla', 'Minutos')
+
+                    fig_pareto = make_subplots(specs=[[{"secondary_y": True}]])
+                    fig_pareto.add_trace(go.Bar(x=failures['Falla'], y=failures['Minutos'], name="Minutos", marker_color="#ef4444"), secondary_y=False)
+                    fig_pareto.add_trace(go.Scatter(x=failures['Falla'], y=failures['Acumulado'], name="% Acumulado", marker_color="#3b82f6"), secondary_y=True)
+                    fig_pareto.update_layout(title="Pareto de Tiempo Muerto (Minutos)", template="plotly_dark")
+                    return fig_pareto
+                fig_pareto = figura('pareto_time', pareto_time, totales[FAILURE_COLS])
+                st.plotly_chart(fig_pareto, use_container_width=True, key="tab1_pareto_time")
+
+            with c4:
+                # Pareto de contribuyentes de scrap
+                def pareto_scrap():
+                    scrap_contrib = pareto(totales, SCRAP_COLS, 'Causa', 'Cantidad')
+
+                    fig_pareto_scrap = make_subplots(specs=[[{"secondary_y": True}]])
+                    fig_pareto_scrap.add_trace(go.Bar(x=scrap_contrib['Causa'], y=scrap_contrib['Cantidad'], name="Piezas", marker_color="#f59e0b"), secondary_y=False)
+                    fig_pareto_scrap.add_trace(go.Scatter(x=scrap_contrib['Causa'], y=scrap_contrib['Acumulado'], name="% Acumulado", marker_color="#3b82f6"), secondary_y=True)
+                    fig_pareto_scrap.update_layout(title="Pareto de Causas de Scrap (Piezas)", template="plotly_dark")
+                    return fig_pareto_scrap
+                fig_pareto_scrap = figura('pareto_scrap', pareto_scrap, totales[SCRAP_COLS])
+                st.plotly_chart(fig_pareto_scrap, use_container_width=True, key="tab1_pareto_scrap")
+
+            # Desglose de KPIs por máquina (existente)
+            st.markdown("---")
+            def kpi_desglose():
+                df_mach_melt = df_mach.rename(columns={'disponibilidad': 'Disponibilidad', 'rendimiento': 'Rendimiento', 'ftt': 'FTT'})
+                return px.bar(df_mach_melt, x='maquina', y=['Disponibilidad', 'Rendimiento', 'FTT'],
+                            title="Desglose de KPIs por Máquina (Promedio)", barmode='group',
+                            template="plotly_dark", labels={'value': 'Porcentaje (%)', 'variable': 'KPI'})
+            fig_bar = figura('kpi_desglose', kpi_desglose, df_mach)
+            st.plotly_chart(fig_bar, use_container_width=True, key="tab1_kpi_desglose")
+
+            # --- MAPA DE CALOR: OEE POR MÁQUINA Y HORA ---
+            st.markdown("---")
+            st.subheader("🕒 OEE por Máquina y Hora (Promedio)")
+            df_mach_hora = rollups['maquina_hora']
+            if not df_mach_hora.empty:
+                def heatmap_hora():
+                    matriz = df_mach_hora.pivot(index='maquina', columns='hora', values='oee')
+                    matriz.columns = ["Sin hora" if h == SIN_HORA else f"{int(h):02d}:00" for h in matriz.columns]
+                    return px.imshow(matriz, aspect='auto', text_auto='.0f',
+                                     color_continuous_scale='RdYlGn', color_continuous_midpoint=meta_oee,
+                                     labels={'x': 'Hora', 'y': 'Máquina', 'color': 'OEE %'},
+                                     title=f"OEE por Máquina y Hora (centro de color: Meta {meta_oee}%)",
+                                     template="plotly_dark")
+                fig_heat = figura('heatmap_hora', heatmap_hora, df_mach_hora, meta=meta_oee)
+                st.plotly_chart(fig_heat, use_container_width=True, key="tab1_heatmap_hora")
+            else:
+                st.info("No hay registros con hora para el mapa de calor.")
+
+        else:
+            st.warning("No hay datos para los filtros seleccionados.")
+    else:
+        st.info("Seleccione un rango de fechas válido.")
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Página Reportes y Descargas: métricas del período, detalle paginado, gráficas y
+descarga del reporte HTML / CSV.
+"""
+import streamlit as st
+import pandas as pd
+import numpy as np
+import base64
+import os
+import tempfile
+from modules.app_context import contexto, mostrar_fuentes_omitidas, ancho_graficas
+from modules.report import (write_downloads, iter_detalle, cursor_keyset, report_figures, preparar_detalle,
+                            REPORT_COLS, SEMAFORO_COLS, COLS_KPI_DETALLE)
+
+ctx = contexto()
+db = ctx['db']
+planta_sel = ctx['planta_sel']
+filter_date_range = ctx['filter_date_range']
+filter_maquina = ctx['filter_maquina']
+meta_oee = ctx['meta_oee']
+
+def estilos_semaforo(df):
+    """
+    Estilos del semáforo para todo el DataFrame de una vez (Styler.apply con axis=None).
+    """
+    estilos = pd.DataFrame('', index=df.index, columns=df.columns)
+    for col in SEMAFORO_COLS:
+        valores = pd.to_numeric(df[col], errors='coerce')
+        color = np.select([valores < 70, valores < 85], ['#ef4444', '#f59e0b'], '#10b981')
+        estilos[col] = np.where(valores.notna(), 'background-color: ' + color + '; color: white; font-weight: bold', '')
+    return estilos
+
+def _pagina_siguiente(cursor):
+    st.session_state['detalle_cursores'].append(cursor)
+
+def _pagina_anterior():
+    if len(st.session_state['detalle_cursores']) > 1:
+        st.session_state['detalle_cursores'].pop()
+
+def _archivo_temporal(sufijo):
+    fd, path = tempfile.mkstemp(prefix="reporte_oee_", suffix=sufijo)
+    os.close(fd)
+    return path
+
+def _borrar_descargas(artefactos):
+    for path in artefactos.values():
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _lector(path):
+    # El archivo se lee solo cuando el usuario pulsa el botón de descarga
+    def leer():
+        with open(path, "rb") as f:
+            return f.read()
+    return leer
+
+@st.cache_data
+def get_image_base64(path):
+    try:
+        with open(path, "rb") as image_file:
+            encoded_string = base64.b64encode(image_file.read()).decode()
+        return encoded_string
+    except Exception as e:
+        return ""
+
+st.markdown("<h2 style='text-align: center;'>📄 Generador de Reportes Interactivos</h2>", unsafe_allow_html=True)
+
+if not db:
+    st.error("⚠️ Sin conexión a la base de datos.")
+elif len(filter_date_range) == 2:
+    start_d, end_d = filter_date_range
+
+    st.markdown("### 🔍 Refinar Reporte")
+    c_f1 = st.columns(1)[0]
+    with c_f1:
+        turnos_disponibles = [1, 2, 3]
+        rep_filter_turn = st.multiselect("Filtrar por Turno", turnos_disponibles, default=[1, 2, 3])
+
+    # Agregados del cubo incremental de cada planta (el mismo del Dashboard): cambiar
+    # los filtros de máquina o turno solo rebana y suma el cubo
+    rollups_rep = db.rollups(start_d, end_d, maquinas=filter_maquina, turnos=rep_filter_turn)
+    # Plantas que faltan en los totales (cada consulta de la vista reemplaza db.errores)
+    errores_totales = dict(db.errores)
+    mostrar_fuentes_omitidas(db)
+
+    if not rollups_rep['total'].empty:
+        # --- AGREGADOS (compartidos por todas las gráficas) ---
+        totales_rep = rollups_rep['total'].iloc[0]
+        df_daily_rep = rollups_rep['fecha']
+        df_monthly_rep = rollups_rep['mes']
+        df_mach_rep = rollups_rep['maquina']
+        registros_rep = int(totales_rep['registros'])
+
+        # --- MÉTRICAS GLOBALES (PROMEDIOS) ---
+        ftt_global_rep = totales_rep['ftt']
+        scrap_global_rep = totales_rep['scrap_pct']
+        total_prod_rep = int(totales_rep['producido'])
+
+        st.markdown("### 🌎 Resumen Global del Período")
+        c_g1, c_g2, c_g3 = st.columns(3)
+        c_g1.metric("Total Producido", f"{total_prod_rep:,} pzas")
+        c_g2.metric("FTT Global (Promedio)", f"{ftt_global_rep:.2f}%")
+        c_g3.metric("Scrap Global (Promedio)", f"{scrap_global_rep:.2f}%", delta_color="inverse")
+        st.markdown("---")
+
+        # --- DETALLE PAGINADO (keyset sobre fecha, hora, id: solo se descarga la página visible) ---
+        st.subheader("Detalle de Operaciones Individuales (con desglose de scrap)")
+        filas_pagina = st.selectbox("Filas por página", [50, 100, 250, 500], index=1)
+        filtros_detalle = (planta_sel, start_d, end_d, tuple(filter_maquina), tuple(rep_filter_turn),
+                           filas_pagina)
+        if st.session_state.get('detalle_filtros') != filtros_detalle:
+            st.session_state['detalle_filtros'] = filtros_detalle
+            st.session_state['detalle_cursores'] = [None]
+        cursores = st.session_state['detalle_cursores']
+
+        # Una fila extra indica si existe una página siguiente
+        pagina = db.fetch_page(start_d, end_d, columns=REPORT_COLS, maquinas=filter_maquina,
+                               turnos=rep_filter_turn, after=cursores[-1], page_size=filas_pagina + 1)
+        for nombre, error in db.errores.items():
+            if nombre not in errores_totales:
+                st.warning(f"⚠️ {nombre}: detalle sin datos ({error}). Se muestran las demás plantas / líneas.")
+        hay_siguiente = len(pagina) > filas_pagina
+        pagina = pagina.head(filas_pagina)
+
+        if not pagina.empty:
+            vista_pagina = preparar_detalle(pagina)
+            st.dataframe(
+                vista_pagina.style.apply(estilos_semaforo, axis=None),
+                use_container_width=True, hide_index=True,
+                column_config={col: st.column_config.NumberColumn(format="%.2f") for col in COLS_KPI_DETALLE},
+            )
+            cursor_siguiente = cursor_keyset(pagina.iloc[-1])
+        else:
+            cursor_siguiente = None
+
+        c_p1, c_p2, c_p3 = st.columns([1, 2, 1])
+        c_p1.button("◀ Anterior", on_click=_pagina_anterior, disabled=len(cursores) == 1,
+                    use_container_width=True, key="detalle_prev")
+        c_p2.caption(f"Página {len(cursores)} de {max(1, -(-registros_rep // filas_pagina))} "
+                     f"· {registros_rep:,} registros")
+        c_p3.button("Siguiente ▶", on_click=_pagina_siguiente, args=(cursor_siguiente,),
+                    disabled=not hay_siguiente, use_container_width=True, key="detalle_next")
+
+        # --- GRÁFICAS EN STREAMLIT (las mismas que van en el reporte HTML) ---
+        figuras_rep = report_figures(rollups_rep, ancho_px=ancho_graficas(), meta_oee=meta_oee)
+
+        st.subheader("📊 OEE Promedio por Máquina")
+        st.plotly_chart(figuras_rep['bar'], use_container_width=True, key="report_bar")
+
+        st.subheader("📈 Tendencia Diaria de OEE")
+        st.plotly_chart(figuras_rep['trend_oee'], use_container_width=True, key="report_trend_oee")
+
+        st.subheader("📈 Tendencia Diaria de OEE, FTT y Scrap")
+        st.plotly_chart(figuras_rep['trend_all'], use_container_width=True, key="report_trend_all")
+
+        st.subheader("📈 Tendencia Mensual de OEE, FTT y Scrap")
+        st.plotly_chart(figuras_rep['month_all'], use_container_width=True, key="report_month_all")
+
+        st.subheader("🏆 Top 5 Máquinas con Peor OEE (Promedio)")
+        st.plotly_chart(figuras_rep['top5'], use_container_width=True, key="report_top5")
+
+        st.subheader("Análisis de Tiempos Muertos y Scrap")
+        st.plotly_chart(figuras_rep['pareto'], use_container_width=True, key="report_pareto")
+        st.plotly_chart(figuras_rep['pareto_scrap'], use_container_width=True, key="report_pareto_scrap")
+
+        # --- DESCARGAS (se generan solo a petición) ---
+        # Memorizadas por filtros + versión de datos (la fila de totales cambia con cada
+        # registro nuevo): repetir la descarga no vuelve a serializar
+        reporte_offline = st.checkbox("📴 Reporte para equipos sin internet (incluye plotly.js)", value=True)
+        clave_descarga = (planta_sel, start_d, end_d, tuple(filter_maquina), tuple(rep_filter_turn),
+                          tuple(totales_rep.tolist()), reporte_offline)
+        descargas = st.session_state.setdefault('descargas_reporte', {})
+        artefactos = descargas.get(clave_descarga)
+
+        if artefactos is None and st.button("🛠️ Preparar descargas (reporte HTML y CSV)", use_container_width=True):
+            with st.spinner("Generando reporte..."):
+                # El detalle se lee por bloques (keyset) y se escribe directo a archivos
+                # temporales: el período completo nunca se carga en memoria
+                artefactos = {'html': _archivo_temporal(".html"), 'csv': _archivo_temporal(".csv")}
+                try:
+                    write_downloads(
+                        artefactos['html'], artefactos['csv'], start_d, end_d, totales_rep,
+                        iter_detalle(db, start_d, end_d, maquinas=filter_maquina, turnos=rep_filter_turn,
+                                     columns=REPORT_COLS),
+                        figuras_rep, logo_b64=get_image_base64("EA_2.png"), offline=reporte_offline)
+                    detalle_completo = True
+                except Exception as e:
+                    # Un bloque del detalle falló: el archivo quedaría cortado, no se conserva
+                    st.error(f"❌ Error al leer el detalle del reporte, intenta de nuevo: {e}")
+                    detalle_completo = False
+            if not detalle_completo:
+                _borrar_descargas(artefactos)
+                artefactos = None
+            elif errores_totales:
+                # Los totales no incluyen alguna planta: la descarga quedaría incompleta, no se
+                # conserva (las fallas del detalle ya cortan write_downloads con una excepción)
+                st.error(f"❌ Sin datos de {', '.join(errores_totales)}: el reporte quedaría incompleto, "
+                         f"intenta de nuevo.")
+                _borrar_descargas(artefactos)
+                artefactos = None
+            else:
+                # Solo se conservan las descargas de los últimos filtros usados
+                while len(descargas) >= 3:
+                    _borrar_descargas(descargas.pop(next(iter(descargas))))
+                descargas[clave_descarga] = artefactos
+
+        if artefactos is not None:
+            col1, col2 = st.columns(2)
+            with col1: st.download_button("📊 Descargar Reporte Completo", _lector(artefactos['html']), f"Reporte_OEE_Rotarys_{start_d}.html", "text/html", use_container_width=True)
+            with col2: st.download_button("📊 Descargar Datos CSV", _lector(artefactos['csv']), "datos_oee_rotarys.csv", "text/csv", use_container_width=True)
+    else:
+        st.warning("No hay datos para los filtros seleccionados.")
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Regresiones del motor de agregación (modules/aggregations.py) y del rollup de SQLite.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.aggregations import CUBE_GRAIN, KPI_N_COLS, IncrementalRollup, OEECube, reaggregate, rollup
+from modules.sqlite_backend import SQLiteManager
+
+
+def _registros():
+    # Tres horas de una máquina; la primera sin FTT capturado
+    return pd.DataFrame({
+        'id': [1, 2, 3], 'fecha': ['2024-03-01'] * 3, 'hora': [6, 7, 8], 'turno': [1] * 3,
+        'maquina': ['CS0525'] * 3, 'oee': [50.0, 60.0, 70.0], 'disponibilidad': [80.0] * 3,
+        'rendimiento': [90.0] * 3, 'ftt': [np.nan, 90.0, 90.0], 'scrap_pct': [1.0] * 3,
+        'tiempo_programado_min': [60] * 3, 'producido': [100] * 3, 'scrap': [1] * 3, 'tiempo_muerto': [5] * 3,
+    })
+
+
+def test_reaggregate_pondera_cada_kpi_por_sus_valores_no_nulos():
+    fino = rollup(_registros(), CUBE_GRAIN)
+    total = reaggregate(fino, ())
+
+    assert total['registros'].iloc[0] == 3
+    assert total['ftt_n'].iloc[0] == 2
+    assert total['ftt'].iloc[0] == pytest.approx(90.0)
+    assert total['oee'].iloc[0] == pytest.approx(60.0)
+    directo = rollup(_registros(), ())
+    assert np.allclose(directo[KPI_N_COLS].to_numpy(dtype=float), total[KPI_N_COLS].to_numpy(dtype=float))
+
+
+def test_cubo_pondera_cada_kpi_por_sus_valores_no_nulos():
+    cubo = OEECube(rollup(_registros(), CUBE_GRAIN))
+    rollups = cubo.rollups(grains={'total': (), 'hora': ('hora',)})
+
+    assert rollups['total']['ftt'].iloc[0] == pytest.approx(90.0)
+    assert rollups['total']['oee'].iloc[0] == pytest.approx(60.0)
+    # La hora sin FTT capturado conserva el promedio nulo
+    assert rollups['hora']['ftt'].isna().tolist() == [True, False, False]
+
+
+def test_rollup_sqlite_devuelve_los_mismos_conteos(tmp_path):
+    db = SQLiteManager(str(tmp_path / "oee.db"))
+    filas = _registros().drop(columns='id').astype(object)
+    db.insert_records([{k: (None if pd.isna(v) else v) for k, v in fila.items()}
+                       for fila in filas.to_dict('records')])
+
+    sql = db.aggregate(date(2024, 3, 1), date(2024, 3, 1), grain=CUBE_GRAIN)
+    local = rollup(_registros(), CUBE_GRAIN)
+
+    assert sql[KPI_N_COLS].to_numpy().tolist() == local[KPI_N_COLS].to_numpy().tolist()
+    assert reaggregate(sql, ('fecha',))['ftt'].iloc[0] == pytest.approx(90.0)
+
+
+def _sqlite_con(tmp_path, ids):
+    db = SQLiteManager(str(tmp_path / "oee.db"))
+    _insertar(db, ids)
+    return db
+
+
+def _insertar(db, ids, fecha='2024-03-01'):
+    db.insert_records([{'id': i, 'fecha': fecha, 'hora': 6, 'turno': 1, 'maquina': 'CS0525', 'oee': 50.0,
+                        'producido': 100} for i in ids])
+
+
+def test_incremental_suma_ids_confirmados_tarde_sin_duplicar(tmp_path):
+    db = _sqlite_con(tmp_path, [1, 2, 3])
+    incremental = IncrementalRollup(min_interval=0)
+    rango = (date(2024, 3, 1), date(2024, 3, 31))
+    assert incremental.rollups(db, *rango)['total']['registros'].iloc[0] == 3
+
+    _insertar(db, [5])
+    assert incremental.rollups(db, *rango)['total']['registros'].iloc[0] == 4
+    # El id 4 se confirma después del 5: entra por el traslape, y el 5 no se suma dos veces
+    _insertar(db, [4], fecha='2024-03-02')
+    total = incremental.rollups(db, *rango)['total']
+    assert total['registros'].iloc[0] == 5 and total['producido'].iloc[0] == 500
+
+
+def test_incremental_conserva_una_ventana_por_rango(tmp_path):
+    db = _sqlite_con(tmp_path, [1, 2])
+    _insertar(db, [3], fecha='2024-04-01')
+    incremental = IncrementalRollup(min_interval=0)
+    marzo = incremental.rollups(db, date(2024, 3, 1), date(2024, 3, 31))['total']
+    abril = incremental.rollups(db, date(2024, 4, 1), date(2024, 4, 30))['total']
+
+    assert (marzo['registros'].iloc[0], abril['registros'].iloc[0]) == (2, 1)
+    assert len(incremental._ventanas) == 2
+
+
+def test_incremental_reporta_errores_y_conserva_los_agregados(tmp_path):
+    db = _sqlite_con(tmp_path, [1, 2])
+    incremental = IncrementalRollup(min_interval=0)
+    rango = (date(2024, 3, 1), date(2024, 3, 31))
+    incremental.rollups(db, *rango)
+
+    def sin_conexion(*args, **kwargs):
+        raise ConnectionError("sin conexión")
+    db.fetch_records_since = sin_conexion
+    assert incremental.rollups(db, *rango)['total']['registros'].iloc[0] == 2
+    assert incremental.error(*rango) == "sin conexión"
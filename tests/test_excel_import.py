@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Regresiones de la importación de libros heredados (modules/excel_import.py).
+"""
+from datetime import date
+
+import pandas as pd
+from openpyxl import Workbook
+
+from modules.excel_import import import_workbook, iter_workbook_records
+from modules.sqlite_backend import SQLiteManager
+
+
+class _DB:
+    """Destino en memoria con la firma de StorageBackend.insert_records."""
+    def __init__(self):
+        self.rows = []
+
+    def insert_records(self, records, chunk_size=500, progress=None, **kwargs):
+        records = list(records)
+        self.rows.extend(records)
+        if progress:
+            progress(len(records))
+        return len(records)
+
+
+def _libro(path, encabezado, filas, hoja='CS0525'):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = hoja
+    ws.append(encabezado)
+    for fila in filas:
+        ws.append(fila)
+    wb.save(path)
+    return path
+
+
+def test_libro_sin_columna_hora(tmp_path):
+    libro = _libro(tmp_path / "sin_hora.xlsx", ['Fecha', 'Turno', 'Tiempo Programado', 'Producido'],
+                   [[date(2024, 3, 1), 1, 60, 100], [date(2024, 3, 2), 2, 60, 90]])
+
+    lotes = list(iter_workbook_records(libro, rates={'CS0525': 115}))
+
+    payloads = [p for _, lote, _ in lotes for p in lote]
+    assert [p['fecha'] for p in payloads] == ['2024-03-01', '2024-03-02']
+    assert all(p['hora'] is None for p in payloads)
+    assert all(p['maquina'] == 'CS0525' and p['rate_teorico'] == 115 for p in payloads)
+
+
+def test_filas_de_totales_se_omiten_y_se_reportan(tmp_path):
+    libro = _libro(tmp_path / "con_total.xlsx", ['Fecha', 'Hora', 'Turno', 'Producido'],
+                   [[date(2024, 3, 1), '7:00', 1, 100],
+                    [date(2024, 3, 1), '8:00', 1, 110],
+                    ['TOTAL', None, None, 210]])
+    db = _DB()
+
+    resumen = import_workbook(db, libro, rates={'CS0525': 115})
+
+    assert [r['hora'] for r in db.rows] == [7, 8]
+    assert resumen['CS0525']['leidas'] == 2
+    assert resumen['CS0525']['insertadas'] == 2
+    assert resumen['CS0525']['omitidas'] == 1
+    assert resumen['CS0525']['fechas_omitidas'] == ['TOTAL']
+
+
+def test_rate_vigente_en_la_fecha_de_cada_fila(tmp_path):
+    libro = _libro(tmp_path / "historico.xlsx", ['Fecha', 'Turno', 'Producido'],
+                   [[date(2023, 12, 1), 1, 100], [date(2024, 3, 1), 1, 100], [date(2024, 3, 2), 1, 100]])
+    catalogo = pd.DataFrame({'maquina': ['CS0525', 'CS0525'], 'rate_teorico': [100.0, 130.0],
+                             'vigente_desde': ['2024-01-01', '2024-03-02'], 'linea': [None, None],
+                             'activa': [True, True]})
+
+    payloads = [p for _, lote, _ in iter_workbook_records(libro, catalogo=catalogo) for p in lote]
+
+    # Antes de la primera vigencia se usa el primer rate de la máquina
+    assert [p['rate_teorico'] for p in payloads] == [100.0, 100.0, 130.0]
+
+
+def test_celdas_numericas_de_fecha_y_horas_de_texto(tmp_path):
+    # 45352 es el serial de Excel del 2024-03-01 (celda de fecha sin formato)
+    libro = _libro(tmp_path / "serial.xlsx", ['Fecha', 'Hora', 'Turno', 'Producido'],
+                   [[45352, '6 am', 1, 100], [45352, '—', 1, 90], [45352, 'TOTAL', 1, 190]])
+
+    payloads = [p for _, lote, _ in iter_workbook_records(libro, rates={'CS0525': 115}) for p in lote]
+
+    assert [p['fecha'] for p in payloads] == ['2024-03-01'] * 3
+    assert all(p['hora'] is None for p in payloads)
+
+
+def test_filas_sin_turno_valido_se_omiten_y_se_reportan(tmp_path):
+    libro = _libro(tmp_path / "turnos.xlsx", ['Fecha', 'Hora', 'Turno', 'Producido'],
+                   [[date(2024, 3, 1), '7:00', 2, 100],
+                    [date(2024, 3, 1), '8:00', None, 110],
+                    [date(2024, 3, 1), '9:00', 'B', 120]])
+    db = _DB()
+
+    resumen = import_workbook(db, libro, rates={'CS0525': 115})
+
+    assert [(r['hora'], r['turno']) for r in db.rows] == [(7, 2)]
+    assert resumen['CS0525']['omitidas'] == 2
+    assert resumen['CS0525']['turnos_omitidos'] == ['2024-03-01 ()', '2024-03-01 (B)']
+    assert resumen['CS0525']['fechas_omitidas'] == []
+
+
+def test_reimportar_un_libro_no_duplica_registros(tmp_path):
+    # Sin columna de hora: dos filas iguales del mismo día son registros distintos
+    libro = _libro(tmp_path / "historico.xlsx", ['Fecha', 'Turno', 'Producido'],
+                   [[date(2024, 3, 1), 1, 100], [date(2024, 3, 1), 1, 100], [date(2024, 3, 2), 1, 90]])
+    db = SQLiteManager(str(tmp_path / "oee.db"))
+
+    for _ in range(2):
+        import_workbook(db, libro, rates={'CS0525': 115}, chunk_size=2)
+
+    assert len(db.fetch_records_since(0)) == 3
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Regresiones de la federación de plantas / líneas (modules/federation.py).
+"""
+import threading
+import time
+
+from modules.federation import Federation, Fuente
+
+
+def test_fuente_colgada_no_ocupa_los_hilos_de_las_demas():
+    liberar = threading.Event()
+    colgada = Fuente("Colgada", db=None, timeout=0.05, max_en_curso=2)
+    sana = Fuente("Sana", db=None, timeout=1.0, max_en_curso=2)
+    federacion = Federation([colgada, sana])
+
+    def consulta(fuente):
+        if fuente is colgada:
+            liberar.wait(5)
+        return fuente.nombre
+
+    try:
+        for _ in range(5):
+            resultados, errores = federacion.fan_out(consulta)
+            assert resultados == {"Sana": "Sana"} and list(errores) == ["Colgada"]
+        # Con 'max_en_curso' consultas sin terminar, la fuente se omite sin encolar más
+        assert colgada._en_curso == 2
+        assert "sin terminar" in errores["Colgada"]
+    finally:
+        liberar.set()
+    for _ in range(100):
+        if colgada._en_curso == 0:
+            break
+        time.sleep(0.01)
+    assert federacion.fan_out(lambda f: f.nombre) == ({"Colgada": "Colgada", "Sana": "Sana"}, {})
+
+
+def test_cada_consulta_devuelve_sus_propios_errores():
+    caida = Fuente("Caida", db=None, timeout=1.0)
+    sana = Fuente("Sana", db=None, timeout=1.0)
+    federacion = Federation([caida, sana])
+
+    def totales(fuente):
+        if fuente is caida:
+            raise ConnectionError("caida simulada")
+        return fuente.nombre
+
+    _, errores_totales = federacion.fan_out(totales)
+    resultados, errores_detalle = federacion.fan_out(lambda f: f.nombre)
+
+    # La segunda consulta no borra los errores de la primera para quien los guardó
+    assert errores_totales == {"Caida": "caida simulada"}
+    assert resultados == {"Caida": "Caida", "Sana": "Sana"} and errores_detalle == {}
+    assert federacion.errores == {}
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+Regresiones de la caché de figuras (modules/figure_cache.py).
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+from modules.figure_cache import FigureCache, _tamano
+
+
+def _figura(puntos):
+    return go.Figure(go.Scatter(x=np.arange(puntos), y=np.zeros(puntos)))
+
+
+def test_tamano_crece_con_los_datos_de_las_trazas():
+    assert _tamano(_figura(10_000)) - _tamano(_figura(0)) == 2 * 10_000 * 8
+
+
+def test_descarta_las_figuras_menos_usadas_al_exceder_los_bytes():
+    cache = FigureCache(max_bytes=int(_tamano(_figura(10_000)) * 2.5))
+    for clave in 'abc':
+        cache.get_or_build(clave, lambda: _figura(10_000))
+
+    assert list(cache._entries) == ['b', 'c']
+    assert cache.bytes <= cache.max_bytes
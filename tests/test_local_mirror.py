@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Regresiones de la réplica Parquet (modules/local_mirror.py).
+"""
+import os
+from datetime import date
+
+import pandas as pd
+
+from modules.local_mirror import LocalMirror
+
+
+class _DB:
+    """Origen con la firma de StorageBackend.fetch_records_since."""
+    def __init__(self, n, fechas=('2024-03-01',)):
+        self.df = pd.DataFrame({'id': range(1, n + 1), 'fecha': [fechas[i % len(fechas)] for i in range(n)],
+                                'hora': [None if i % 7 == 0 else 6 + i % 3 for i in range(n)],
+                                'turno': [1] * n, 'maquina': ['CS0525'] * n, 'producido': [100] * n})
+
+    def fetch_records_since(self, after_id, columns=None, linea=None, raise_errors=False, use_mirror=True):
+        return self.df[self.df['id'] > after_id]
+
+
+def test_delta_descargado_dos_veces_no_duplica_registros(tmp_path):
+    mirror = LocalMirror(str(tmp_path), sync_interval=0, compact_threshold=2)
+    db = _DB(3)
+    mirror.sync(db, force=True)
+    # Caída después de escribir el delta y antes de guardar la marca de agua
+    mirror._state['max_id'] = 0
+    mirror.sync(db, force=True)
+
+    leidos = mirror.read(date(2024, 3, 1), date(2024, 3, 31), columns=['producido'])
+    assert len(leidos) == 3 and leidos.columns.tolist() == ['producido']
+    assert mirror.read_since(1)['id'].tolist() == [2, 3]
+
+    # La compactación tampoco conserva los repetidos
+    mirror._state['max_id'] = 0
+    mirror.sync(db, force=True)
+    particion = tmp_path / 'mes=2024-03'
+    [archivo] = os.listdir(particion)
+    assert archivo.startswith('compact-')
+    assert len(pd.read_parquet(particion / archivo)) == 3
+    assert not os.listdir(tmp_path / '_tmp')
+
+
+def test_paginas_leen_solo_los_meses_necesarios(tmp_path):
+    mirror = LocalMirror(str(tmp_path), sync_interval=0)
+    mirror.sync(_DB(60, fechas=('2024-01-15', '2024-02-10', '2024-03-05')), force=True)
+    rango = (date(2024, 1, 1), date(2024, 3, 31))
+    columnas = ['fecha', 'hora', 'id', 'producido']
+    esperado = mirror.read(*rango, columns=columnas).sort_values(['fecha', 'hora', 'id'], na_position='last')
+
+    leidas = []
+    lectura = mirror._read
+    mirror._read = lambda filters, columns=None: leidas.append(filters[0][2]) or lectura(filters, columns)
+    paginas, after = [], None
+    while True:
+        pagina = mirror.read_page(*rango, columns=columnas, after=after, limit=8)
+        if pagina.empty:
+            break
+        if not paginas:
+            # La primera página (enero) no lee febrero ni marzo
+            assert leidas == ['2024-01']
+        paginas.append(pagina)
+        after = (str(pagina['fecha'].iloc[-1])[:10],
+                 None if pd.isna(pagina['hora'].iloc[-1]) else int(pagina['hora'].iloc[-1]),
+                 int(pagina['id'].iloc[-1]))
+
+    assert pd.concat(paginas)['id'].tolist() == esperado['id'].tolist()
+
+
+def test_id_confirmado_tarde_entra_por_el_traslape(tmp_path):
+    mirror = LocalMirror(str(tmp_path), sync_interval=0)
+    db = _DB(5)
+    # El id 3 se confirma después del 5
+    tarde = db.df[db.df['id'] == 3]
+    db.df = db.df[db.df['id'] != 3]
+    mirror.sync(db, force=True)
+    db.df = pd.concat([db.df, tarde]).sort_values('id', ignore_index=True)
+
+    assert mirror.sync(db, force=True) == 1
+    assert mirror.read_since(0)['id'].tolist() == [1, 2, 3, 4, 5]
+    assert mirror.max_id == 5
+    # Sin registros nuevos no se escribe ningún delta
+    assert mirror.sync(db, force=True) == 0
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Regresiones de las descargas del reporte (modules/report.py) contra el backend SQLite.
+"""
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from modules.report import PLOTLY_CDN_URL, iter_detalle, write_downloads
+from modules.sqlite_backend import SQLiteManager
+
+TOTALES = {'producido': 500, 'ftt': 90.0, 'scrap_pct': 1.0}
+
+
+def _db(tmp_path):
+    db = SQLiteManager(str(tmp_path / "oee.db"))
+    # Dos días; un registro sin hora (va al final de su día)
+    db.insert_records([{'fecha': f'2024-03-0{1 + i % 2}', 'hora': None if i == 2 else 6 + i, 'turno': 1,
+                        'maquina': 'CS0525', 'tiempo_programado_min': 60, 'producido': 100, 'oee': 50.0}
+                       for i in range(5)])
+    return db
+
+
+def test_iter_detalle_recorre_el_periodo_por_bloques(tmp_path):
+    bloques = list(iter_detalle(_db(tmp_path), date(2024, 3, 1), date(2024, 3, 31), chunk_rows=2))
+
+    assert [len(b) for b in bloques] == [2, 2, 1]
+    ids = pd.concat(bloques)['id'].tolist()
+    assert ids == [1, 5, 3, 2, 4]
+
+
+def test_write_downloads_escribe_html_y_csv_en_una_pasada(tmp_path):
+    db = _db(tmp_path)
+    html, csv = tmp_path / "reporte.html", tmp_path / "datos.csv"
+
+    filas = write_downloads(str(html), str(csv), date(2024, 3, 1), date(2024, 3, 31), TOTALES,
+                            iter_detalle(db, date(2024, 3, 1), date(2024, 3, 31), chunk_rows=2),
+                            figuras={}, offline=False)
+
+    assert filas == 5
+    datos = pd.read_csv(csv)
+    assert len(datos) == 5 and datos['fecha'].tolist()[:2] == ['2024-03-01', '2024-03-01']
+    documento = html.read_text(encoding='utf-8')
+    assert documento.count('Array.prototype.push.apply(OEE_TABLE.rows') == 3
+    assert PLOTLY_CDN_URL in documento
+
+
+def test_write_downloads_sin_registros(tmp_path):
+    html, csv = tmp_path / "reporte.html", tmp_path / "datos.csv"
+
+    assert write_downloads(str(html), str(csv), date(2024, 3, 1), date(2024, 3, 31), TOTALES, [],
+                           figuras={}, offline=False) == 0
+    assert pd.read_csv(csv).empty
+
+
+def test_iter_detalle_no_confunde_un_bloque_fallido_con_el_final(tmp_path):
+    db = _db(tmp_path)
+    leer = db.fetch_page
+
+    def falla_en_el_segundo(*args, after=None, raise_errors=False, **kwargs):
+        if after is not None:
+            if raise_errors:
+                raise ConnectionError("sin conexión")
+            return pd.DataFrame()
+        return leer(*args, after=after, raise_errors=raise_errors, **kwargs)
+    db.fetch_page = falla_en_el_segundo
+
+    bloques = iter_detalle(db, date(2024, 3, 1), date(2024, 3, 31), chunk_rows=2)
+    assert len(next(bloques)) == 2
+    with pytest.raises(ConnectionError):
+        next(bloques)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Regresiones de la bitácora de capturas (modules/spool.py) contra el backend SQLite.
+"""
+from postgrest.exceptions import APIError
+
+from modules.spool import CaptureSpool
+from modules.sqlite_backend import SQLiteManager
+
+
+def _captura(maquina='CS0525', **extra):
+    return {'fecha': '2024-03-01', 'hora': 7, 'turno': 1, 'maquina': maquina,
+            'tiempo_programado_min': 60, 'producido': 100, **extra}
+
+
+def _vaciar(spool, db):
+    # Como el hilo de envío: los errores se reintentan en la siguiente vuelta
+    for _ in range(50):
+        try:
+            if not spool.flush_once(db):
+                return
+        except Exception:
+            pass
+
+
+def test_captura_invalida_se_descarta_sin_bloquear_la_cola(tmp_path):
+    db = SQLiteManager(str(tmp_path / "oee.db"))
+    spool = CaptureSpool(str(tmp_path / "spool.db"), batch_size=10, max_attempts=3)
+    for _ in range(3):
+        spool.append(_captura())
+    # 'turno' es not null: la base de datos rechaza el lote completo
+    spool.append(_captura(turno=None))
+    spool.append(_captura())
+
+    _vaciar(spool, db)
+
+    assert len(db.fetch_records_since(0)) == 4
+    stats = spool.stats()
+    assert (stats['pendientes'], stats['enviados'], stats['descartados']) == (0, 4, 1)
+    [descartada] = spool.dead_letters()
+    assert descartada['attempts'] == 3 and 'turno' in descartada['error']
+
+    assert spool.requeue() == 1
+    assert spool.stats()['pendientes'] == 1
+
+
+def test_reenvio_de_un_lote_no_duplica_registros(tmp_path):
+    db = SQLiteManager(str(tmp_path / "oee.db"))
+    spool = CaptureSpool(str(tmp_path / "spool.db"))
+    spool.append(_captura())
+    spool.append(_captura())
+
+    # Se pierde la respuesta del primer envío: el lote queda pendiente y se reenvía
+    assert spool.flush_once(db) == 2
+    spool._conn.execute("update spool set flushed_at = null")
+    spool._conn.commit()
+
+    assert spool.flush_once(db) == 2
+    assert len(db.fetch_records_since(0)) == 2
+
+
+def test_enviadas_se_borran_despues_de_la_retencion(tmp_path):
+    db = SQLiteManager(str(tmp_path / "oee.db"))
+    spool = CaptureSpool(str(tmp_path / "spool.db"), retention_days=0)
+    spool.append(_captura())
+    spool.flush_once(db)
+    spool.append(_captura())
+    spool.flush_once(db)
+
+    assert spool.stats()['enviados'] <= 1
+
+
+class _DBCaida:
+    # Supabase que responde con un error transitorio a cada envío
+    def __init__(self, error):
+        self.error = error
+
+    def insert_records(self, payloads, **kwargs):
+        raise self.error
+
+
+def _sin_descartes(tmp_path, error):
+    spool = CaptureSpool(str(tmp_path / "spool.db"), max_attempts=2)
+    spool.append(_captura())
+    spool.append(_captura())
+
+    _vaciar(spool, _DBCaida(error))
+
+    stats = spool.stats()
+    assert (stats['pendientes'], stats['descartados']) == (2, 0)
+    assert spool._conn.execute("select max(attempts) from spool").fetchone()[0] == 0
+
+
+def test_timeout_de_postgres_no_descarta_capturas(tmp_path):
+    _sin_descartes(tmp_path, APIError({'code': '57014', 'message': 'canceling statement due to statement timeout'}))
+
+
+def test_error_sin_codigo_no_descarta_capturas(tmp_path):
+    # Respuesta HTTP 5xx del proxy, sin cuerpo JSON de PostgREST
+    _sin_descartes(tmp_path, APIError({'message': 'JSON could not be generated', 'code': None}))